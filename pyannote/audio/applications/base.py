@@ -40,6 +40,8 @@ except ImportError:
     from typing_extensions import Literal
 
 from typing import Optional, Union, Text
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from os.path import basename
 import numpy as np
@@ -60,7 +62,12 @@ from pyannote.audio.train.task import Task
 from pyannote.audio.features import Pretrained
 from pyannote.audio.features import Precomputed
 from pyannote.audio.features.wrapper import Wrapper
+from pyannote.audio.features.cache import PretrainedCache
+from pyannote.audio.features.pool import PretrainedPool
+from pyannote.audio.features.pool import imap
+from pyannote.audio.features.utils import RawAudio
 from pyannote.audio.applications.config import load_config
+from pyannote.audio.applications.config import load_params
 
 
 def create_zip(validate_dir: Path):
@@ -124,6 +131,7 @@ class Application:
     MODEL_PT = "{train_dir}/weights/{epoch:04d}.pt"
     VALIDATE_DIR = "{train_dir}/validate{_criterion}/{protocol}.{subset}"
     APPLY_DIR = "{validate_dir}/apply/{epoch:04d}"
+    QUANTIZE_DIR = "{validate_dir}/quantize/{epoch:04d}"
 
     @classmethod
     def from_train_dir(cls, train_dir: Path, training: bool = False):
@@ -132,6 +140,13 @@ class Application:
         app.train_dir_ = train_dir
         return app
 
+    @classmethod
+    def from_validate_dir(cls, validate_dir: Path, training: bool = False):
+
+        app = cls.from_train_dir(validate_dir.parents[1], training=training)
+        app.validate_dir_ = validate_dir
+        return app
+
     def __init__(
         self,
         experiment_dir: str,
@@ -424,6 +439,140 @@ class Application:
             progress_bar.set_description(desc=desc)
             progress_bar.update(1)
 
+    def compare_quantized(
+        self,
+        protocol: str,
+        subset: Subset = "development",
+        batch_size: int = 32,
+        n_jobs: int = 1,
+        duration: float = None,
+        step: float = 0.25,
+        **kwargs,
+    ) -> dict:
+        """Compare float32 and int8 (dynamically quantized) models
+
+        Both versions of the model selected by validation (i.e. the epoch
+        stored in {validate_dir}/params.yml) are applied on CPU to every file
+        of `subset`, and evaluated with the validation metric of the task.
+        The report is also dumped to
+        {validate_dir}/quantize/{epoch}/{protocol}.{subset}.yml
+
+        Parameters
+        ----------
+        protocol : str
+            Protocol name.
+        subset : {"train", "development", "test"}, optional
+            Defaults to "development".
+        batch_size : int, optional
+            Defaults to 32.
+        n_jobs : int, optional
+            Defaults to 1.
+        duration : float, optional
+        step : float, optional
+        **kwargs
+            Passed to `validate_epoch` (e.g. "metric" for speaker embedding).
+
+        Returns
+        -------
+        report : dict
+            {"epoch": 42,
+             "float32": {"detection_fscore": 0.930, "real_time_factor": 0.012},
+             "int8": {"detection_fscore": 0.928, "real_time_factor": 0.008},
+             "max_absolute_difference": 0.031,
+             "mean_absolute_difference": 0.002}
+            where real-time factor is inference time divided by audio duration
+            and (max and mean) absolute differences compare raw model outputs.
+        """
+
+        epoch = load_params(self.validate_dir_ / "params.yml")["epoch"]
+
+        # quantized models only run on CPU
+        device = torch.device("cpu")
+
+        pretrained = {
+            quantize: Pretrained(
+                validate_dir=self.validate_dir_,
+                epoch=epoch,
+                duration=duration,
+                step=step,
+                batch_size=batch_size,
+                device=device,
+                quantize=quantize,
+            )
+            for quantize in [False, True]
+        }
+
+        # do not alter the application's own preprocessors
+        preprocessors = dict(self.preprocessors_)
+        if "audio" not in preprocessors:
+            preprocessors["audio"] = FileFinder()
+        if "duration" not in preprocessors:
+            preprocessors["duration"] = get_audio_duration
+        _protocol = get_protocol(protocol, preprocessors=preprocessors)
+
+        # compare raw outputs and inference time, file by file
+        elapsed = {False: 0.0, True: 0.0}
+        total_duration, max_difference, sum_difference, n_values = 0.0, 0.0, 0.0, 0
+        for current_file in tqdm(
+            iterable=getattr(_protocol, subset)(), desc="Outputs", unit="file"
+        ):
+            outputs = dict()
+            for quantize, pretrained_ in pretrained.items():
+                t = time.time()
+                outputs[quantize] = pretrained_(current_file).data
+                elapsed[quantize] += time.time() - t
+
+            difference = np.abs(outputs[True] - outputs[False])
+            if difference.size > 0:
+                max_difference = max(max_difference, float(np.max(difference)))
+                sum_difference += float(np.sum(difference))
+                n_values += difference.size
+            total_duration += current_file["duration"]
+
+        # compare performance
+        validation_data = self.validate_init(protocol, subset=subset)
+
+        # validate_epoch expects self.pool_ when n_jobs > 1
+        if n_jobs > 1:
+            self.pool_ = multiprocessing.Pool(n_jobs)
+
+        report = {"epoch": epoch}
+        try:
+            for quantize, name in [(False, "float32"), (True, "int8")]:
+                details = self.validate_epoch(
+                    epoch,
+                    validation_data,
+                    protocol=protocol,
+                    subset=subset,
+                    device=device,
+                    batch_size=batch_size,
+                    n_jobs=n_jobs,
+                    duration=duration,
+                    step=step,
+                    quantize=quantize,
+                    **kwargs,
+                )
+                report[name] = {
+                    details["metric"]: details["value"],
+                    "real_time_factor": elapsed[quantize] / total_duration,
+                }
+        finally:
+            if n_jobs > 1:
+                self.pool_.close()
+                self.pool_.join()
+                del self.pool_
+        report["max_absolute_difference"] = max_difference
+        report["mean_absolute_difference"] = sum_difference / max(1, n_values)
+
+        quantize_dir = Path(
+            self.QUANTIZE_DIR.format(validate_dir=self.validate_dir_, epoch=epoch)
+        )
+        quantize_dir.mkdir(parents=True, exist_ok=True)
+        with open(quantize_dir / f"{protocol}.{subset}.yml", mode="w") as fp:
+            fp.write(yaml.dump(report, default_flow_style=False))
+
+        return report
+
     def validate_iter(self, start=1, end=None, step=1, sleep=10, chronological=False):
         """Continuously watches `train_dir` for newly completed epochs
         and yields them for validation
@@ -516,6 +665,135 @@ class Application:
 # TODO: add support for torch.hub models directly in docopt
 
 
+def load_pipeline(pretrained, Pipeline: type = None, scores=None):
+    """Instantiate pipeline with parameters obtained at validation step
+
+    Parameters
+    ----------
+    pretrained : `Pretrained`
+        Pretrained model.
+    Pipeline : `type`, optional
+        Pipeline class.
+    scores : `Wrappable`, optional
+        Passed to `Pipeline`.
+
+    Returns
+    -------
+    pipeline : `pyannote.pipeline.Pipeline`
+        Instantiated pipeline. None when there is no such thing for current
+        task or when its parameters cannot be loaded (this might happen when
+        applying a model that has not been validated yet).
+    """
+
+    if Pipeline is None:
+        return None
+
+    try:
+        pipeline_params = pretrained.pipeline_params_
+    except AttributeError as e:
+        return None
+
+    pipeline = Pipeline(scores=scores)
+    pipeline.instantiate(pipeline_params)
+    return pipeline
+
+
+def iter_pipelined(pretrained, files, precomputed, pipeline=None, n_jobs: int = 1):
+    """Apply pretrained model (and pipeline) in a pipelined fashion
+
+    A producer thread decodes audio files ahead of time, while `n_jobs`
+    inference threads apply the model, dump its output, and pass it (in
+    memory) to the pipeline. Intra-op threads used by torch are shared among
+    inference threads so that CPUs are not oversubscribed.
+
+    Parameters
+    ----------
+    pretrained : `Pretrained`
+        Pretrained model.
+    files : iterable
+        `pyannote.database` files.
+    precomputed : `Precomputed`
+        Where to dump model output.
+    pipeline : `pyannote.pipeline.Pipeline`, optional
+        Pipeline reading model output from the "scores" key of files.
+    n_jobs : int, optional
+        Number of inference threads. Defaults to 1.
+
+    Yields
+    ------
+    current_file : dict
+        `pyannote.database` file.
+    hypothesis : `pyannote.core.Annotation`
+        Pipeline output. None when `pipeline` is not provided.
+        Files are yielded in the order of `files`.
+    """
+
+    # audio is decoded (and resampled) once and for all in the producer thread.
+    # this is not done for cached models as in-memory waveforms would change
+    # the cache key, for pools of worker processes as waveforms would have to
+    # be sent to them, nor for models processing files block by block.
+    sample_rate = getattr(pretrained, "sample_rate", None)
+    if (
+        isinstance(pretrained, (PretrainedCache, PretrainedPool))
+        or sample_rate is None
+        or getattr(pretrained, "block_duration", None) is not None
+    ):
+        raw_audio = None
+    else:
+        raw_audio = RawAudio(sample_rate=sample_rate, mono=False)
+
+    def decode(current_file):
+        if raw_audio is not None:
+            waveform = raw_audio(current_file, all_channels=True)
+            current_file["waveform"] = waveform.data
+        return current_file
+
+    def process(decoded):
+
+        current_file = decoded.result()
+
+        fX = pretrained(current_file)
+        precomputed.dump(current_file, fX)
+
+        hypothesis = None
+        if pipeline is not None:
+            current_file["scores"] = fX
+            hypothesis = pipeline(current_file)
+
+        # free memory as soon as possible
+        current_file.pop("waveform", None)
+        current_file.pop("scores", None)
+
+        return current_file, hypothesis
+
+    # bound the number of files kept in memory at any time
+    n_pending = 2 * n_jobs
+
+    # torch.set_num_threads is process-wide: share intra-op threads among
+    # inference threads (and restore them once done)
+    n_threads = torch.get_num_threads()
+    if n_jobs > 1:
+        torch.set_num_threads(max(1, n_threads // n_jobs))
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as producer, ThreadPoolExecutor(
+            max_workers=n_jobs
+        ) as workers:
+
+            pending = deque()
+            for current_file in files:
+                decoded = producer.submit(decode, current_file)
+                pending.append(workers.submit(process, decoded))
+                if len(pending) >= n_pending:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    finally:
+        torch.set_num_threads(n_threads)
+
+
 def apply_pretrained(
     validate_dir: Path,
     protocol_name: Text,
@@ -526,6 +804,16 @@ def apply_pretrained(
     batch_size: int = 32,
     pretrained: Optional[str] = None,
     Pipeline: type = None,
+    container: bool = False,
+    codec: Optional[Text] = None,
+    cache: Optional[Path] = None,
+    cache_size: float = 10.0,
+    pipelined: bool = False,
+    n_jobs: int = 1,
+    n_workers: Optional[int] = None,
+    n_threads: int = 1,
+    quantize: bool = False,
+    pack: bool = False,
     **kwargs,
 ):
     """Apply pre-trained model
@@ -542,6 +830,42 @@ def apply_pretrained(
     batch_size : `int`, optional
     pretrained : `str`, optional
     Pipeline : `type`
+    container : `bool`, optional
+        Pack model outputs into a few large files (with an index) instead of
+        writing one `.npy` file per file. Only used when `validate_dir` does
+        not contain model outputs yet. See `Precomputed` for details.
+    codec : {"float16", "uint8"}, optional
+        Store model outputs in half precision or with 8-bit quantization.
+        Only used when `validate_dir` does not contain model outputs yet.
+    cache : `Path`, optional
+        Reuse model outputs cached in this directory by previous runs (and
+        cache new ones). See `pyannote.audio.features.cache.PretrainedCache`.
+    cache_size : `float`, optional
+        Cache disk budget, in GB. Defaults to 10GB.
+    pipelined : `bool`, optional
+        Process files in a single pass: audio is decoded ahead of time, files
+        are processed by `n_jobs` inference threads, and model outputs are
+        passed in memory to the pipeline (in addition to being dumped to
+        disk). Defaults to processing all files first, and then applying the
+        pipeline on model outputs loaded back from disk.
+    n_jobs : `int`, optional
+        Number of inference threads used in pipelined mode (torch intra-op
+        threads are shared among them). Defaults to 1.
+    n_workers : `int`, optional
+        Apply model on CPU using that many worker processes, each of them
+        using `n_threads` intra-op threads. See `PretrainedPool`.
+        Defaults to applying model in the main process.
+    n_threads : `int`, optional
+        Number of intra-op threads used by each worker process. Defaults to 1.
+    quantize : `bool`, optional
+        Apply int8 dynamic quantization to the model (CPU only). Outputs are
+        dumped into a separate "apply/{epoch}.int8" directory. Not supported
+        with `pretrained`. Defaults to False.
+    pack : `bool`, optional
+        Pack chunks of consecutive files into the same batches (see
+        `Pretrained.apply_many`), which is much faster for short files.
+        Only used with (non-pipelined) plain `Pretrained` models. Defaults to
+        applying the model file by file.
     """
 
     if pretrained is None:
@@ -551,10 +875,17 @@ def apply_pretrained(
             step=step,
             batch_size=batch_size,
             device=device,
+            quantize=quantize,
         )
         output_dir = validate_dir / "apply" / f"{pretrained.epoch_:04d}"
+        if quantize:
+            output_dir = output_dir.with_name(f"{output_dir.name}.int8")
     else:
 
+        if quantize:
+            msg = "Quantization is not supported with pretrained models."
+            raise ValueError(msg)
+
         if pretrained in torch.hub.list("pyannote/pyannote-audio"):
             output_dir = validate_dir / pretrained
         else:
@@ -568,6 +899,58 @@ def apply_pretrained(
             device=device,
         )
 
+    pool = None
+    if n_workers is not None:
+        pool = PretrainedPool(pretrained, n_workers=n_workers, n_threads=n_threads)
+        pretrained = pool
+        # keep all workers busy
+        n_jobs = max(n_jobs, pool.n_workers)
+
+    try:
+        _apply_pretrained(
+            pretrained,
+            output_dir,
+            protocol_name,
+            subset=subset,
+            Pipeline=Pipeline,
+            container=container,
+            codec=codec,
+            cache=cache,
+            cache_size=cache_size,
+            pipelined=pipelined,
+            n_jobs=n_jobs,
+            n_workers=n_workers,
+            pack=pack,
+        )
+    finally:
+        # terminate worker processes (the pool might be hidden behind
+        # PretrainedCache, hence the explicit reference)
+        if pool is not None:
+            pool.close()
+
+
+def _apply_pretrained(
+    pretrained,
+    output_dir: Path,
+    protocol_name: Text,
+    subset: Subset = "test",
+    Pipeline: type = None,
+    container: bool = False,
+    codec: Optional[Text] = None,
+    cache: Optional[Path] = None,
+    cache_size: float = 10.0,
+    pipelined: bool = False,
+    n_jobs: int = 1,
+    n_workers: Optional[int] = None,
+    pack: bool = False,
+):
+    """Apply (already loaded) pre-trained model. See `apply_pretrained`"""
+
+    if cache is not None:
+        pretrained = PretrainedCache(
+            pretrained, cache, max_bytes=int(cache_size * 2 ** 30)
+        )
+
     params = {}
     try:
         params["classes"] = pretrained.classes
@@ -580,6 +963,10 @@ def apply_pretrained(
 
     # create metadata file at root that contains
     # sliding window and dimension information
+    if not (output_dir / "metadata.yml").exists():
+        params["container"] = container
+        params["codec"] = codec
+
     precomputed = Precomputed(
         root_dir=output_dir, sliding_window=pretrained.sliding_window, **params
     )
@@ -593,25 +980,42 @@ def apply_pretrained(
     protocol = get_protocol(protocol_name, preprocessors=preprocessors)
 
     files = getattr(protocol, subset)()
-    for current_file in tqdm(iterable=files, desc=f"{subset.title()}", unit="file"):
-        fX = pretrained(current_file)
-        precomputed.dump(current_file, fX)
 
-    # do not proceed with the full pipeline
-    # when there is no such thing for current task
-    if Pipeline is None:
-        return
+    if pipelined:
+        pipeline = load_pipeline(pretrained, Pipeline, scores="@scores")
+        hypotheses = iter_pipelined(
+            pretrained, files, precomputed, pipeline=pipeline, n_jobs=n_jobs
+        )
+        hypotheses = tqdm(iterable=hypotheses, desc=f"{subset.title()}", unit="file")
 
-    # do not proceed with the full pipeline when its parameters cannot be loaded.
-    # this might happen when applying a model that has not been validated yet
-    try:
-        pipeline_params = pretrained.pipeline_params_
-    except AttributeError as e:
-        return
+        # only dump model output when there is no pipeline
+        if pipeline is None:
+            for _ in hypotheses:
+                pass
+            return
 
-    # instantiate pipeline
-    pipeline = Pipeline(scores=output_dir)
-    pipeline.instantiate(pipeline_params)
+    else:
+        if pack and isinstance(pretrained, Pretrained):
+            # pack chunks of consecutive files into the same batches
+            outputs = pretrained.apply_many(files)
+        else:
+            outputs = imap(pretrained, files, n_jobs=1 if n_workers is None else n_jobs)
+        for current_file, fX in tqdm(
+            iterable=outputs, desc=f"{subset.title()}", unit="file"
+        ):
+            precomputed.dump(current_file, fX)
+
+        pipeline = load_pipeline(pretrained, Pipeline, scores=output_dir)
+        if pipeline is None:
+            return
+
+        files = getattr(protocol, subset)()
+        hypotheses = (
+            (current_file, pipeline(current_file))
+            for current_file in tqdm(
+                iterable=files, desc=f"{subset.title()}", unit="file"
+            )
+        )
 
     # load pipeline metric (when available)
     try:
@@ -622,9 +1026,7 @@ def apply_pretrained(
     # apply pipeline and dump output to RTTM files
     output_rttm = output_dir / f"{protocol_name}.{subset}.rttm"
     with open(output_rttm, "w") as fp:
-        files = getattr(protocol, subset)()
-        for current_file in tqdm(iterable=files, desc=f"{subset.title()}", unit="file"):
-            hypothesis = pipeline(current_file)
+        for current_file, hypothesis in hypotheses:
             pipeline.write_rttm(fp, hypothesis)
 
             # compute evaluation metric (when possible)
@@ -65,6 +65,7 @@ class SpeakerChangeDetection(BaseLabeling):
         n_jobs=1,
         duration=None,
         step=0.25,
+        quantize=False,
         **kwargs
     ):
 
@@ -76,6 +77,7 @@ class SpeakerChangeDetection(BaseLabeling):
             step=step,
             batch_size=batch_size,
             device=device,
+            quantize=quantize,
         )
 
         for current_file in validation_data:
@@ -30,7 +30,7 @@
 Feature extraction
 
 Usage:
-  pyannote-speech-feature [--robust --parallel] <experiment_dir> <database.task.protocol>
+  pyannote-speech-feature [--robust --parallel --shard=<shard> --container --codec=<codec>] <experiment_dir> <database.task.protocol>
   pyannote-speech-feature check <experiment_dir> <database.task.protocol>
   pyannote-speech-feature -h | --help
   pyannote-speech-feature --version
@@ -43,6 +43,19 @@ Options:
   <database.task.protocol>   Set evaluation protocol (e.g. "Etape.SpeakerDiarization.TV")
   --robust                   When provided, skip files for which feature extraction fails.
   --parallel                 When provided, process files in parallel.
+  --shard=<shard>            Only process the i-th of N shards of the protocol
+                             files, with <shard> formatted as "i/N" (from "1/N"
+                             to "N/N"). This is useful for splitting feature
+                             extraction across several machines sharing the
+                             same <experiment_dir>. Defaults to "1/1".
+  --container                When provided, pack features of all files into a
+                             few large files (with an index) instead of
+                             writing one file per file. Only used when
+                             <experiment_dir> does not contain features yet.
+  --codec=<codec>            Store features in half precision ("float16") or
+                             with 8-bit quantization ("uint8") to reduce disk
+                             footprint. Only used when <experiment_dir> does
+                             not contain features yet.
   -h --help                  Show this screen.
   --version                  Show version.
 
@@ -62,10 +75,25 @@ Configuration file:
           DD: True                   # energy derivatives
     ...................................................................
 
+Manifest:
+    Each shard keeps track of processed files in its own manifest file
+    <experiment_dir>/manifest.<i>of<N>.jsonl, with one JSON line per file
+    (status, number of frames, processing time and real-time factor).
+    Files marked as done in any manifest are skipped when the command is
+    run again: an interrupted extraction can therefore simply be resumed by
+    running the exact same command. Features are written to a temporary file
+    that is only renamed once complete. Files whose features were dumped
+    by an earlier version of this command (hence not listed in any
+    manifest) are skipped as well, as long as containers are not used.
+
 """
 
 import yaml
+import json
+import time
+import zlib
 import os.path
+from pathlib import Path
 import numpy as np
 import functools
 from docopt import docopt
@@ -108,37 +136,62 @@ def process_current_file(
     feature_extraction=None,
     robust=False,
 ):
+    """Extract and dump features of a single file
+
+    Returns
+    -------
+    record : dict
+        Manifest record with "uri" and "status" ("done" or "failed") keys.
+        Successful extractions also report number of frames, audio duration,
+        processing time and real-time factor. Failed ones report an error
+        message. Files whose features already exist on disk are marked as
+        done with an additional "skipped" key.
+    """
+
+    uri = get_unique_identifier(current_file)
 
     try:
         current_file["audio"] = file_finder(current_file)
     except ValueError as e:
         if not robust:
             raise PyannoteFeatureExtractionError(*e.args)
-        return e
+        return {"uri": uri, "status": "failed", "message": str(e)}
 
-    uri = get_unique_identifier(current_file)
-    path = precomputed.get_path(current_file)
+    # features dumped before manifests were introduced
+    if not precomputed.container_ and os.path.exists(
+        precomputed.get_path(current_file)
+    ):
+        return {"uri": uri, "status": "done", "skipped": True}
 
-    if os.path.exists(path):
-        return
+    t0 = time.time()
 
     try:
         features = feature_extraction(current_file)
     except PyannoteFeatureExtractionError as e:
-        msg = 'Feature extraction failed for file "{uri}".'
-        return msg.format(uri=uri)
+        msg = f'Feature extraction failed for file "{uri}".'
+        return {"uri": uri, "status": "failed", "message": msg}
 
     if features is None:
-        msg = 'Feature extraction returned None for file "{uri}".'
-        return msg.format(uri=uri)
+        msg = f'Feature extraction returned None for file "{uri}".'
+        return {"uri": uri, "status": "failed", "message": msg}
 
     if np.any(np.isnan(features.data)):
-        msg = 'Feature extraction returned NaNs for file "{uri}".'
-        return msg.format(uri=uri)
+        msg = f'Feature extraction returned NaNs for file "{uri}".'
+        return {"uri": uri, "status": "failed", "message": msg}
 
     precomputed.dump(current_file, features)
 
-    return
+    elapsed = time.time() - t0
+    duration = len(features) * features.sliding_window.step
+
+    return {
+        "uri": uri,
+        "status": "done",
+        "n_frames": len(features),
+        "duration": round(duration, 3),
+        "elapsed": round(elapsed, 3),
+        "real_time_factor": round(duration / max(elapsed, 1e-6), 1),
+    }
 
 
 def helper_extract(
@@ -163,9 +216,75 @@ def helper_extract(
     )
 
 
-def extract(protocol_name, file_finder, experiment_dir, robust=False, parallel=False):
+def parse_shard(shard):
+    """Parse "i/N" shard specification
+
+    Parameters
+    ----------
+    shard : str
+        Shard specification, from "1/N" to "N/N".
+
+    Returns
+    -------
+    index : int
+        Zero-based shard index.
+    n_shards : int
+        Total number of shards.
+    """
+
+    try:
+        i, n_shards = (int(x) for x in shard.split("/"))
+    except ValueError:
+        msg = f'Invalid shard "{shard}" (should be formatted as "i/N").'
+        raise ValueError(msg)
+
+    if n_shards < 1 or not (1 <= i <= n_shards):
+        msg = f'Invalid shard "{shard}" (should be between "1/N" and "N/N").'
+        raise ValueError(msg)
+
+    return i - 1, n_shards
+
+
+def in_shard(current_file, index=0, n_shards=1):
+    """Check whether file belongs to shard
+
+    Files are assigned to shards based on a hash of their unique identifier
+    so that assignment does not depend on the order of protocol files.
+    """
+    uri = get_unique_identifier(current_file)
+    return zlib.crc32(uri.encode("utf8")) % n_shards == index
+
+
+def load_manifest(experiment_dir):
+    """Get unique identifiers of files already marked as done in manifests"""
+
+    done = set()
+    for manifest in Path(experiment_dir).glob("manifest.*.jsonl"):
+        with open(manifest, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line may be truncated after a crash
+                    continue
+                if record.get("status") == "done":
+                    done.add(record["uri"])
+    return done
+
+
+def extract(
+    protocol_name,
+    file_finder,
+    experiment_dir,
+    robust=False,
+    parallel=False,
+    shard="1/1",
+    container=False,
+    codec=None,
+):
 
     protocol = get_protocol(protocol_name)
+    index, n_shards = parse_shard(shard)
 
     # load configuration file
     config_yml = experiment_dir + "/config.yml"
@@ -186,8 +305,24 @@ def extract(protocol_name, file_finder, experiment_dir, robust=False, parallel=F
     # create metadata file at root that contains
     # sliding window and dimension information
 
+    if (Path(experiment_dir) / "metadata.yml").exists():
+        container, codec = None, None
+
     precomputed = Precomputed(
-        root_dir=experiment_dir, sliding_window=sliding_window, dimension=dimension
+        root_dir=experiment_dir,
+        sliding_window=sliding_window,
+        dimension=dimension,
+        container=container,
+        codec=codec,
+    )
+
+    # skip files that are not part of this shard or already done
+    done = load_manifest(experiment_dir)
+    files = (
+        current_file
+        for current_file in protocol.files()
+        if in_shard(current_file, index=index, n_shards=n_shards)
+        and get_unique_identifier(current_file) not in done
     )
 
     if parallel:
@@ -202,7 +337,7 @@ def extract(protocol_name, file_finder, experiment_dir, robust=False, parallel=F
 
         n_jobs = cpu_count()
         pool = Pool(n_jobs)
-        imap = pool.imap
+        imap = pool.imap_unordered
 
     else:
 
@@ -216,10 +351,38 @@ def extract(protocol_name, file_finder, experiment_dir, robust=False, parallel=F
         )
         imap = map
 
-    for result in imap(extract_one, protocol.files()):
-        if result is None:
-            continue
-        print(result)
+    # only the main process writes to the manifest
+    manifest = Path(experiment_dir) / f"manifest.{index + 1}of{n_shards}.jsonl"
+
+    n_files, total_duration, t0 = 0, 0.0, time.time()
+    with open(manifest, "a") as f:
+
+        for record in imap(extract_one, files):
+
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+            if record["status"] != "done":
+                print(record["message"])
+                continue
+
+            if record.get("skipped", False):
+                continue
+
+            n_files += 1
+            total_duration += record["duration"]
+            print(
+                f'{record["uri"]}: {record["duration"]:.1f}s of audio '
+                f'in {record["elapsed"]:.1f}s '
+                f'({record["real_time_factor"]:.1f}x real time)'
+            )
+
+    elapsed = time.time() - t0
+    if n_files > 0:
+        print(
+            f"Processed {n_files} files ({total_duration:.1f}s of audio) "
+            f"in {elapsed:.1f}s ({total_duration / elapsed:.1f}x real time)."
+        )
 
 
 def check(protocol_name, file_finder, experiment_dir):
@@ -275,6 +438,16 @@ def main():
     else:
         robust = arguments["--robust"]
         parallel = arguments["--parallel"]
+        shard = arguments["--shard"]
+        if shard is None:
+            shard = "1/1"
         extract(
-            protocol_name, file_finder, experiment_dir, robust=robust, parallel=parallel
+            protocol_name,
+            file_finder,
+            experiment_dir,
+            robust=robust,
+            parallel=parallel,
+            shard=shard,
+            container=arguments["--container"],
+            codec=arguments["--codec"],
         )
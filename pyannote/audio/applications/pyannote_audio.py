@@ -35,6 +35,7 @@ Usage:
   pyannote-audio (sad | scd | ovl | emb | dom) train    [--cpu | --gpu] [options] <root>     <protocol>
   pyannote-audio (sad | scd | ovl | emb | dom) validate [--cpu | --gpu] [options] <train>    <protocol>
   pyannote-audio (sad | scd | ovl | emb | dom) apply    [--cpu | --gpu] [options] <validate> <protocol>
+  pyannote-audio (sad | scd | ovl | emb | dom) quantize [options] <validate> <protocol>
   pyannote-audio -h | --help
   pyannote-audio --version
 
@@ -229,6 +230,54 @@ Pretrained model options
                           This option can also be used to apply a pretrained
                           model. See description of <validate> for more details.
 
+Inference options
+~~~~~~~~~~~~~~~~~
+
+  --container             Pack outputs of all files into a few large files
+                          (with an index) instead of writing one file per
+                          file. This is recommended for large corpora.
+
+  --codec=<codec>         Store outputs in half precision ("float16") or with
+                          8-bit quantization ("uint8") to reduce disk
+                          footprint. Defaults to storing float32 outputs.
+
+  --cache=<directory>     Reuse model outputs cached in <directory> by previous
+                          runs (on the same audio files, with the same model,
+                          duration and step) and cache new ones.
+
+  --cache-size=<size>     Maximum size of cache directory, in GB. Least recently
+                          used outputs are evicted first [default: 10].
+
+  --pipelined             Process files in a single pass: audio is decoded
+                          ahead of time, files are processed by inference
+                          threads (see --pipelined-threads), and outputs are
+                          passed in memory to the pipeline instead of being
+                          loaded back from disk.
+
+  --pipelined-threads=<n_jobs>
+                          Number of inference threads used with --pipelined.
+                          CPU intra-op threads are shared among them
+                          [default: 1].
+
+  --workers=<n_workers>   Apply model on CPU with that many worker processes,
+                          each holding its own copy of the model (with weights
+                          shared in memory). Defaults to applying the model in
+                          the main process.
+
+  --threads=<n_threads>   Number of intra-op threads used by each worker
+                          process [default: 1].
+
+  --pack                  Pack chunks of consecutive files into the same
+                          batches instead of applying the model file by file.
+                          This is much faster for (many) short files. Not
+                          used with --pipelined, --workers, or --cache.
+
+  --quantize              Apply int8 dynamic quantization to recurrent and
+                          linear layers of the model for faster CPU inference.
+                          Outputs are stored in a sub-directory with an ".int8"
+                          suffix (e.g. apply/0125.int8). Use "quantize" mode
+                          first to check its impact on performance.
+
 Validation options
 ~~~~~~~~~~~~~~~~~~
 
@@ -257,6 +306,16 @@ Validation options
   embedding), and looks for the threshold that maximizes the f-score of purity
   and coverage.
 
+Quantization
+~~~~~~~~~~~~
+
+  "quantize" mode applies both the original (float32) and the quantized (int8)
+  versions of the best model (according to the validation step) on CPU to the
+  development set (use --subset to change this), and reports their validation
+  metric (see "Validation options" above), their real-time factor, and the
+  difference between their raw outputs. The report is also stored in
+  <validate>/quantize/<epoch>/<protocol>.<subset>.yml
+
 """
 
 import sys
@@ -266,6 +325,7 @@ from pathlib import Path
 import multiprocessing
 
 import torch
+import yaml
 from .base import apply_pretrained
 from .speech_detection import SpeechActivityDetection
 from .change_detection import SpeakerChangeDetection
@@ -437,5 +497,67 @@ def main():
         params["Pipeline"] = getattr(Application, "Pipeline", None)
 
         params["pretrained"] = arg["--pretrained"]
+        params["container"] = arg["--container"]
+        params["codec"] = arg["--codec"]
+        params["cache"] = arg["--cache"]
+        params["cache_size"] = float(arg["--cache-size"])
+        params["pipelined"] = arg["--pipelined"]
+        # --parallel (all CPUs but one by default) would oversubscribe CPUs
+        params["n_jobs"] = int(arg["--pipelined-threads"])
+
+        n_workers = arg["--workers"]
+        if n_workers is not None:
+            n_workers = int(n_workers)
+        params["n_workers"] = n_workers
+        params["n_threads"] = int(arg["--threads"])
+        params["quantize"] = arg["--quantize"]
+        params["pack"] = arg["--pack"]
 
         apply_pretrained(validate_dir, protocol, **params)
+
+    if arg["quantize"]:
+
+        validate_dir = Path(arg["<validate>"]).expanduser().resolve(strict=True)
+        app = Application.from_validate_dir(validate_dir, training=False)
+
+        # quantized models only run on CPU
+        del params["device"]
+
+        params["subset"] = "development" if subset is None else subset
+        params["batch_size"] = int(arg["--batch"])
+
+        params["diarization"] = arg["--diarization"]
+
+        duration = arg["--duration"]
+        if duration is None:
+            duration = getattr(app.task_, "duration", None)
+            if duration is None:
+                msg = (
+                    "Task has no 'duration' defined. "
+                    "Use '--duration' option to provide one."
+                )
+                raise ValueError(msg)
+        else:
+            duration = float(duration)
+        params["duration"] = duration
+
+        params["step"] = float(arg["--step"])
+
+        if arg["emb"]:
+
+            metric = arg["--metric"]
+            if metric is None:
+                metric = getattr(app.task_, "metric", None)
+                if metric is None:
+                    msg = (
+                        "Approach has no 'metric' defined. "
+                        "Use '--metric' option to provide one."
+                    )
+                    raise ValueError(msg)
+            params["metric"] = metric
+
+        # FIXME: parallel is broken in pyannote.metrics
+        params["n_jobs"] = 1
+
+        report = app.compare_quantized(protocol, **params)
+        print(yaml.dump(report, default_flow_style=False))
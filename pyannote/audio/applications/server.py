@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+Local inference server
+
+Usage:
+  pyannote-audio-server [--cpu | --gpu] [options] <model>...
+  pyannote-audio-server -h | --help
+
+Keeps pretrained models loaded and applies them on chunks sent by concurrent
+clients, merging them into full batches.
+
+Options:
+  <model>                 Model to serve, as "name=model" where "model" is
+                          either the name of a torch.hub model, the path to a
+                          validation directory, or the path to a checkpoint.
+                          (e.g. "sad=sad_dihard").
+  --address=<address>     Listen at this address. Use "unix:///path/to/socket"
+                          for a Unix socket or "tcp://localhost:port" for a
+                          TCP socket. Defaults to "server.sock" Unix socket in
+                          private runtime directory (see below).
+  --batch=<size>          Maximum number of chunks per batch. Defaults to the
+                          batch size of each model.
+  --max-wait=<ms>         Maximum time (in milliseconds) chunks wait for other
+                          clients' chunks before (incomplete) batch is
+                          processed [default: 10].
+  --gpu                   Run on GPU. Defaults to using GPU when available.
+  --cpu                   Run on CPU.
+  -h --help               Show this screen.
+
+Clients must share the same authentication key as the server. It is read
+from PYANNOTE_SERVER_AUTHKEY environment variable when set. Otherwise, the
+server generates a random key into the "authkey" file of a private runtime
+directory only accessible to the current user ($XDG_RUNTIME_DIR/pyannote-audio
+or /tmp/pyannote-audio-<uid>), where clients of the same user read it.
+
+Any `Wrapper` (and therefore any pipeline "scores") can then use served models
+with "unix://#sad" (default socket) or "unix:///path/to/socket#sad".
+For instance:
+
+  $ pyannote-audio-server sad=sad_dihard scd=scd_dihard
+  >>> from pyannote.audio.features.wrapper import Wrapper
+  >>> sad = Wrapper("unix://#sad")
+"""
+
+import warnings
+
+import torch
+from docopt import docopt
+
+from pyannote.audio.features import Pretrained
+from pyannote.audio.features.server import InferenceServer
+from pyannote.audio.features.wrapper import Wrapper
+
+
+def main():
+
+    arguments = docopt(__doc__)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if arguments["--gpu"] and device == "cpu":
+        msg = "No GPU is available. Using CPU instead."
+        warnings.warn(msg)
+    if arguments["--cpu"] and device == "cuda":
+        device = "cpu"
+
+    models = dict()
+    for model in arguments["<model>"]:
+        name, _, wrappable = model.partition("=")
+        if not wrappable:
+            msg = f'Models should be provided as "name=model" (got "{model}").'
+            raise ValueError(msg)
+
+        pretrained = Wrapper(wrappable, device=device).scorer_
+        if not isinstance(pretrained, Pretrained):
+            msg = f'"{wrappable}" is not a pretrained model.'
+            raise ValueError(msg)
+        models[name] = pretrained
+
+    batch_size = arguments["--batch"]
+    if batch_size is not None:
+        batch_size = int(batch_size)
+
+    server = InferenceServer(
+        models,
+        address=arguments["--address"],
+        batch_size=batch_size,
+        max_wait=1e-3 * float(arguments["--max-wait"]),
+    )
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
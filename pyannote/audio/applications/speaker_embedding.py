@@ -120,8 +120,7 @@ class SpeakerEmbedding(Application):
                 segments = [f["try_with"]]
             else:
                 segments = f["try_with"]
-            for segment in segments:
-                emb.append(pretrained.crop(f, segment, mode="center"))
+            emb.extend(pretrained.embed_segments(f, segments, average=False))
 
         return np.mean(np.vstack(emb), axis=0, keepdims=True)
 
@@ -137,6 +136,7 @@ class SpeakerEmbedding(Application):
         duration: float = None,
         step: float = 0.25,
         metric: str = None,
+        quantize: bool = False,
         **kwargs,
     ):
 
@@ -148,6 +148,7 @@ class SpeakerEmbedding(Application):
             step=step,
             batch_size=batch_size,
             device=device,
+            quantize=quantize,
         )
 
         preprocessors = self.preprocessors_
@@ -201,6 +202,7 @@ class SpeakerEmbedding(Application):
         duration: float = None,
         step: float = 0.25,
         metric: str = None,
+        quantize: bool = False,
         **kwargs,
     ):
 
@@ -212,6 +214,7 @@ class SpeakerEmbedding(Application):
             step=step,
             batch_size=batch_size,
             device=device,
+            quantize=quantize,
         )
 
         preprocessors = self.preprocessors_
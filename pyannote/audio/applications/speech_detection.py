@@ -60,6 +60,7 @@ class SpeechActivityDetection(BaseLabeling):
         n_jobs=1,
         duration=None,
         step=0.25,
+        quantize=False,
         **kwargs,
     ):
 
@@ -71,6 +72,7 @@ class SpeechActivityDetection(BaseLabeling):
             step=step,
             batch_size=batch_size,
             device=device,
+            quantize=quantize,
         )
 
         for current_file in validation_data:
@@ -26,10 +26,15 @@
 # AUTHORS
 # Hervé BREDIN - http://herve.niderb.fr
 
+import uuid
 import warnings
+from typing import List
+from typing import Union
+
 import numpy as np
 
 from .utils import RawAudio
+from .utils import get_audio_sample_rate
 
 from pyannote.core import Segment
 from pyannote.core import SlidingWindow
@@ -51,11 +56,29 @@ class FeatureExtraction:
     sample_rate : int, optional
         Convert audio to use this sample rate.
 
+    Attributes
+    ----------
+    cache : `pyannote.audio.features.cache.FeatureCache`, optional
+        Cache of whole-file features used by `crop` when no data augmentation
+        is applied. Disabled by default. Set it on a feature extractor (or on
+        `FeatureExtraction` to share it between all feature extractors) to
+        enable it. Note that crops are then cropped from features extracted
+        on the whole file, which are not always the same as features
+        extracted on the crop alone (e.g. because of per-file normalization,
+        `top_db` clipping of librosa features, or edge effects).
+
+    Usage
+    -----
+    >>> feature_extraction = LibrosaMFCC()
+    >>> feature_extraction.cache = FeatureCache(max_bytes=2 ** 30)
+
     See also
     --------
     `pyannote.audio.augmentation.AddNoise`
     """
 
+    cache = None
+
     def __init__(self, augmentation=None, sample_rate=None):
         super().__init__()
         self.sample_rate = sample_rate
@@ -131,34 +154,158 @@ class FeatureExtraction:
         msg = "`FeatureExtractions subclasses must implement " "`get_features` method."
         raise NotImplementedError(msg)
 
-    def __call__(self, current_file) -> SlidingWindowFeature:
+    def get_features_batch(self, y, sample_rate):
+        """Extract features from a batch of waveforms
+
+        Default implementation simply loops over the batch. Subclasses may
+        provide a faster (vectorized) implementation.
+
+        Parameters
+        ----------
+        y : (batch_size, n_samples) numpy array
+            Batch of waveforms.
+        sample_rate : int
+            Sample rate.
+
+        Returns
+        -------
+        features : (batch_size, n_frames, dimension) numpy array
+            Extracted features
+        """
+        return np.stack([self.get_features(y_[:, np.newaxis], sample_rate) for y_ in y])
+
+    def get_channel_features(self, y, sample_rate) -> List[np.ndarray]:
+        """Extract features from each channel of a multi-channel waveform
+
+        Parameters
+        ----------
+        y : (n_samples, n_channels) numpy array
+            Waveform.
+        sample_rate : int
+            Sample rate.
+
+        Returns
+        -------
+        features : list of (n_frames, dimension) numpy array
+            Features extracted from each channel.
+        """
+        return list(self.get_features_batch(y.T, sample_rate))
+
+    def __call__(
+        self, current_file, all_channels: bool = False
+    ) -> Union[SlidingWindowFeature, List[SlidingWindowFeature]]:
         """Extract features from file
 
         Parameters
         ----------
         current_file : dict
             `pyannote.database` files.
+        all_channels : bool, optional
+            Extract features from all channels at once, decoding the audio file
+            only once. The `channel` key of `current_file` is ignored.
+            Defaults to extracting features from the channel selected by
+            `current_file["channel"]` (or the downmixed waveform).
 
         Returns
         -------
         features : `pyannote.core.SlidingWindowFeature`
-            Extracted features
+            Extracted features. A list with one `SlidingWindowFeature` per
+            channel is returned when `all_channels` is True.
         """
 
         # load waveform, re-sample, convert to mono, augment, normalize
-        y, sample_rate = self.raw_audio_(current_file, return_sr=True)
+        y, sample_rate = self.raw_audio_(
+            current_file, return_sr=True, all_channels=all_channels
+        )
 
         # compute features
-        features = self.get_features(y.data, sample_rate)
+        if all_channels:
+            features = self.get_channel_features(y.data, sample_rate)
+        else:
+            features = [self.get_features(y.data, sample_rate)]
 
         # basic quality check
-        if np.any(np.isnan(features)):
+        if any(np.any(np.isnan(f)) for f in features):
             uri = get_unique_identifier(current_file)
             msg = f'Features extracted from "{uri}" contain NaNs.'
             warnings.warn(msg.format(uri=uri))
 
         # wrap features in a `SlidingWindowFeature` instance
-        return SlidingWindowFeature(features, self.sliding_window)
+        features = [SlidingWindowFeature(f, self.sliding_window) for f in features]
+        return features if all_channels else features[0]
+
+    def blocks(self, current_file, duration: float = 60.0):
+        """Extract features block by block
+
+        Unlike `__call__`, the whole waveform is never loaded into memory.
+        Audio blocks are extended with enough context on both sides for
+        features close to block boundaries to be computed as if the whole
+        file had been processed at once.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` files.
+        duration : float, optional
+            Block duration, in seconds. Defaults to 60s.
+
+        Yields
+        ------
+        features : `pyannote.core.SlidingWindowFeature`
+            Extracted features. Consecutive blocks are contiguous (i.e. they
+            neither overlap nor leave any gap).
+
+        Notes
+        -----
+        Features relying on file-level statistics (e.g. dB scaling clipped
+        relative to the loudest frame) may slightly differ from `__call__`.
+        """
+
+        frames = self.sliding_window
+
+        sample_rate = self.sample_rate
+        if sample_rate is None:
+            sample_rate = get_audio_sample_rate(current_file)
+
+        # number of frames in each block (and in the context on both sides)
+        # context accounts for frame duration, normalization and up to 10
+        # frames of temporal derivatives.
+        n_frames = max(1, int(np.round(duration / frames.step)))
+        n_context = int(
+            np.ceil((self.get_context_duration() + frames.duration) / frames.step) + 10
+        )
+
+        # blocks must start on a frame boundary
+        samples_per_frame = frames.step * sample_rate
+        step = n_frames * samples_per_frame / sample_rate
+        context = n_context * samples_per_frame / sample_rate
+
+        audio_blocks = self.raw_audio_.blocks(
+            current_file, duration=step + 2 * context, step=step
+        )
+
+        # look one block ahead to find out which one is the last one
+        y = next(audio_blocks, None)
+        i = 0
+        while y is not None:
+
+            next_y = next(audio_blocks, None)
+
+            features = self.get_features(y.data, sample_rate)
+
+            # index of first and last (excluded) frames to keep
+            start = 0 if i == 0 else n_context
+            end = len(features) if next_y is None else n_context + n_frames
+
+            first_frame = i * n_frames + start
+            sliding_window = SlidingWindow(
+                start=frames.start + first_frame * frames.step,
+                duration=frames.duration,
+                step=frames.step,
+            )
+            yield SlidingWindowFeature(features[start:end], sliding_window)
+
+            y, i = next_y, i + 1
 
     def get_context_duration(self) -> float:
         """
@@ -172,9 +319,20 @@ class FeatureExtraction:
         """
         return 0.0
 
+    def _cache_key(self, current_file):
+        """Key used to store `current_file` features in `self.cache`"""
+
+        # unique token identifying this feature extractor. it is created
+        # lazily so that subclasses do not have to call super().__init__ and
+        # travels along with the instance when it is sent to another process.
+        if not hasattr(self, "cache_token_"):
+            self.cache_token_ = uuid.uuid4().hex
+
+        return self.cache_token_, get_unique_identifier(current_file)
+
     def crop(self, current_file, segment, mode="center", fixed=None) -> np.ndarray:
         """Fast version of self(current_file).crop(segment, mode='center',
-+                                                  fixed=segment.duration)
+                                                   fixed=segment.duration)
 
         Parameters
         ----------
@@ -189,11 +347,26 @@ class FeatureExtraction:
         features : (n_frames, dimension) numpy array
             Extracted features
 
+        Notes
+        -----
+        When `self.cache` is set (it is not by default) and `augmentation` is
+        None, features of the whole file are extracted on first call and
+        subsequent crops are served from `self.cache`.
+
         See also
         --------
         `pyannote.core.SlidingWindowFeature.crop`
         """
 
+        # without data augmentation, features do not change from one call to
+        # the other: extract them once for the whole file and crop from there.
+        if self.augmentation is None and self.cache is not None:
+            data = self.cache.get(
+                self._cache_key(current_file), lambda: self(current_file).data
+            )
+            features = SlidingWindowFeature(data, self.sliding_window)
+            return features.crop(segment, mode=mode, fixed=fixed)
+
         context = self.get_context_duration()
 
         # extend segment on both sides with requested context
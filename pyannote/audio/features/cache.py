@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Feature caches"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+from typing import Hashable
+from typing import Text
+
+import numpy as np
+
+from pyannote.core import SlidingWindowFeature
+
+
+class FeatureCache:
+    """Least-recently-used cache of whole-file features
+
+    Features are kept in memory until `max_bytes` is exceeded. Least recently
+    used entries are then either dropped or, when `directory` is provided,
+    spilled to disk and memory-mapped back (in which case they no longer count
+    against the memory budget).
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Memory budget, in bytes. Defaults to 1GB.
+    directory : Path, optional
+        Directory where evicted features are spilled. Defaults to dropping
+        them altogether.
+
+    Usage
+    -----
+    >>> cache = FeatureCache(max_bytes=2 ** 30, directory="/tmp/features")
+    >>> data = cache.get(key, lambda: feature_extraction(current_file).data)
+    """
+
+    def __init__(self, max_bytes: int = 2 ** 30, directory: Path = None):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.directory = None if directory is None else Path(directory)
+
+        self.data_ = OrderedDict()
+        self.n_bytes_ = 0
+        self.lock_ = threading.Lock()
+
+    def __getstate__(self):
+        # cached features are not sent over to other processes
+        return {"max_bytes": self.max_bytes, "directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.data_)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data_
+
+    @property
+    def n_bytes(self) -> int:
+        """Number of bytes currently held in memory"""
+        return self.n_bytes_
+
+    def clear(self):
+        """Empty the cache (spilled files are left on disk)"""
+        with self.lock_:
+            self.data_.clear()
+            self.n_bytes_ = 0
+
+    def _spill_path(self, key: Hashable) -> Path:
+        digest = hashlib.sha1(repr(key).encode("utf8")).hexdigest()
+        return self.directory / f"{digest}.npy"
+
+    def _spill(self, key: Hashable, data: np.ndarray) -> np.ndarray:
+        """Write `data` to disk and return its read-only memory map"""
+
+        path = self._spill_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to a temporary file first so that concurrent readers never
+        # memory-map a partially written file
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp, path)
+
+        return np.load(path, mmap_mode="r")
+
+    def _evict(self):
+        """Evict least recently used in-memory entries until within budget"""
+
+        for key in list(self.data_):
+
+            if self.n_bytes_ <= self.max_bytes:
+                break
+
+            data = self.data_[key]
+
+            # memory-mapped entries do not count against the budget
+            if isinstance(data, np.memmap):
+                continue
+
+            self.n_bytes_ -= data.nbytes
+            if self.directory is None:
+                del self.data_[key]
+            else:
+                self.data_[key] = self._spill(key, data)
+
+    def get(self, key: Hashable, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Get cached features, computing them on cache miss
+
+        Parameters
+        ----------
+        key : hashable
+            Cache key.
+        compute : callable
+            Called without argument on cache miss. Must return features as
+            a numpy array.
+
+        Returns
+        -------
+        data : numpy array
+            Cached features. It is read-only.
+        """
+
+        with self.lock_:
+            if key in self.data_:
+                self.data_.move_to_end(key)
+                return self.data_[key]
+
+        # features are computed outside of the lock so that threads do not
+        # wait for each other. the same file may therefore occasionally be
+        # processed twice.
+        data = np.asarray(compute())
+        data.setflags(write=False)
+
+        with self.lock_:
+            if key in self.data_:
+                self.data_.move_to_end(key)
+                return self.data_[key]
+
+            # features too large for the memory budget go straight to disk
+            if self.directory is not None and data.nbytes > self.max_bytes:
+                data = self._spill(key, data)
+
+            self.data_[key] = data
+            if not isinstance(data, np.memmap):
+                self.n_bytes_ += data.nbytes
+            self._evict()
+
+            return data
+
+
+def get_file_fingerprint(current_file, content: bool = False) -> Text:
+    """Fingerprint of audio file
+
+    Parameters
+    ----------
+    current_file : dict
+        `pyannote.database` file.
+    content : bool, optional
+        Hash the whole content of the audio file. Defaults to only relying on
+        its path, size and modification time.
+
+    Returns
+    -------
+    fingerprint : str
+        Fingerprint of audio (and selected channel).
+    """
+
+    sha = hashlib.sha256()
+    sha.update(repr(current_file.get("channel", None)).encode("utf8"))
+
+    if "waveform" in current_file:
+        waveform = np.ascontiguousarray(current_file["waveform"])
+        sha.update(repr((waveform.shape, waveform.dtype.str)).encode("utf8"))
+        sha.update(waveform.tobytes())
+        return sha.hexdigest()
+
+    path = Path(current_file["audio"]).resolve()
+    if content:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                sha.update(chunk)
+    else:
+        stat = path.stat()
+        sha.update(repr((str(path), stat.st_size, stat.st_mtime_ns)).encode("utf8"))
+
+    return sha.hexdigest()
+
+
+def get_pretrained_fingerprint(pretrained) -> Text:
+    """Fingerprint of pretrained model and its configuration
+
+    Parameters
+    ----------
+    pretrained : `pyannote.audio.features.Pretrained`
+        Pretrained model.
+
+    Returns
+    -------
+    fingerprint : str
+        Fingerprint of model weights (and whether they are quantized),
+        feature extraction parameters, chunks duration and step, and whether
+        chunks are processed approximately or statefully.
+    """
+
+    # unwrap `pyannote.audio.features.wrapper.Wrapper` instances
+    pretrained = getattr(pretrained, "scorer_", pretrained)
+
+    sha = hashlib.sha256()
+
+    # model weights
+    weights_pt = getattr(pretrained, "weights_pt_", None)
+    if weights_pt is not None and Path(weights_pt).exists():
+        with open(weights_pt, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                sha.update(chunk)
+    else:
+        for name, tensor in pretrained.model_.state_dict().items():
+            sha.update(name.encode("utf8"))
+            sha.update(tensor.detach().cpu().numpy().tobytes())
+
+    # feature extraction parameters
+    feature_extraction = pretrained.feature_extraction_
+    params = {
+        key: value
+        for key, value in vars(feature_extraction).items()
+        if isinstance(value, (bool, int, float, str, type(None)))
+    }
+    params["__class__"] = type(feature_extraction).__name__
+
+    # how the model is applied
+    params["__apply__"] = {
+        "duration": pretrained.duration,
+        "step": pretrained.step,
+        "return_intermediate": repr(pretrained.return_intermediate),
+    }
+    # (only when enabled, to keep fingerprints of default settings unchanged)
+    if getattr(pretrained, "quantize", False):
+        params["__apply__"]["quantize"] = True
+    if getattr(pretrained, "approximate", False):
+        params["__apply__"]["approximate"] = True
+    if getattr(pretrained, "stateful", False):
+        params["__apply__"]["stateful"] = True
+
+    sha.update(json.dumps(params, sort_keys=True).encode("utf8"))
+
+    return sha.hexdigest()
+
+
+class PretrainedCache:
+    """Content-addressed on-disk cache of pretrained model outputs
+
+    Outputs are stored under a key derived from both the audio file
+    fingerprint and the model fingerprint (weights, feature extraction
+    parameters, chunks duration and step). Changing any of them leads to a
+    different key so that stale outputs are never returned. Least recently
+    used outputs are evicted whenever the cache grows larger than `max_bytes`.
+
+    Parameters
+    ----------
+    pretrained : `pyannote.audio.features.Pretrained`
+        Pretrained model.
+    root_dir : Path
+        Cache directory. It can be shared by several models.
+    max_bytes : int, optional
+        Disk budget, in bytes. Defaults to 10GB.
+    content : bool, optional
+        Fingerprint audio files based on their whole content. Defaults to
+        relying on their path, size, and modification time.
+
+    Usage
+    -----
+    >>> pretrained = PretrainedCache(Pretrained(validate_dir), "~/.cache/scores")
+    >>> scores = pretrained(current_file)  # slow on first call
+    >>> scores = pretrained(current_file)  # fast on subsequent calls
+    """
+
+    def __init__(
+        self,
+        pretrained,
+        root_dir: Path,
+        max_bytes: int = 10 * 2 ** 30,
+        content: bool = False,
+    ):
+        super().__init__()
+        self.pretrained = pretrained
+        self.root_dir = Path(root_dir).expanduser().resolve()
+        self.max_bytes = max_bytes
+        self.content = content
+
+        self.fingerprint_ = get_pretrained_fingerprint(pretrained)
+
+        # total size of cached outputs (computed lazily)
+        self.n_bytes_ = None
+
+    def __getattr__(self, name):
+        # behave like the wrapped pretrained model
+        if name == "pretrained":
+            raise AttributeError(name)
+        return getattr(self.pretrained, name)
+
+    def get_path(self, current_file) -> Path:
+        sha = hashlib.sha256()
+        sha.update(self.fingerprint_.encode("utf8"))
+        sha.update(get_file_fingerprint(current_file, content=self.content).encode())
+        key = sha.hexdigest()
+        return self.root_dir / key[:2] / f"{key}.npy"
+
+    def _entries(self):
+        return list(self.root_dir.glob("*/*.npy"))
+
+    def _evict(self):
+        """Remove least recently used outputs until within budget"""
+
+        if self.n_bytes_ is None:
+            self.n_bytes_ = sum(path.stat().st_size for path in self._entries())
+
+        if self.n_bytes_ <= self.max_bytes:
+            return
+
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        # leave some headroom so that the whole cache is not scanned again
+        # on the very next call
+        self.n_bytes_ = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.n_bytes_ <= 0.9 * self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.n_bytes_ -= size
+
+    def __call__(self, current_file) -> SlidingWindowFeature:
+        """Get (possibly cached) output of pretrained model
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        output : `pyannote.core.SlidingWindowFeature`
+            Output of pretrained model.
+        """
+
+        path = self.get_path(current_file)
+
+        try:
+            data = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            data = None
+
+        if data is not None:
+            # mark as recently used
+            os.utime(path)
+            return SlidingWindowFeature(data, self.pretrained.sliding_window)
+
+        output = self.pretrained(current_file)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, output.data)
+        os.replace(tmp, path)
+
+        if self.n_bytes_ is not None:
+            self.n_bytes_ += path.stat().st_size
+        self._evict()
+
+        return output
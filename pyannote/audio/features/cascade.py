@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Cheap signal-based cascade in front of pretrained models"""
+
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from pyannote.core import Segment
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+from pyannote.core import Timeline
+
+from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import OverlapAddAccumulator
+
+
+def get_energy_and_flatness(
+    y: np.ndarray,
+    sample_rate: int,
+    frames: SlidingWindow,
+    max_energy: float = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute frame-wise energy and spectral flatness
+
+    Parameters
+    ----------
+    y : (n_samples, ) numpy array
+        Waveform.
+    sample_rate : int
+        Sample rate.
+    frames : `pyannote.core.SlidingWindow`
+        Analysis frames (starting at 0).
+    max_energy : float, optional
+        Only compute spectral flatness of frames whose energy is lower than
+        `max_energy` dBFS (flatness of other frames is set to 0). Defaults to
+        computing it for all frames.
+
+    Returns
+    -------
+    energy : (n_frames, ) numpy array
+        Energy, in dBFS.
+    flatness : (n_frames, ) numpy array
+        Spectral flatness, between 0 (pure tone) and 1 (white noise).
+    """
+
+    n_samples = int(np.round(frames.duration * sample_rate))
+    hop = int(np.round(frames.step * sample_rate))
+
+    if len(y) < n_samples:
+        return np.zeros((0,), dtype=np.float32), np.zeros((0,), dtype=np.float32)
+
+    # (n_frames, n_samples) view of the waveform (no copy)
+    framed = np.lib.stride_tricks.sliding_window_view(y, n_samples)[::hop]
+
+    energy = 10.0 * np.log10(np.mean(framed ** 2, axis=1) + 1e-10)
+
+    flatness = np.zeros(len(framed), dtype=np.float32)
+    (indices,) = np.where(
+        np.ones(len(framed), dtype=bool) if max_energy is None else energy < max_energy
+    )
+
+    # process frames block by block to bound memory usage
+    window = np.hanning(n_samples).astype(np.float32)
+    for i in range(0, len(indices), 4096):
+        block = indices[i : i + 4096]
+        spectrum = np.abs(np.fft.rfft(framed[block] * window, axis=1)) ** 2 + 1e-10
+        flatness[block] = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(
+            spectrum, axis=1
+        )
+
+    return energy, flatness
+
+
+class EnergyCascade:
+    """Skip clearly silent regions before applying pretrained model
+
+    Frame energy and spectral flatness are computed on the whole waveform
+    (which is orders of magnitude cheaper than running a neural network).
+    Frames are marked as silent when they are quieter than `energy_threshold`,
+    or when they are noise-like (i.e. with spectral flatness higher than
+    `flatness_threshold`) and less than 20dB louder than `energy_threshold`.
+    The model is then only applied on chunks overlapping the remaining
+    regions, and merged back into one score track.
+
+    Parameters
+    ----------
+    pretrained : `pyannote.audio.features.Pretrained`
+        Pretrained model returning frame-level scores (e.g. speech activity
+        detection).
+    energy_threshold : float, optional
+        Energy threshold, in dBFS. Defaults to -60dB.
+    flatness_threshold : float, optional
+        Spectral flatness threshold. Defaults to 0.5. Set to 1 to only rely
+        on energy.
+    min_duration : float, optional
+        Only skip silent regions longer than `min_duration` seconds. Defaults
+        to the duration of the chunks the model is applied on.
+    collar : float, optional
+        Shrink silent regions by that many seconds on both sides, to avoid
+        skipping soft speech onsets and offsets. Defaults to 0.5s.
+
+    Usage
+    -----
+    >>> sad = EnergyCascade(Pretrained(validate_dir))
+    >>> scores = sad(current_file)
+    >>> pipeline = SpeechActivityDetection(scores=sad)
+
+    Notes
+    -----
+    Scores of frames within (or close to) non-silent regions are the same as
+    those returned by `pretrained`. Frames within skipped regions get the
+    average scores of the model applied on one of those regions.
+    """
+
+    def __init__(
+        self,
+        pretrained,
+        energy_threshold: float = -60.0,
+        flatness_threshold: float = 0.5,
+        min_duration: float = None,
+        collar: float = 0.5,
+    ):
+        super().__init__()
+
+        # unwrap `pyannote.audio.features.wrapper.Wrapper` instances
+        pretrained = getattr(pretrained, "scorer_", pretrained)
+
+        if pretrained.model_.resolution == RESOLUTION_CHUNK:
+            msg = "EnergyCascade only supports models returning frame-level scores."
+            raise ValueError(msg)
+
+        self.pretrained = pretrained
+        self.energy_threshold = energy_threshold
+        self.flatness_threshold = flatness_threshold
+        self.min_duration = min_duration
+        self.collar = collar
+
+        # energy and spectral flatness analysis frames
+        self.frames_ = SlidingWindow(start=0.0, duration=0.025, step=0.010)
+
+    def __getattr__(self, name):
+        # behave like the wrapped pretrained model
+        if name == "pretrained":
+            raise AttributeError(name)
+        return getattr(self.pretrained, name)
+
+    def get_silence(self, y: np.ndarray, sample_rate: int) -> Timeline:
+        """Get (long enough) clearly silent regions
+
+        Parameters
+        ----------
+        y : (n_samples, 1) numpy array
+            Waveform.
+        sample_rate : int
+            Sample rate.
+
+        Returns
+        -------
+        silence : `pyannote.core.Timeline`
+            Silent regions.
+        """
+
+        min_duration = self.min_duration
+        if min_duration is None:
+            min_duration = self.pretrained.duration
+
+        energy, flatness = get_energy_and_flatness(
+            y[:, 0],
+            sample_rate,
+            self.frames_,
+            max_energy=self.energy_threshold + 20.0,
+        )
+
+        silent = (energy < self.energy_threshold) | (
+            (flatness > self.flatness_threshold)
+            & (energy < self.energy_threshold + 20.0)
+        )
+
+        # find boundaries of consecutive silent frames
+        change = np.diff(np.hstack([[False], silent, [False]]).astype(np.int8))
+        (starts,) = np.where(change == 1)
+        (ends,) = np.where(change == -1)
+
+        silence = Timeline()
+        for start, end in zip(starts, ends):
+            segment = Segment(
+                self.frames_[start].start + self.collar,
+                self.frames_[end - 1].end - self.collar,
+            )
+            if segment.duration >= min_duration:
+                silence.add(segment)
+
+        return silence
+
+    def __call__(self, current_file) -> SlidingWindowFeature:
+        """Apply pretrained model on non-silent regions
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        output : `pyannote.core.SlidingWindowFeature`
+            Model output.
+        """
+
+        pretrained = self.pretrained
+        model = pretrained.model_
+
+        y, sample_rate = pretrained.raw_audio_(current_file, return_sr=True)
+        silence = self.get_silence(y.data, sample_rate)
+
+        features = SlidingWindowFeature(
+            pretrained.feature_extraction_.get_features(y.data, sample_rate),
+            pretrained.feature_extraction_.sliding_window,
+        )
+
+        # same chunks as Model.slide
+        support = features.extent
+        if support.duration < pretrained.chunks_.duration:
+            chunks, fixed = [support], support.duration
+        else:
+            chunks = list(pretrained.chunks_(support, align_last=True))
+            fixed = pretrained.chunks_.duration
+
+        # skip chunks that are entirely within silent regions...
+        start = np.array([chunk.start for chunk in chunks])
+        end = np.array([chunk.end for chunk in chunks])
+        skip = np.zeros(len(chunks), dtype=bool)
+        for segment in silence:
+            skip |= (start >= segment.start) & (end <= segment.end)
+
+        # ... but one, whose output is used for all skipped frames
+        (skipped,) = np.where(skip)
+        if len(skipped) > 0:
+            skip[skipped[len(skipped) // 2]] = False
+        (indices,) = np.where(~skip)
+
+        resolution = pretrained.get_resolution()
+        accumulator = OverlapAddAccumulator(
+            resolution, alignment=model.alignment, fixed=fixed
+        )
+        n_frames = resolution.samples(chunks[-1].end, mode="center")
+
+        # frames covered by processed chunks get their actual output...
+        covered = np.zeros(n_frames, dtype=bool)
+        # ... while those only covered by skipped chunks are filled
+        to_fill = np.zeros(n_frames, dtype=bool)
+        for c in skipped:
+            ((s, e),) = resolution.crop(
+                chunks[c], mode=model.alignment, fixed=fixed, return_ranges=True
+            )
+            to_fill[max(0, s) : max(0, e)] = True
+
+        for i in range(0, len(indices), pretrained.batch_size):
+            batch = indices[i : i + pretrained.batch_size]
+            X = np.stack(
+                [features.crop(chunks[c], mode="center", fixed=fixed) for c in batch]
+            )
+            tX = torch.tensor(X, dtype=torch.float32, device=pretrained.device)
+            with torch.no_grad():
+                tfX = model(tX, return_intermediate=pretrained.return_intermediate)
+            fX = tfX.detach().to("cpu").numpy()
+
+            for c, fX_ in zip(batch, fX):
+                accumulator.add(chunks[c], fX_)
+                ((s, e),) = resolution.crop(
+                    chunks[c], mode=model.alignment, fixed=fixed, return_ranges=True
+                )
+                covered[max(0, s) : max(0, e)] = True
+
+                if len(skipped) > 0 and c == skipped[len(skipped) // 2]:
+                    fill = np.mean(fX_, axis=0)
+
+        data = accumulator.pop(n_frames)
+        if len(skipped) > 0:
+            to_fill &= ~covered
+            data[to_fill[: len(data)]] = fill
+
+        return SlidingWindowFeature(data, pretrained.sliding_window)
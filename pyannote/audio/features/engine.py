@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+"""
+# Batched feature extraction engine
+
+NumPy implementation of `librosa` spectrogram, mel-spectrogram and MFCC
+extraction, working on batches of waveforms at once. Windows, mel filterbanks
+and DCT matrices are computed once and cached.
+"""
+
+from functools import lru_cache
+
+import librosa
+import numpy as np
+import scipy.fftpack
+import scipy.signal
+from numpy.lib.stride_tricks import as_strided
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def _matmul(X: np.ndarray, W: np.ndarray) -> np.ndarray:
+    # (batch_size, n_frames, n) x (n, m) product as one single 2D product
+    batch_size, n_frames, n = X.shape
+    XW = np.dot(X.reshape(batch_size * n_frames, n), W.astype(X.dtype, copy=False))
+    return XW.reshape(batch_size, n_frames, -1)
+
+
+@lru_cache(maxsize=32)
+def get_window(window: str, n_fft: int) -> np.ndarray:
+    """Get (cached) analysis window
+
+    Parameters
+    ----------
+    window : str
+        Window name (e.g. "hann" or "hamming").
+    n_fft : int
+        Window length, in samples.
+
+    Returns
+    -------
+    window : (n_fft, ) np.ndarray
+        Periodic window (same as `librosa.filters.get_window`).
+    """
+    return _read_only(scipy.signal.get_window(window, n_fft, fftbins=True))
+
+
+@lru_cache(maxsize=32)
+def get_mel_filterbank(
+    sample_rate: int,
+    n_fft: int,
+    n_mels: int,
+    fmin: float = 0.0,
+    fmax: float = None,
+    htk: bool = False,
+) -> np.ndarray:
+    """Get (cached) mel filterbank
+
+    Parameters
+    ----------
+    sample_rate : int
+        Sample rate.
+    n_fft : int
+        FFT length.
+    n_mels : int
+        Number of mel bands.
+    fmin, fmax : float, optional
+        Lowest and highest frequencies. Defaults to 0 and sample_rate / 2.
+    htk : bool, optional
+        Use HTK formula instead of Slaney. Defaults to False.
+
+    Returns
+    -------
+    filterbank : (n_fft // 2 + 1, n_mels) np.ndarray
+        Mel filterbank (transposed `librosa.filters.mel`).
+    """
+    mel_basis = librosa.filters.mel(
+        sr=sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax, htk=htk
+    )
+    return _read_only(np.ascontiguousarray(mel_basis.T))
+
+
+@lru_cache(maxsize=32)
+def get_dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+    """Get (cached) orthonormal type-II DCT matrix
+
+    Parameters
+    ----------
+    n_mels : int
+        Number of mel bands.
+    n_mfcc : int
+        Number of cepstral coefficients.
+
+    Returns
+    -------
+    dct : (n_mels, n_mfcc) np.ndarray
+        DCT matrix, such that `np.dot(S, dct)` are the first `n_mfcc`
+        coefficients of the DCT of (n_frames, n_mels) S.
+    """
+    dct = scipy.fftpack.dct(np.eye(n_mels), type=2, norm="ortho", axis=0)
+    return _read_only(np.ascontiguousarray(dct[:n_mfcc].T))
+
+
+def frame(
+    y: np.ndarray, n_fft: int, hop_length: int, center: bool = True
+) -> np.ndarray:
+    """Slice waveforms into (overlapping) frames
+
+    Parameters
+    ----------
+    y : (batch_size, n_samples) np.ndarray
+        Batch of waveforms.
+    n_fft : int
+        Frame length, in samples.
+    hop_length : int
+        Step between consecutive frames, in samples.
+    center : bool, optional
+        Reflect-pad waveforms so that frame t is centered on sample
+        t x hop_length. Defaults to True.
+
+    Returns
+    -------
+    frames : (batch_size, n_frames, n_fft) np.ndarray
+        Read-only view on (padded) waveforms.
+    """
+
+    if center:
+        y = np.pad(y, ((0, 0), (n_fft // 2, n_fft // 2)), mode="reflect")
+    y = np.ascontiguousarray(y)
+
+    batch_size, n_samples = y.shape
+    n_frames = 1 + (n_samples - n_fft) // hop_length
+    if n_frames < 1:
+        msg = (
+            f"Waveforms are too short ({n_samples:d} samples) to extract "
+            f"frames of {n_fft:d} samples."
+        )
+        raise ValueError(msg)
+
+    stride_batch, stride_sample = y.strides
+    return as_strided(
+        y,
+        shape=(batch_size, n_frames, n_fft),
+        strides=(stride_batch, hop_length * stride_sample, stride_sample),
+        writeable=False,
+    )
+
+
+def spectrogram(
+    y: np.ndarray,
+    n_fft: int,
+    hop_length: int,
+    window: str = "hann",
+    power: float = 1.0,
+    center: bool = True,
+) -> np.ndarray:
+    """Compute magnitude (or power) spectrogram
+
+    Parameters
+    ----------
+    y : (batch_size, n_samples) np.ndarray
+        Batch of waveforms.
+    n_fft : int
+        FFT length (and window length), in samples.
+    hop_length : int
+        Step between consecutive frames, in samples.
+    window : str, optional
+        Window name. Defaults to "hann".
+    power : float, optional
+        Use 1.0 for magnitude (default) and 2.0 for power spectrogram.
+    center : bool, optional
+        See `frame`. Defaults to True.
+
+    Returns
+    -------
+    S : (batch_size, n_frames, n_fft // 2 + 1) np.ndarray
+        Spectrogram.
+    """
+    frames = frame(y, n_fft, hop_length, center=center)
+    stft = np.fft.rfft(frames * get_window(window, n_fft), axis=-1)
+    S = np.abs(stft.astype(np.complex64))
+    if power != 1.0:
+        S = S ** power
+    return S
+
+
+def mel_spectrogram(
+    y: np.ndarray,
+    sample_rate: int,
+    n_fft: int,
+    hop_length: int,
+    n_mels: int = 128,
+    fmin: float = 0.0,
+    fmax: float = None,
+    htk: bool = False,
+    window: str = "hann",
+    power: float = 2.0,
+) -> np.ndarray:
+    """Compute mel-spectrogram
+
+    Parameters
+    ----------
+    y : (batch_size, n_samples) np.ndarray
+        Batch of waveforms.
+    sample_rate : int
+        Sample rate.
+    n_fft, hop_length, window, power :
+        See `spectrogram`.
+    n_mels, fmin, fmax, htk :
+        See `get_mel_filterbank`.
+
+    Returns
+    -------
+    S : (batch_size, n_frames, n_mels) np.ndarray
+        Mel-spectrogram.
+    """
+    S = spectrogram(y, n_fft, hop_length, window=window, power=power)
+    filterbank = get_mel_filterbank(sample_rate, n_fft, n_mels, fmin, fmax, htk)
+    return _matmul(S, filterbank)
+
+
+def power_to_db(S: np.ndarray, amin: float = 1e-10, top_db: float = 80.0) -> np.ndarray:
+    """Convert power spectrogram to decibel units
+
+    Same as `librosa.power_to_db(S, ref=1.0)`, applied on each element of the
+    batch independently.
+
+    Parameters
+    ----------
+    S : (batch_size, n_frames, dimension) np.ndarray
+        Batch of power spectrograms.
+    amin : float, optional
+        Minimum threshold. Defaults to 1e-10.
+    top_db : float, optional
+        Threshold the output at `top_db` below the peak of each spectrogram.
+        Defaults to 80.
+
+    Returns
+    -------
+    S_db : (batch_size, n_frames, dimension) np.ndarray
+        Spectrograms in dB.
+    """
+    S_db = 10.0 * np.log10(np.maximum(amin, S))
+    if top_db is not None:
+        peak = np.max(S_db, axis=(1, 2), keepdims=True)
+        S_db = np.maximum(S_db, peak - top_db)
+    return S_db
+
+
+def mfcc(
+    y: np.ndarray,
+    sample_rate: int,
+    n_mfcc: int,
+    n_fft: int,
+    hop_length: int,
+    n_mels: int = 128,
+    fmin: float = 0.0,
+    fmax: float = None,
+    htk: bool = False,
+) -> np.ndarray:
+    """Compute MFCCs
+
+    Parameters
+    ----------
+    y : (batch_size, n_samples) np.ndarray
+        Batch of waveforms.
+    sample_rate : int
+        Sample rate.
+    n_mfcc : int
+        Number of cepstral coefficients.
+    n_fft, hop_length :
+        See `spectrogram`.
+    n_mels, fmin, fmax, htk :
+        See `get_mel_filterbank`.
+
+    Returns
+    -------
+    mfcc : (batch_size, n_frames, n_mfcc) np.ndarray
+        MFCCs.
+    """
+    S = mel_spectrogram(
+        y,
+        sample_rate,
+        n_fft,
+        hop_length,
+        n_mels=n_mels,
+        fmin=fmin,
+        fmax=fmax,
+        htk=htk,
+    )
+    return _matmul(power_to_db(S), get_dct_matrix(n_mels, n_mfcc))
+
+
+def delta(X: np.ndarray, width: int = 9, order: int = 1) -> np.ndarray:
+    """Compute temporal derivatives
+
+    Same as `librosa.feature.delta` along the frame axis.
+
+    Parameters
+    ----------
+    X : (batch_size, n_frames, dimension) np.ndarray
+        Batch of features.
+    width : int, optional
+        Number of frames over which to compute the derivatives. Defaults to 9.
+    order : int, optional
+        Order of the derivatives. Defaults to 1.
+
+    Returns
+    -------
+    delta : (batch_size, n_frames, dimension) np.ndarray
+        Derivatives.
+    """
+
+    if width > X.shape[1]:
+        msg = (
+            f"Derivatives cannot be computed over {width:d} frames when "
+            f"features only contain {X.shape[1]:d} frames."
+        )
+        raise ValueError(msg)
+
+    return scipy.signal.savgol_filter(
+        X, width, deriv=order, polyorder=order, axis=1, mode="interp"
+    )
@@ -27,11 +27,72 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+from typing import Iterable
+from typing import Iterator
+
 import numpy as np
-import pandas as pd
+from pyannote.core import SlidingWindow
 from pyannote.core import SlidingWindowFeature
 
 
+def _rolling_mean_std(data, half_window, start=0, end=None):
+    """Rolling mean and standard deviation
+
+    Statistics of frame #i are computed over frames [i - half_window, i +
+    half_window], clipped to the actual frames available in `data`.
+
+    Parameters
+    ----------
+    data : (n_samples, n_features) `numpy.ndarray`
+        Features.
+    half_window : int
+        Half window size, in frames.
+    start, end : int, optional
+        Only compute statistics for frames [start, end). Defaults to all frames.
+
+    Returns
+    -------
+    mu, sigma : (end - start, n_features) `numpy.ndarray`
+        Mean and standard deviation (with ddof=1).
+    """
+
+    n_samples = len(data)
+    if end is None:
+        end = n_samples
+
+    data = np.asarray(data)
+    w = half_window
+
+    # shift data to limit round-off errors in running sums
+    shift = np.mean(data, axis=0, dtype=np.float64) if n_samples > 0 else 0.0
+
+    # S1[i] (resp. S2[i]) is the sum (resp. sum of squares) of the first i
+    # (shifted) frames, once padded with w zeros on both sides. This way, sums
+    # over (clipped) window of frame #i are simply S[i + 2w + 1] - S[i].
+    S1 = np.zeros((n_samples + 2 * w + 1,) + data.shape[1:])
+    S2 = np.zeros((n_samples + 2 * w + 1,) + data.shape[1:])
+    np.subtract(data, shift, out=S1[w + 1 : w + 1 + n_samples])
+    np.square(S1[w + 1 : w + 1 + n_samples], out=S2[w + 1 : w + 1 + n_samples])
+    np.cumsum(S1, axis=0, out=S1)
+    np.cumsum(S2, axis=0, out=S2)
+
+    s1 = S1[start + 2 * w + 1 : end + 2 * w + 1] - S1[start:end]
+    s2 = S2[start + 2 * w + 1 : end + 2 * w + 1] - S2[start:end]
+
+    # number of actual frames in each window
+    i = np.arange(start, end)
+    k = np.minimum(n_samples, i + w + 1) - np.maximum(0, i - w)
+    k = k[:, np.newaxis]
+
+    mu = s1 / k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (s2 - s1 * mu) / (k - 1)
+    sigma = np.sqrt(np.maximum(var, 0.0))
+    sigma[k[:, 0] < 2] = np.nan
+
+    return mu + shift, sigma
+
+
 class GlobalStandardization(object):
     """Mean/variance normalization"""
 
@@ -87,6 +148,11 @@ class ShortTermStandardization(object):
     def get_context_duration(self):
         return 0.5 * self.duration
 
+    def get_half_window(self, sliding_window: SlidingWindow) -> int:
+        """Half window size, in frames"""
+        window = sliding_window.samples(self.duration, mode="center")
+        return window // 2
+
     def __call__(self, features, sliding_window=None):
         """Apply short-term standardization
 
@@ -109,31 +175,284 @@ class ShortTermStandardization(object):
         else:
             features_ = SlidingWindowFeature(features, sliding_window)
 
-        window = features_.sliding_window.samples(self.duration, mode="center")
-        if not window % 2:
-            window += 1
+        half_window = self.get_half_window(features_.sliding_window)
+        mu, sigma = _rolling_mean_std(features_.data, half_window)
+        sigma[sigma == 0.0] = 1e-6
 
-        rolling = pd.DataFrame(features_.data).rolling(
-            window=window, center=True, min_periods=window
-        )
-        mu = np.array(rolling.mean())
-        sigma = np.array(rolling.std(ddof=1))
+        normalized_ = (features_.data - mu) / sigma
+
+        if isinstance(features, SlidingWindowFeature):
+            return SlidingWindowFeature(normalized_, features.sliding_window)
+        else:
+            return normalized_
+
+
+class StreamingGlobalStandardization(GlobalStandardization):
+    """Mean/variance normalization of features received block by block
+
+    Mean and variance are updated with every new block (using Welford's
+    algorithm) so that the whole file does not need to be loaded in memory.
+
+    Usage
+    -----
+    # blocks are normalized with statistics of all blocks received so far
+    >>> normalization = StreamingGlobalStandardization()
+    >>> for features in normalization.blocks(feature_extraction.blocks(current_file)):
+    ...     pass
+
+    # same as GlobalStandardization, with two passes over the file
+    >>> normalization = StreamingGlobalStandardization()
+    >>> for features in feature_extraction.blocks(current_file):
+    ...     normalization.update(features)
+    >>> for features in feature_extraction.blocks(current_file):
+    ...     normalized = normalization.normalize(features)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        """Forget about statistics"""
+        self.n_ = 0
+        self.mean_ = 0.0
+        self.m2_ = 0.0
+
+    def update(self, features):
+        """Update statistics with a new block of features
 
-        for i in range(window // 2):
+        Parameters
+        ----------
+        features : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Features.
+        """
+
+        if isinstance(features, SlidingWindowFeature):
+            data = features.data
+        else:
+            data = features
+
+        n = len(data)
+        if n == 0:
+            return
+
+        data = np.asarray(data, dtype=np.float64)
+        mean = np.mean(data, axis=0)
+        m2 = np.sum((data - mean) ** 2, axis=0)
+
+        # merge block statistics with current ones
+        n_ = self.n_ + n
+        delta = mean - self.mean_
+        self.mean_ = self.mean_ + delta * n / n_
+        self.m2_ = self.m2_ + m2 + delta ** 2 * self.n_ * n / n_
+        self.n_ = n_
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.mean_
+
+    @property
+    def std(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self.m2_ / (self.n_ - 1))
+
+    def normalize(self, features, sliding_window=None):
+        """Normalize features with current statistics
+
+        Parameters
+        ----------
+        features : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Features.
+        sliding_window : `SlidingWindow`, optional
+            Not used.
 
-            data = features_.data[: i + window // 2 + 1, :]
-            mu[i] = np.mean(data, axis=0)
-            sigma[i] = np.std(data, axis=0, ddof=1)
+        Returns
+        -------
+        normalized : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Standardized features
+        """
 
-            data = features_.data[-i - window // 2 - 1 :, :]
-            mu[-i - 1] = np.mean(data, axis=0)
-            sigma[-i - 1] = np.std(data, axis=0, ddof=1)
+        if isinstance(features, SlidingWindowFeature):
+            data = features.data
+        else:
+            data = features
 
+        sigma = np.array(self.std, dtype=np.float64, ndmin=1)
         sigma[sigma == 0.0] = 1e-6
 
-        normalized_ = (features_.data - mu) / sigma
+        normalized = (data - self.mean) / sigma
 
         if isinstance(features, SlidingWindowFeature):
-            return SlidingWindowFeature(normalized_, features.sliding_window)
+            return SlidingWindowFeature(normalized, features.sliding_window)
         else:
-            return normalized_
+            return normalized
+
+    def __call__(self, features, sliding_window=None):
+        """Update statistics and normalize features
+
+        Parameters
+        ----------
+        features : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Features.
+        sliding_window : `SlidingWindow`, optional
+            Not used.
+
+        Returns
+        -------
+        normalized : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Features standardized with statistics of all features received
+            so far (including `features`).
+        """
+        self.update(features)
+        return self.normalize(features)
+
+    def blocks(
+        self, blocks: Iterable[SlidingWindowFeature]
+    ) -> Iterator[SlidingWindowFeature]:
+        """Normalize contiguous blocks of features
+
+        Parameters
+        ----------
+        blocks : iterable of `SlidingWindowFeature`
+            Contiguous blocks of features (e.g. `FeatureExtraction.blocks`).
+
+        Yields
+        ------
+        normalized : `SlidingWindowFeature`
+            Standardized features.
+        """
+        self.reset()
+        for features in blocks:
+            yield self(features)
+
+
+class StreamingShortTermStandardization(ShortTermStandardization):
+    """Short term mean/variance normalization of features received block by block
+
+    Concatenating normalized blocks gives exactly the same result as
+    `ShortTermStandardization` applied on the whole file. This implies that
+    normalized features are returned with a delay of half a window.
+
+    Parameters
+    ----------
+    duration : float
+        Window duration in seconds.
+
+    Usage
+    -----
+    >>> normalization = StreamingShortTermStandardization(duration=3.0)
+    >>> for features in normalization.blocks(feature_extraction.blocks(current_file)):
+    ...     pass
+    """
+
+    def __init__(self, duration=3.0):
+        super().__init__(duration=duration)
+        self.reset()
+
+    def reset(self):
+        """Forget about previous blocks"""
+
+        # buffer_[0] is frame #buffer_start_
+        self.buffer_ = None
+        self.buffer_start_ = 0
+
+        # number of frames received (resp. normalized) so far
+        self.n_in_ = 0
+        self.n_out_ = 0
+
+        self.sliding_window_ = None
+
+    def _normalize(self, end: int) -> SlidingWindowFeature:
+
+        half_window = self.get_half_window(self.sliding_window_)
+
+        start = self.n_out_
+        mu, sigma = _rolling_mean_std(
+            self.buffer_,
+            half_window,
+            start=start - self.buffer_start_,
+            end=end - self.buffer_start_,
+        )
+        sigma[sigma == 0.0] = 1e-6
+        data = self.buffer_[start - self.buffer_start_ : end - self.buffer_start_]
+        normalized = (data - mu) / sigma
+        self.n_out_ = end
+
+        # forget about frames that are no longer needed
+        keep_from = max(0, self.n_out_ - half_window)
+        if keep_from > self.buffer_start_:
+            self.buffer_ = self.buffer_[keep_from - self.buffer_start_ :]
+            self.buffer_start_ = keep_from
+
+        sliding_window = SlidingWindow(
+            start=self.sliding_window_[start].start,
+            duration=self.sliding_window_.duration,
+            step=self.sliding_window_.step,
+        )
+        return SlidingWindowFeature(normalized, sliding_window)
+
+    def __call__(self, features: SlidingWindowFeature) -> SlidingWindowFeature:
+        """Normalize next block of features
+
+        Parameters
+        ----------
+        features : `SlidingWindowFeature`
+            Next block of features. Blocks are expected to be contiguous.
+
+        Returns
+        -------
+        normalized : `SlidingWindowFeature`
+            Standardized features, for all frames whose whole window has been
+            received. Remaining frames are returned by subsequent calls (or by
+            `flush`).
+        """
+
+        if self.buffer_ is None:
+            self.buffer_ = features.data
+            # sliding window such that frame #0 is the first frame of first block
+            self.sliding_window_ = features.sliding_window
+        else:
+            self.buffer_ = np.vstack([self.buffer_, features.data])
+        self.n_in_ += len(features)
+
+        half_window = self.get_half_window(self.sliding_window_)
+        return self._normalize(max(self.n_out_, self.n_in_ - half_window))
+
+    def flush(self) -> SlidingWindowFeature:
+        """Normalize remaining frames and reset
+
+        Returns
+        -------
+        normalized : `SlidingWindowFeature`
+            Standardized features, assuming the last block received was the
+            end of the file.
+        """
+        if self.buffer_ is None:
+            return None
+        normalized = self._normalize(self.n_in_)
+        self.reset()
+        return normalized
+
+    def blocks(
+        self, blocks: Iterable[SlidingWindowFeature]
+    ) -> Iterator[SlidingWindowFeature]:
+        """Normalize contiguous blocks of features
+
+        Parameters
+        ----------
+        blocks : iterable of `SlidingWindowFeature`
+            Contiguous blocks of features (e.g. `FeatureExtraction.blocks`).
+
+        Yields
+        ------
+        normalized : `SlidingWindowFeature`
+            Standardized features. Consecutive blocks are contiguous.
+        """
+        self.reset()
+        for features in blocks:
+            normalized = self(features)
+            if len(normalized) > 0:
+                yield normalized
+        normalized = self.flush()
+        if normalized is not None and len(normalized) > 0:
+            yield normalized
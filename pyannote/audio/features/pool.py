@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Multi-process CPU inference"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import Tuple
+
+import torch
+import torch.multiprocessing
+
+from pyannote.core import SlidingWindowFeature
+
+# keys of `pyannote.database` files that workers need to process them
+FILE_KEYS = ("uri", "database", "channel", "audio", "waveform", "duration")
+
+# model held by current worker process
+_pretrained = None
+
+
+def _initialize_worker(pretrained, n_threads: int):
+    global _pretrained
+    torch.set_num_threads(n_threads)
+    _pretrained = pretrained
+
+
+def _process_file(current_file: dict) -> SlidingWindowFeature:
+    return _pretrained(current_file)
+
+
+def imap(
+    pretrained: Callable, files: Iterable, n_jobs: int = 1
+) -> Iterator[Tuple[dict, SlidingWindowFeature]]:
+    """Apply pretrained model on files using multiple threads
+
+    Parameters
+    ----------
+    pretrained : callable
+        Pretrained model (or anything that can be called on files).
+    files : iterable
+        `pyannote.database` files.
+    n_jobs : int, optional
+        Number of threads. Defaults to 1 (i.e. no thread at all).
+
+    Yields
+    ------
+    current_file : dict
+        `pyannote.database` file, in the order of `files`.
+    output : `pyannote.core.SlidingWindowFeature`
+        Output of pretrained model.
+    """
+
+    if n_jobs < 2:
+        for current_file in files:
+            yield current_file, pretrained(current_file)
+        return
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+
+        # bound the number of outputs kept in memory at any time
+        pending = deque()
+        for current_file in files:
+            pending.append((current_file, executor.submit(pretrained, current_file)))
+            if len(pending) >= 2 * n_jobs:
+                current_file, output = pending.popleft()
+                yield current_file, output.result()
+
+        while pending:
+            current_file, output = pending.popleft()
+            yield current_file, output.result()
+
+
+class PretrainedPool:
+    """Pool of worker processes applying pretrained model on CPU
+
+    Each worker process holds its own copy of the model and uses `n_threads`
+    intra-op threads. Model weights are moved to shared memory beforehand so
+    that they are not duplicated in every worker.
+
+    Parameters
+    ----------
+    pretrained : `pyannote.audio.features.Pretrained`
+        Pretrained model. Must run on CPU.
+    n_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs divided by
+        `n_threads`.
+    n_threads : int, optional
+        Number of intra-op threads used by each worker. Defaults to 1.
+
+    Usage
+    -----
+    >>> with PretrainedPool(Pretrained(validate_dir), n_workers=16) as pool:
+    ...     output = pool(current_file)
+    ...     for current_file, output in pool.imap(protocol.test()):
+    ...         pass
+
+    Notes
+    -----
+    Files are distributed across workers: a single file is always processed
+    by a single worker. Calling the pool from several threads at once (as done
+    by `imap`) is therefore needed to keep all workers busy.
+    """
+
+    def __init__(self, pretrained, n_workers: int = None, n_threads: int = 1):
+        super().__init__()
+
+        # unwrap `pyannote.audio.features.wrapper.Wrapper` instances
+        scorer = getattr(pretrained, "scorer_", pretrained)
+
+        device = getattr(scorer, "device", torch.device("cpu"))
+        if torch.device(device).type != "cpu":
+            msg = f"PretrainedPool only supports CPU models (got {device})."
+            raise ValueError(msg)
+
+        self.pretrained = pretrained
+        self.n_threads = n_threads
+        if n_workers is None:
+            n_workers = max(1, multiprocessing.cpu_count() // n_threads)
+        self.n_workers = n_workers
+
+        # workers share (read-only) model weights
+        scorer.model_.share_memory()
+
+        self.pool_ = torch.multiprocessing.Pool(
+            processes=self.n_workers,
+            initializer=_initialize_worker,
+            initargs=(pretrained, self.n_threads),
+        )
+
+    def __getattr__(self, name):
+        # behave like the wrapped pretrained model
+        if name in ("pretrained", "pool_"):
+            raise AttributeError(name)
+        return getattr(self.pretrained, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Terminate worker processes"""
+        self.pool_.terminate()
+        self.pool_.join()
+
+    def __call__(self, current_file) -> SlidingWindowFeature:
+        """Apply pretrained model on file (in one of the worker processes)
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        output : `pyannote.core.SlidingWindowFeature`
+            Output of pretrained model.
+        """
+
+        # only send what is needed to process the file, as (lazy) protocol
+        # files might not be picklable
+        current_file = {
+            key: current_file[key] for key in FILE_KEYS if key in current_file
+        }
+        return self.pool_.apply(_process_file, (current_file,))
+
+    def imap(self, files: Iterable) -> Iterator[Tuple[dict, SlidingWindowFeature]]:
+        """Apply pretrained model on files, using all workers
+
+        Parameters
+        ----------
+        files : iterable
+            `pyannote.database` files.
+
+        Yields
+        ------
+        current_file : dict
+            `pyannote.database` file, in the order of `files`.
+        output : `pyannote.core.SlidingWindowFeature`
+            Output of pretrained model.
+        """
+        return imap(self, files, n_jobs=self.n_workers)
@@ -29,6 +29,11 @@
 
 import yaml
 import io
+import os
+import json
+import socket
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from glob import glob
 import numpy as np
@@ -43,6 +48,179 @@ class PyannoteFeatureExtractionError(Exception):
     pass
 
 
+# arrays stored in containers start at offsets multiple of this many bytes
+CONTAINER_ALIGNMENT = 64
+
+# container shards are rolled over once they reach this size (in bytes)
+CONTAINER_SHARD_SIZE = 2 ** 32
+
+# serializes container writes of threads sharing a process
+CONTAINER_LOCK = threading.Lock()
+
+
+# storage codecs supported by `Precomputed` (None stores arrays as they are)
+CODECS = (None, "float16", "uint8")
+
+# uint8 code reserved for non-finite values
+UINT8_NAN = 255
+
+
+def encode(data: np.ndarray, codec: str = None):
+    """Encode array for storage
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Array to encode.
+    codec : {None, "float16", "uint8"}, optional
+        Use "float16" for half-precision storage and "uint8" for 8-bit linear
+        quantization between minimum and maximum (finite) values of `data`.
+        Defaults to storing `data` as it is.
+
+    Returns
+    -------
+    encoded : np.ndarray
+        Encoded array.
+    params : dict
+        Parameters needed for decoding. Empty, unless codec is "uint8", in
+        which case it contains "scale" and "offset" keys.
+    """
+
+    if codec is None:
+        return data, dict()
+
+    if codec == "float16":
+        return data.astype(np.float16), dict()
+
+    if codec != "uint8":
+        msg = f'Unsupported codec "{codec}" (should be one of {CODECS}).'
+        raise ValueError(msg)
+
+    finite = np.isfinite(data)
+    if np.any(finite):
+        offset, maximum = np.min(data[finite]), np.max(data[finite])
+    else:
+        offset, maximum = 0.0, 0.0
+    scale = (maximum - offset) / (UINT8_NAN - 1) if maximum > offset else 1.0
+
+    encoded = np.full(data.shape, UINT8_NAN, dtype=np.uint8)
+    encoded[finite] = np.round((data[finite] - offset) / scale)
+
+    return encoded, {"scale": float(scale), "offset": float(offset)}
+
+
+def decode(encoded: np.ndarray, codec: str = None, params: dict = None) -> np.ndarray:
+    """Decode array encoded with `encode`
+
+    Parameters
+    ----------
+    encoded : np.ndarray
+        Encoded array.
+    codec : {None, "float16", "uint8"}, optional
+        Codec used for encoding.
+    params : dict, optional
+        Parameters returned by `encode`.
+
+    Returns
+    -------
+    data : np.ndarray
+        Decoded array. Non-finite values of uint8-encoded arrays are decoded
+        as NaNs.
+    """
+
+    if codec is None:
+        return encoded
+
+    if codec == "float16":
+        return encoded.astype(np.float32)
+
+    data = encoded.astype(np.float32) * np.float32(params["scale"]) + np.float32(
+        params["offset"]
+    )
+    data[encoded == UINT8_NAN] = np.nan
+    return data
+
+
+class MemmapCache:
+    """Bounded least-recently-used cache of read-only memory maps
+
+    Opening a memory map (and parsing .npy header) every time a few frames are
+    needed is expensive. This cache keeps up to `max_size` memory maps open.
+    Cached memory maps are re-opened whenever the underlying file is modified
+    or replaced, and are never shared with forked processes (which re-open
+    them lazily instead).
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum number of memory maps kept open. Defaults to 256.
+    """
+
+    def __init__(self, max_size: int = 256):
+        super().__init__()
+        self.max_size = max_size
+        self.memmaps_ = OrderedDict()
+        self.pid_ = os.getpid()
+        self.lock_ = threading.Lock()
+
+    def clear(self):
+        with self.lock_:
+            self.memmaps_.clear()
+
+    def get(self, path: Path, mode: str = "npy") -> np.ndarray:
+        """Get (possibly cached) read-only memory map
+
+        Parameters
+        ----------
+        path : Path
+            Path to file.
+        mode : {"npy", "raw"}, optional
+            Use "npy" to map the array stored in a .npy file and "raw" to map
+            the whole file as an array of bytes. Defaults to "npy".
+
+        Returns
+        -------
+        memmap : np.memmap
+            Read-only memory map.
+        """
+
+        path = str(path)
+
+        # detects modified and replaced files
+        stat = os.stat(path)
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        with self.lock_:
+
+            # memory maps inherited from parent process are dropped
+            if os.getpid() != self.pid_:
+                self.memmaps_.clear()
+                self.pid_ = os.getpid()
+
+            key = (path, mode)
+            if key in self.memmaps_:
+                cached_signature, memmap = self.memmaps_[key]
+                if cached_signature == signature:
+                    self.memmaps_.move_to_end(key)
+                    return memmap
+
+            if mode == "npy":
+                memmap = open_memmap(path, mode="r")
+            else:
+                memmap = np.memmap(path, dtype=np.uint8, mode="r")
+
+            self.memmaps_[key] = (signature, memmap)
+            self.memmaps_.move_to_end(key)
+            while len(self.memmaps_) > self.max_size:
+                self.memmaps_.popitem(last=False)
+
+            return memmap
+
+
+# shared by all `Precomputed` instances
+MEMMAP_CACHE = MemmapCache()
+
+
 class Precomputed:
     """Precomputed features
 
@@ -60,6 +238,16 @@ class Precomputed:
         exists and contains `metadata.yml`.
     classes : iterable, optional
         Human-readable name for each dimension.
+    container : `bool`, optional
+        Pack all arrays into a few large shard files instead of storing one
+        `.npy` file per file. Defaults to the format used by the existing
+        `root_dir`, or to one `.npy` file per file when creating it.
+    codec : {"float16", "uint8"}, optional
+        Store arrays in half precision ("float16") or with 8-bit linear
+        quantization ("uint8"), trading precision for 2x (resp. 4x) smaller
+        footprint. Arrays are decoded to float32 transparently. Defaults to
+        the codec used by the existing `root_dir`, or to storing arrays as
+        they are when creating it.
 
     Notes
     -----
@@ -67,6 +255,15 @@ class Precomputed:
     `sliding_window` and `dimension` parameters in order to create and
     populate file `root_dir/metadata.yml` when instantiating.
 
+    Containers are made of shard files `root_dir/data/{writer}-{k}.bin` and
+    index files `root_dir/index/{writer}.jsonl` mapping each file unique
+    identifier to the shard, offset, shape and dtype of its features, where
+    {writer} identifies the host and process that wrote them. This makes it
+    possible to dump features from several processes (or machines sharing
+    `root_dir`) at once.
+
+    Per-file quantization parameters of "uint8" codec are stored in container
+    index or, for `.npy` files, in a `{uri}.params.npy` companion file.
     """
 
     def get_path(self, item):
@@ -74,6 +271,11 @@ class Precomputed:
         path = "{root_dir}/{uri}.npy".format(root_dir=self.root_dir, uri=uri)
         return path
 
+    def get_params_path(self, item):
+        uri = get_unique_identifier(item)
+        path = "{root_dir}/{uri}.params.npy".format(root_dir=self.root_dir, uri=uri)
+        return path
+
     def __init__(
         self,
         root_dir=None,
@@ -82,12 +284,18 @@ class Precomputed:
         dimension=None,
         classes=None,
         augmentation=None,
+        container=None,
+        codec=None,
     ):
 
         if augmentation is not None:
             msg = "Data augmentation is not supported by `Precomputed`."
             raise ValueError(msg)
 
+        if codec not in CODECS:
+            msg = f'Unsupported codec "{codec}" (should be one of {CODECS}).'
+            raise ValueError(msg)
+
         super(Precomputed, self).__init__()
         self.root_dir = Path(root_dir).expanduser().resolve(strict=False)
         self.use_memmap = use_memmap
@@ -100,8 +308,18 @@ class Precomputed:
 
             self.dimension_ = params.pop("dimension")
             self.classes_ = params.pop("classes", None)
+            self.container_ = params.pop("container", False)
+            self.codec_ = params.pop("codec", None)
             self.sliding_window_ = SlidingWindow(**params)
 
+            if container is not None and self.container_ != container:
+                msg = 'inconsistent "container" (is {0}, should be: {1})'
+                raise ValueError(msg.format(container, self.container_))
+
+            if codec is not None and self.codec_ != codec:
+                msg = 'inconsistent "codec" (is {0}, should be: {1})'
+                raise ValueError(msg.format(codec, self.codec_))
+
             if dimension is not None and self.dimension_ != dimension:
                 msg = 'inconsistent "dimension" (is: {0}, should be: {1})'
                 raise ValueError(msg.format(dimension, self.dimensions_))
@@ -150,6 +368,10 @@ class Precomputed:
             }
             if classes is not None:
                 params["classes"] = classes
+            if container:
+                params["container"] = True
+            if codec is not None:
+                params["codec"] = codec
 
             with io.open(path, "w") as f:
                 yaml.dump(params, f, default_flow_style=False)
@@ -157,6 +379,12 @@ class Precomputed:
             self.sliding_window_ = sliding_window
             self.dimension_ = dimension
             self.classes_ = classes
+            self.container_ = bool(container)
+            self.codec_ = codec
+
+        # container index (loaded lazily) and current shard (for writing)
+        self.index_ = None
+        self.shard_ = None
 
     def augmentation():
         doc = "Data augmentation."
@@ -188,6 +416,86 @@ class Precomputed:
         """Human-readable label of each dimension"""
         return self.classes_
 
+    def _load_index(self):
+        """Load container index from disk"""
+
+        index = dict()
+        for path in sorted((self.root_dir / "index").glob("*.jsonl")):
+            with io.open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line may be truncated after a crash
+                        continue
+                    index[entry.pop("uri")] = entry
+        self.index_ = index
+
+    def _not_found(self, item):
+        uri = item["uri"]
+        database = item.get("database")
+        msg = (
+            f"Directory {self.root_dir} does not contain "
+            f'precomputed features for file "{uri}" of '
+            f'"{database}" database.'
+        )
+        return PyannoteFeatureExtractionError(msg)
+
+    def _open(self, item):
+        """Get read-only memory map of `item` (encoded) features
+
+        Returns
+        -------
+        memmap : np.ndarray
+            Read-only memory map of encoded features.
+        params : dict
+            Parameters needed for decoding features. See `decode`.
+
+        Raises
+        ------
+        PyannoteFeatureExtractionError
+            When features of `item` are not available.
+        """
+
+        if not self.container_:
+
+            path = self.get_path(item)
+            try:
+                memmap = MEMMAP_CACHE.get(path, mode="npy")
+            except FileNotFoundError:
+                raise self._not_found(item)
+
+            params = dict()
+            if self.codec_ == "uint8":
+                scale, offset = MEMMAP_CACHE.get(self.get_params_path(item))
+                params = {"scale": scale, "offset": offset}
+
+            return memmap, params
+
+        uri = get_unique_identifier(item)
+
+        # (re)load index when file is not found, in case it has been
+        # dumped since index was last loaded.
+        if self.index_ is None or uri not in self.index_:
+            self._load_index()
+        if uri not in self.index_:
+            raise self._not_found(item)
+
+        entry = self.index_[uri]
+        params = entry.get("params", dict())
+
+        shape = tuple(entry["shape"])
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=entry["dtype"]), params
+
+        dtype = np.dtype(entry["dtype"])
+        offset = entry["offset"]
+        n_bytes = int(np.prod(shape)) * dtype.itemsize
+
+        shard = MEMMAP_CACHE.get(self.root_dir / "data" / entry["shard"], mode="raw")
+        memmap = shard[offset : offset + n_bytes].view(dtype).reshape(shape)
+        return memmap, params
+
     def __call__(self, current_file):
         """Obtain features for file
 
@@ -202,22 +510,11 @@ class Precomputed:
             Features
         """
 
-        path = Path(self.get_path(current_file))
-
-        if not path.exists():
-            uri = current_file["uri"]
-            database = current_file["database"]
-            msg = (
-                f"Directory {self.root_dir} does not contain "
-                f'precomputed features for file "{uri}" of '
-                f'"{database}" database.'
-            )
-            raise PyannoteFeatureExtractionError(msg)
-
-        if self.use_memmap:
-            data = np.load(str(path), mmap_mode="r")
-        else:
-            data = np.load(str(path))
+        data, params = self._open(current_file)
+        if self.codec_ is not None:
+            data = decode(data, codec=self.codec_, params=params)
+        elif not self.use_memmap:
+            data = np.array(data)
 
         return SlidingWindowFeature(data, self.sliding_window_)
 
@@ -245,20 +542,98 @@ class Precomputed:
         if mode == "center" and fixed is None:
             fixed = segment.duration
 
-        memmap = open_memmap(self.get_path(current_file), mode="r")
-        swf = SlidingWindowFeature(memmap, self.sliding_window_)
-        result = swf.crop(segment, mode=mode, fixed=fixed)
-        del memmap
-        return result
+        # crop encoded features first so that only cropped ones get decoded
+        data, params = self._open(current_file)
+        swf = SlidingWindowFeature(data, self.sliding_window_)
+        data = swf.crop(segment, mode=mode, fixed=fixed)
+        return decode(data, codec=self.codec_, params=params)
 
     def shape(self, item):
         """Faster version of precomputed(item).data.shape"""
-        memmap = open_memmap(self.get_path(item), mode="r")
-        shape = memmap.shape
-        del memmap
-        return shape
+        data, _ = self._open(item)
+        return data.shape
+
+    def _get_shard(self, n_bytes: int) -> Path:
+        """Get path to container shard where to append `n_bytes` bytes"""
+
+        # shards are specific to each process so that they are never appended
+        # to concurrently. this also covers processes forked after a dump.
+        writer = f"{socket.gethostname()}-{os.getpid()}"
+        if self.shard_ is None or self.shard_[0] != writer:
+            self.shard_ = (writer, 0)
+
+        writer, k = self.shard_
+        while True:
+            path = self.root_dir / "data" / f"{writer}-{k:04d}.bin"
+            size = path.stat().st_size if path.exists() else 0
+            if size == 0 or size + n_bytes <= CONTAINER_SHARD_SIZE:
+                break
+            k += 1
+        self.shard_ = (writer, k)
+
+        return path
 
     def dump(self, item, features):
-        path = Path(self.get_path(item))
+
+        if self.container_:
+            self._dump_to_container(item, features)
+            return
+
+        data, params = encode(features.data, codec=self.codec_)
+
+        # quantization parameters are written before features so that the
+        # latter are never available without the former.
+        if params:
+            params = np.array([params["scale"], params["offset"]])
+            self._save(Path(self.get_params_path(item)), params)
+
+        self._save(Path(self.get_path(item)), data)
+
+    def _save(self, path: Path, data: np.ndarray):
+
         mkdir_p(path.parent)
-        np.save(path, features.data)
+
+        # write to a temporary file first and rename it afterwards so that an
+        # interrupted dump never leaves a truncated file behind.
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp, path)
+
+    def _dump_to_container(self, item, features):
+
+        data, params = encode(features.data, codec=self.codec_)
+        data = np.ascontiguousarray(data)
+
+        with CONTAINER_LOCK:
+
+            path = self._get_shard(data.nbytes)
+            mkdir_p(path.parent)
+
+            with open(path, "ab") as f:
+                offset = f.seek(0, io.SEEK_END)
+                padding = -offset % CONTAINER_ALIGNMENT
+                f.write(b"\0" * padding)
+                f.write(data.tobytes())
+
+            entry = {
+                "uri": get_unique_identifier(item),
+                "shard": path.name,
+                "offset": offset + padding,
+                "shape": list(data.shape),
+                "dtype": data.dtype.str,
+            }
+            if params:
+                entry["params"] = params
+
+            # index entry is only written once data is, so that an interrupted
+            # dump never leaves a dangling entry behind.
+            writer, _ = self.shard_
+            index = self.root_dir / "index" / f"{writer}.jsonl"
+            mkdir_p(index.parent)
+            with open(index, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+        if self.index_ is not None:
+            uri = entry.pop("uri")
+            self.index_[uri] = entry
@@ -24,19 +24,27 @@
 # Hervé Bredin - http://herve.niderb.fr
 
 import warnings
+from collections import deque
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Optional
 from typing import Union
 from typing import Text
+from typing import Tuple
 from pathlib import Path
 
 import torch
 import numpy as np
 
+from pyannote.core import Segment
+from pyannote.core import Timeline
 from pyannote.core import SlidingWindow
 from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.train.model import RESOLUTION_FRAME
 from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import OverlapAddAccumulator
 
 from pyannote.audio.augmentation import Augmentation
 from pyannote.audio.features import FeatureExtraction
@@ -65,10 +73,40 @@ class Pretrained(FeatureExtraction):
         audio chunks. Defaults to 0.25.
     device : optional
     return_intermediate : optional
+    block_duration : float, optional
+        When provided, process files block by block (of that duration, in
+        seconds) so that memory usage does not grow with file duration.
+        Defaults to loading whole files at once. Not used when processing
+        all channels at once.
+    shared_frontend : bool, optional
+        Share computation between overlapping chunks (e.g. apply SincNet
+        filters only once on the waveform). See `Model.slide`. Defaults to
+        processing each chunk independently.
+    approximate : bool, optional
+        When `shared_frontend` is True, let the model trade exactness for
+        speed (e.g. SincTDNN statistics pooling from cumulative sums of
+        frame-level activations). See `Model.forward_chunks`. Defaults to
+        False.
+    stateful : bool, optional
+        Process consecutive chunks one after the other, carrying model (e.g.
+        recurrent) state from one chunk to the next, instead of processing
+        overlapping chunks independently. Combine with a large `step` (e.g.
+        step=1.0 for no overlap at all, or step=0.5 to use the second half of
+        each chunk as lookahead for backward recurrent layers). See
+        `Model.slide`. Defaults to False.
+    quantize : bool, optional
+        Apply int8 dynamic quantization to recurrent and linear layers for
+        faster CPU inference, at the expense of (usually slightly) different
+        scores. See `Model.quantize`. Only supported on CPU. Defaults to False.
     """
 
     # TODO: add progress bar (at least for demo purposes)
 
+    # `crop` applies the model on the requested segment only: cropping the
+    # output of the model applied on the whole file would not be equivalent.
+    # use `embed_segments` to process many segments efficiently.
+    cache = None
+
     def __init__(
         self,
         validate_dir: Path = None,
@@ -80,6 +118,11 @@ class Pretrained(FeatureExtraction):
         device: Optional[Union[Text, torch.device]] = None,
         return_intermediate=None,
         progress_hook=None,
+        block_duration: float = None,
+        shared_frontend: bool = False,
+        approximate: bool = False,
+        stateful: bool = False,
+        quantize: bool = False,
     ):
 
         try:
@@ -138,6 +181,13 @@ class Pretrained(FeatureExtraction):
         # send model to device
         self.model_ = model.eval().to(self.device)
 
+        if quantize:
+            if self.device.type != "cpu":
+                msg = f"Quantized models only run on CPU (got {self.device})."
+                raise ValueError(msg)
+            self.model_.quantize()
+        self.quantize = quantize
+
         # initialize chunks duration with that used during training
         self.duration = getattr(config["task"], "duration", None)
 
@@ -168,6 +218,14 @@ class Pretrained(FeatureExtraction):
 
         self.return_intermediate = return_intermediate
         self.progress_hook = progress_hook
+        self.block_duration = block_duration
+        self.shared_frontend = shared_frontend
+        self.approximate = approximate
+
+        if stateful and block_duration is not None:
+            msg = "Stateful inference does not support block-wise processing."
+            raise ValueError(msg)
+        self.stateful = stateful
 
     @property
     def duration(self):
@@ -230,8 +288,563 @@ class Pretrained(FeatureExtraction):
             device=self.device,
             return_intermediate=self.return_intermediate,
             progress_hook=self.progress_hook,
+            shared_frontend=self.shared_frontend,
+            approximate=self.approximate,
+            stateful=self.stateful,
         ).data
 
+    def get_channel_features(self, y, sample_rate) -> List[np.ndarray]:
+
+        features = [
+            SlidingWindowFeature(features, self.feature_extraction_.sliding_window)
+            for features in self.feature_extraction_.get_channel_features(
+                y, sample_rate
+            )
+        ]
+
+        # apply model on all channels at once
+        return [
+            output.data
+            for output in self.model_.slide(
+                features,
+                self.chunks_,
+                batch_size=self.batch_size,
+                device=self.device,
+                return_intermediate=self.return_intermediate,
+                progress_hook=self.progress_hook,
+                shared_frontend=self.shared_frontend,
+                approximate=self.approximate,
+                stateful=self.stateful,
+            )
+        ]
+
+    def __call__(
+        self, current_file, all_channels: bool = False
+    ) -> Union[SlidingWindowFeature, List[SlidingWindowFeature]]:
+        """Extract features from file
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` files.
+        all_channels : bool, optional
+            Apply model on all channels at once. Chunks extracted from every
+            channel share the same batches. Defaults to False.
+
+        Returns
+        -------
+        features : `pyannote.core.SlidingWindowFeature`
+            Extracted features. A list with one `SlidingWindowFeature` per
+            channel is returned when `all_channels` is True.
+        """
+
+        if self.block_duration is None or all_channels:
+            return super().__call__(current_file, all_channels=all_channels)
+
+        data = [
+            block.data
+            for block in self.blocks(current_file, duration=self.block_duration)
+        ]
+        return SlidingWindowFeature(np.vstack(data), self.sliding_window)
+
+    def blocks(self, current_file, duration: float = 60.0):
+        """Apply pretrained model block by block
+
+        Input features are extracted block by block (see
+        `FeatureExtraction.blocks`) and the model is applied on the very same
+        chunks as `__call__`. Only the features and predictions needed by
+        chunks that have not been processed yet are kept in memory.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` files.
+        duration : float, optional
+            Block duration, in seconds. Defaults to 60s.
+
+        Yields
+        ------
+        features : `pyannote.core.SlidingWindowFeature`
+            Model output. Consecutive blocks are contiguous.
+        """
+
+        frames = self.feature_extraction_.sliding_window
+        duration_, step_ = self.chunks_.duration, self.chunks_.step
+
+        skip_average = (self.model_.resolution == RESOLUTION_CHUNK) or (
+            self.return_intermediate is not None
+        )
+
+        # model output frames
+        resolution = self.get_resolution()
+        accumulator = OverlapAddAccumulator(
+            resolution, alignment=self.model_.alignment, fixed=duration_
+        )
+
+        # buffer[0] is feature frame #offset
+        buffer, offset, n_frames = None, 0, 0
+
+        # chunks are aligned with the beginning of the file (as in Model.slide)
+        windows = SlidingWindow(start=frames.start, duration=duration_, step=step_)
+        i, last_chunk, n_chunks = 0, None, 0
+
+        # chunks waiting to be processed, as (chunk, features, fixed) tuples
+        batch = []
+
+        def _crop(chunk, fixed):
+            ((start, end),) = frames.crop(
+                chunk, mode="center", fixed=fixed, return_ranges=True
+            )
+            # repeat first (or last) frame when chunk is out of file boundaries
+            index = np.clip(np.arange(start, end), 0, n_frames - 1) - offset
+            return buffer[index]
+
+        def _forward(batch):
+            X = np.stack([X for _, X, _ in batch])
+            tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+            with torch.no_grad():
+                tfX = self.model_(tX, return_intermediate=self.return_intermediate)
+            return tfX.detach().to("cpu").numpy()
+
+        def _process(batch):
+            nonlocal n_chunks
+            fX = _forward(batch)
+            if skip_average:
+                sliding_window = SlidingWindow(
+                    start=self.chunks_[n_chunks].start, duration=duration_, step=step_
+                )
+                n_chunks += len(batch)
+                return SlidingWindowFeature(fX, sliding_window)
+
+            for (chunk, _, fixed), fX_ in zip(batch, fX):
+                accumulator.add(chunk, fX_, fixed=fixed)
+            n_chunks += len(batch)
+
+        def _pop(end):
+            start = accumulator.offset_
+            data = accumulator.pop(end)
+            if len(data) == 0:
+                return None
+            sliding_window = SlidingWindow(
+                start=resolution[start].start,
+                duration=resolution.duration,
+                step=resolution.step,
+            )
+            return SlidingWindowFeature(data, sliding_window)
+
+        def _first_frame(t, frames, mode):
+            # index of first frame used by chunks starting at or after t
+            ((start, _),) = frames.crop(
+                Segment(t, t + duration_),
+                mode=mode,
+                fixed=duration_,
+                return_ranges=True,
+            )
+            return max(0, start)
+
+        for features in self.feature_extraction_.blocks(
+            current_file, duration=duration
+        ):
+
+            if buffer is None:
+                buffer = features.data
+            else:
+                buffer = np.vstack([buffer, features.data])
+            n_frames += len(features)
+
+            received = frames.range_to_segment(0, n_frames)
+            while True:
+                chunk = windows[i]
+                if chunk not in received:
+                    break
+                ((_, end),) = frames.crop(
+                    chunk, mode="center", fixed=duration_, return_ranges=True
+                )
+                if end > n_frames:
+                    break
+
+                batch.append((chunk, _crop(chunk, duration_), duration_))
+                last_chunk, i = chunk, i + 1
+
+                if len(batch) < self.batch_size:
+                    continue
+
+                output = _process(batch)
+                batch = []
+                if output is not None:
+                    yield output
+
+            # chunks that are yet to be processed start after t (including
+            # the align_last one which cannot start before received.end - duration_)
+            t = min(windows[i].start, received.end - duration_)
+            if batch:
+                t = min(t, batch[0][0].start)
+
+            if not skip_average:
+                output = _pop(_first_frame(t, resolution, self.model_.alignment))
+                if output is not None:
+                    yield output
+
+            # forget about features no longer needed
+            n_drop = min(_first_frame(t, frames, "center"), n_frames) - offset
+            if n_drop > 0:
+                buffer = buffer[n_drop:]
+                offset += n_drop
+
+        if buffer is None:
+            return
+
+        support = frames.range_to_segment(0, n_frames)
+
+        if support.duration < duration_:
+            # file is shorter than chunks: process it in one go
+            batch.append((support, _crop(support, support.duration), support.duration))
+            last_chunk = support
+
+        else:
+            while True:
+                chunk = windows[i]
+                if chunk not in support:
+                    break
+                batch.append((chunk, _crop(chunk, duration_), duration_))
+                last_chunk, i = chunk, i + 1
+
+            if last_chunk.end < support.end:
+                last_chunk = Segment(start=support.end - duration_, end=support.end)
+                batch.append((last_chunk, _crop(last_chunk, duration_), duration_))
+
+        while batch:
+            output = _process(batch[: self.batch_size])
+            batch = batch[self.batch_size :]
+            if output is not None:
+                yield output
+
+        if skip_average:
+            return
+
+        output = _pop(resolution.samples(last_chunk.end, mode="center"))
+        if output is not None:
+            yield output
+
+    def apply_many(
+        self, files: Iterable, max_pending: int = None
+    ) -> Iterator[Tuple[dict, SlidingWindowFeature]]:
+        """Apply pretrained model on many files, packing their chunks together
+
+        Unlike `__call__`, which processes one file at a time, chunks from
+        consecutive files share the same batches. This makes a big difference
+        for short files, that would otherwise lead to (almost) empty batches.
+        Model outputs are the same as `__call__`.
+
+        Parameters
+        ----------
+        files : iterable
+            `pyannote.database` files.
+        max_pending : int, optional
+            Maximum number of files whose output has not been yielded yet.
+            When reached, incomplete batches are processed anyway. Defaults
+            to `batch_size`.
+
+        Yields
+        ------
+        current_file : dict
+            `pyannote.database` file, in the order of `files`.
+        output : `pyannote.core.SlidingWindowFeature`
+            Model output.
+
+        Usage
+        -----
+        >>> pretrained = Pretrained(validate_dir)
+        >>> for current_file, output in pretrained.apply_many(protocol.test()):
+        ...     pass
+
+        Notes
+        -----
+        Chunks are only packed when they are processed independently: files
+        are processed one at a time by `__call__` when `block_duration`,
+        `shared_frontend`, or `stateful` is set.
+        """
+
+        if self.block_duration is not None or self.shared_frontend or self.stateful:
+            for current_file in files:
+                yield current_file, self(current_file)
+            return
+
+        if max_pending is None:
+            max_pending = self.batch_size
+
+        duration_ = self.chunks_.duration
+
+        skip_average = (self.model_.resolution == RESOLUTION_CHUNK) or (
+            self.return_intermediate is not None
+        )
+
+        # model output frames
+        resolution = self.get_resolution()
+
+        # files whose output has not been yielded yet
+        pending = deque()
+
+        # chunks waiting to be processed, as (file, index, features) tuples.
+        # files shorter than chunks lead to shorter inputs that cannot be
+        # stacked with regular ones: chunks are therefore grouped by shape.
+        buckets = dict()
+
+        def _process(shape):
+            batch = buckets.pop(shape)
+            X = np.stack([X for _, _, X in batch])
+            tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+            with torch.no_grad():
+                tfX = self.model_(tX, return_intermediate=self.return_intermediate)
+            fX = tfX.detach().to("cpu").numpy()
+            for (state, index, _), fX_ in zip(batch, fX):
+                state["fX"][index] = fX_
+                state["n_todo"] -= 1
+
+        def _aggregate(state):
+            chunks, fixed, fX = state["chunks"], state["fixed"], state["fX"]
+            if skip_average:
+                return SlidingWindowFeature(np.stack(fX), self.sliding_window)
+            accumulator = OverlapAddAccumulator(
+                resolution, alignment=self.model_.alignment, fixed=fixed
+            )
+            for chunk, fX_ in zip(chunks, fX):
+                accumulator.add(chunk, fX_)
+            n_frames = resolution.samples(chunks[-1].end, mode="center")
+            return SlidingWindowFeature(accumulator.pop(n_frames), self.sliding_window)
+
+        for current_file in files:
+
+            y, sample_rate = self.raw_audio_(current_file, return_sr=True)
+            features = SlidingWindowFeature(
+                self.feature_extraction_.get_features(y.data, sample_rate),
+                self.feature_extraction_.sliding_window,
+            )
+
+            # same chunks as Model.slide
+            support = features.extent
+            if support.duration < duration_:
+                chunks, fixed = [support], support.duration
+            else:
+                chunks = list(self.chunks_(support, align_last=True))
+                fixed = duration_
+
+            state = {
+                "current_file": current_file,
+                "chunks": chunks,
+                "fixed": fixed,
+                "fX": [None] * len(chunks),
+                "n_todo": len(chunks),
+                "shapes": set(),
+            }
+            pending.append(state)
+
+            for index, chunk in enumerate(chunks):
+                X = features.crop(chunk, mode="center", fixed=fixed)
+                buckets.setdefault(X.shape, []).append((state, index, X))
+                state["shapes"].add(X.shape)
+                if len(buckets[X.shape]) >= self.batch_size:
+                    _process(X.shape)
+
+            # do not wait forever for incomplete batches
+            if len(pending) > max_pending:
+                for shape in pending[0]["shapes"] & set(buckets):
+                    _process(shape)
+
+            while pending and pending[0]["n_todo"] == 0:
+                state = pending.popleft()
+                yield state["current_file"], _aggregate(state)
+
+        for shape in list(buckets):
+            _process(shape)
+
+        while pending:
+            state = pending.popleft()
+            yield state["current_file"], _aggregate(state)
+
+    def embed_segments(
+        self, current_file, segments: Iterable[Segment], average: bool = True
+    ) -> Union[np.ndarray, List[np.ndarray]]:
+        """Extract embeddings of many segments at once
+
+        This is a faster version of looping over segments and calling
+        `crop(current_file, segment)`: audio is read and features are
+        extracted only once for the whole file, and chunks of all segments
+        are processed in large batches.
+
+        Segments shorter than chunks are embedded in one go, longer ones are
+        split into (possibly overlapping) chunks, as done by `Model.slide`.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        segments : iterable of `pyannote.core.Segment`
+            Segments to embed.
+        average : bool, optional
+            Set to False to return the embeddings of every chunk of every
+            segment. Defaults to returning one (average) embedding per segment.
+
+        Returns
+        -------
+        embeddings : (n_segments, dimension) numpy array
+            One (average) embedding per segment. When `average` is False, a
+            list with one (n_chunks, dimension) numpy array per segment is
+            returned instead.
+
+        Usage
+        -----
+        >>> pretrained = Pretrained(validate_dir)
+        >>> embeddings = pretrained.embed_segments(current_file, speech_turns)
+
+        Notes
+        -----
+        Features are extracted from the whole file. Unlike `crop`, features
+        close to segment boundaries therefore benefit from the surrounding
+        audio, which may lead to slightly different embeddings.
+        """
+
+        if self.model_.resolution != RESOLUTION_CHUNK:
+            msg = "embed_segments only supports models returning one vector per chunk."
+            raise ValueError(msg)
+
+        segments = list(segments)
+
+        # read audio and extract features once for the whole file
+        y, sample_rate = self.raw_audio_(current_file, return_sr=True)
+        features = SlidingWindowFeature(
+            self.feature_extraction_.get_features(y.data, sample_rate),
+            self.feature_extraction_.sliding_window,
+        )
+
+        duration_, step_ = self.chunks_.duration, self.chunks_.step
+
+        # embeddings of each chunk of each segment
+        fX = [[] for _ in segments]
+
+        # chunks waiting to be processed, as (segment index, features) tuples.
+        # chunks are grouped by number of frames (i.e. by duration) so that
+        # they can be stacked without any padding. when model supports
+        # batches of variable-length sequences, chunks whose number of frames
+        # differ by less than 1/8 of the chunk duration are grouped together.
+        buckets = dict()
+        if self.model_.supports_packed:
+            quantum = max(1, features.sliding_window.durationToSamples(duration_) // 8)
+        else:
+            quantum = 1
+
+        def _process(key):
+            batch = buckets.pop(key)
+            lengths = [len(X) for _, X in batch]
+            X = np.zeros(
+                (len(batch), max(lengths)) + batch[0][1].shape[1:], dtype=np.float32
+            )
+            for b, (_, X_) in enumerate(batch):
+                X[b, : len(X_)] = X_
+            tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+            kwargs = {"return_intermediate": self.return_intermediate}
+            if min(lengths) < max(lengths):
+                kwargs["lengths"] = torch.tensor(lengths, device=self.device)
+            with torch.no_grad():
+                tfX = self.model_(tX, **kwargs)
+            for (s, _), fX_ in zip(batch, tfX.detach().to("cpu").numpy()):
+                fX[s].append(fX_)
+
+        for s, segment in enumerate(segments):
+
+            if segment.duration < duration_:
+                chunks, fixed = [segment], segment.duration
+            else:
+                windows = SlidingWindow(
+                    start=segment.start, duration=duration_, step=step_
+                )
+                chunks, fixed = list(windows(segment, align_last=True)), duration_
+
+            for chunk in chunks:
+                X = features.crop(chunk, mode="center", fixed=fixed)
+                key = (len(X) + quantum - 1) // quantum
+                buckets.setdefault(key, []).append((s, X))
+                if len(buckets[key]) >= self.batch_size:
+                    _process(key)
+
+        for key in list(buckets):
+            _process(key)
+
+        if not average:
+            return [np.stack(fX_) for fX_ in fX]
+
+        return np.array([np.mean(fX_, axis=0) for fX_ in fX])
+
+    def gated(self, current_file, speech: Timeline) -> SlidingWindowFeature:
+        """Apply model on chunks overlapping speech only
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        speech : `pyannote.core.Timeline`
+            Speech regions (e.g. obtained from speech activity detection).
+
+        Returns
+        -------
+        output : `pyannote.core.SlidingWindowFeature`
+            Same as `__call__` for chunks overlapping `speech`, NaN for the
+            other ones.
+
+        Usage
+        -----
+        >>> pretrained = Pretrained(validate_dir)
+        >>> embedding = pretrained.gated(current_file, speech_turns.get_timeline())
+        """
+
+        if self.model_.resolution != RESOLUTION_CHUNK:
+            msg = "gated only supports models returning one vector per chunk."
+            raise ValueError(msg)
+
+        y, sample_rate = self.raw_audio_(current_file, return_sr=True)
+        features = SlidingWindowFeature(
+            self.feature_extraction_.get_features(y.data, sample_rate),
+            self.feature_extraction_.sliding_window,
+        )
+
+        # same chunks as Model.slide
+        support = features.extent
+        if support.duration < self.chunks_.duration:
+            chunks, fixed = [support], support.duration
+        else:
+            chunks = list(self.chunks_(support, align_last=True))
+            fixed = self.chunks_.duration
+
+        # find chunks overlapping speech, the same way consumers of the output
+        # will look for them (i.e. `SlidingWindowFeature.crop`)
+        overlap = np.zeros(len(chunks), dtype=bool)
+        for segment in speech.support():
+            ((start, end),) = self.sliding_window.crop(
+                segment, mode="loose", return_ranges=True
+            )
+            overlap[max(0, start) : max(0, end)] = True
+        (indices,) = np.where(overlap)
+
+        data = None
+        for i in range(0, len(indices), self.batch_size):
+            batch = indices[i : i + self.batch_size]
+            X = np.stack(
+                [features.crop(chunks[c], mode="center", fixed=fixed) for c in batch]
+            )
+            tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+            with torch.no_grad():
+                tfX = self.model_(tX, return_intermediate=self.return_intermediate)
+            fX = tfX.detach().to("cpu").numpy()
+
+            if data is None:
+                data = np.full((len(chunks),) + fX.shape[1:], np.nan, dtype=fX.dtype)
+            data[batch] = fX
+
+        if data is None:
+            data = np.full((len(chunks), self.dimension), np.nan, dtype=np.float32)
+
+        return SlidingWindowFeature(data, self.sliding_window)
+
     def get_context_duration(self) -> float:
         # FIXME: add half window duration to context?
         return self.feature_extraction_.get_context_duration()
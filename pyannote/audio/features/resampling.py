@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+# Polyphase resampling
+"""
+
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+import scipy.signal
+
+
+@lru_cache(maxsize=32)
+def get_polyphase_filter(
+    in_rate: int, out_rate: int
+) -> Tuple[int, int, int, np.ndarray]:
+    """Design low-pass filter used for polyphase resampling
+
+    This is the very same filter as the one used by `scipy.signal.resample_poly`
+    (Kaiser window with beta = 5.0). Filters are cached (and read-only) so
+    that they are only designed once per pair of sample rates.
+
+    Parameters
+    ----------
+    in_rate, out_rate : int
+        Input and output sample rates.
+
+    Returns
+    -------
+    up, down : int
+        Upsampling and downsampling factors.
+    half_len : int
+        Half length of the filter (i.e. its group delay, in upsampled samples).
+    h : (2 * half_len + 1, ) np.ndarray
+        Filter coefficients.
+    """
+
+    g = gcd(in_rate, out_rate)
+    up, down = out_rate // g, in_rate // g
+
+    # identity
+    if up == down:
+        h = np.ones((1,))
+        h.flags.writeable = False
+        return 1, 1, 0, h
+
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = scipy.signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    h = h * up
+    h.flags.writeable = False
+
+    return up, down, half_len, h
+
+
+def get_input_range(m0: int, m1: int, in_rate: int, out_rate: int) -> Tuple[int, int]:
+    """Get range of input samples needed to compute a range of output samples
+
+    Parameters
+    ----------
+    m0, m1 : int
+        Indices of first and last (excluded) output samples.
+    in_rate, out_rate : int
+        Input and output sample rates.
+
+    Returns
+    -------
+    j0, j1 : int
+        Indices of first and last (excluded) input samples. Note that they
+        might be out of bounds (e.g. negative j0 for m0 = 0).
+    """
+    up, down, half_len, _ = get_polyphase_filter(in_rate, out_rate)
+    j0 = -((half_len - m0 * down) // up)
+    j1 = ((m1 - 1) * down + half_len) // up + 1
+    return j0, j1
+
+
+def _resample_range(
+    x: np.ndarray,
+    j0: int,
+    m0: int,
+    m1: int,
+    up: int,
+    down: int,
+    half_len: int,
+    h: np.ndarray,
+) -> np.ndarray:
+    """Compute a range of output samples
+
+    Output sample m is given by
+
+        y[m] = sum_j h[m * down + half_len - j * up] * x[j]
+
+    Parameters
+    ----------
+    x : (n_samples, n_channels) np.ndarray
+        Input samples, starting at (absolute) index j0. Any input sample outside
+        of this range is assumed to be zero. Therefore, x should start early
+        enough for every output sample in [m0, m1) to be fully determined.
+    j0 : int
+        Absolute index of x[0].
+    m0, m1 : int
+        Absolute indices of first and last (excluded) output samples.
+    up, down, half_len, h :
+        See `get_polyphase_filter`.
+
+    Returns
+    -------
+    y : (m1 - m0, n_channels) np.ndarray
+        Output samples.
+    """
+
+    n_channels = x.shape[1]
+
+    if m1 <= m0:
+        return np.zeros((0, n_channels), dtype=np.float32)
+
+    if len(x) == 0:
+        return np.zeros((m1 - m0, n_channels), dtype=np.float32)
+
+    # prepend a few zeros so that output sample #m falls exactly on
+    # the (downsampled) grid used internally by upfirdn
+    r = next(r for r in range(down) if ((j0 - r) * up - half_len) % down == 0)
+    if r > 0:
+        x = np.vstack([np.zeros((r, n_channels), dtype=x.dtype), x])
+        j0 -= r
+
+    # y[i] is output sample #(offset + i)
+    offset = (j0 * up - half_len) // down
+
+    y = scipy.signal.upfirdn(h, x, up=up, down=down, axis=0)
+
+    # output samples that are before the support of the filter are zero
+    if m0 < offset:
+        y = np.vstack([np.zeros((offset - m0, n_channels)), y])
+        offset = m0
+
+    y = y[m0 - offset : m1 - offset]
+
+    # output samples that are beyond the support of the filter are zero
+    if len(y) < m1 - m0:
+        y = np.vstack([y, np.zeros((m1 - m0 - len(y), n_channels))])
+
+    return y.astype(np.float32)
+
+
+def resample(y: np.ndarray, in_rate: int, out_rate: int) -> np.ndarray:
+    """Resample waveform
+
+    Same as `scipy.signal.resample_poly(y, up, down, axis=0)` but relies on
+    cached filters.
+
+    Parameters
+    ----------
+    y : (n_samples, n_channels) np.ndarray
+        Waveform.
+    in_rate, out_rate : int
+        Input and output sample rates.
+
+    Returns
+    -------
+    resampled : (ceil(n_samples * out_rate / in_rate), n_channels) np.ndarray
+        Resampled waveform.
+    """
+    up, down, half_len, h = get_polyphase_filter(in_rate, out_rate)
+    m1 = -((-len(y) * up) // down)
+    return _resample_range(y, 0, 0, m1, up, down, half_len, h)
+
+
+def resample_range(
+    x: np.ndarray, j0: int, m0: int, m1: int, in_rate: int, out_rate: int
+) -> np.ndarray:
+    """Resample part of a waveform
+
+    Returns exactly the same samples as `resample(y)[m0:m1]` where `y` is
+    the whole waveform, without having to resample (nor read) `y` entirely.
+
+    Parameters
+    ----------
+    x : (n_samples, n_channels) np.ndarray
+        Input samples y[j0:j1]. See `get_input_range` for the actual range of
+        input samples needed. Input samples out of the bounds of `y` should
+        simply be omitted (they are assumed to be zero).
+    j0 : int
+        Index of x[0] in the whole waveform.
+    m0, m1 : int
+        Indices of first and last (excluded) output samples.
+    in_rate, out_rate : int
+        Input and output sample rates.
+
+    Returns
+    -------
+    resampled : (m1 - m0, n_channels) np.ndarray
+        Resampled waveform.
+    """
+    up, down, half_len, h = get_polyphase_filter(in_rate, out_rate)
+    return _resample_range(x, j0, m0, m1, up, down, half_len, h)
+
+
+class StreamingResampler:
+    """Stateful polyphase resampler
+
+    Resampling a signal block by block with a `StreamingResampler` instance
+    gives the same result as resampling the whole signal at once: the filter
+    state is carried over from one block to the next.
+
+    Parameters
+    ----------
+    in_rate : int
+        Sample rate of input blocks.
+    out_rate : int
+        Sample rate of output blocks.
+
+    Usage
+    -----
+    >>> resampler = StreamingResampler(8000, 16000)
+    >>> for block in blocks:  # (n_samples, n_channels) np.ndarray
+    ...     resampled = resampler(block)
+    >>> resampled = resampler.flush()
+    """
+
+    def __init__(self, in_rate: int, out_rate: int):
+        super().__init__()
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+
+        self.up_, self.down_, self.half_len_, self.h_ = get_polyphase_filter(
+            in_rate, out_rate
+        )
+        # number of input samples involved in one output sample
+        self.n_taps_ = int(np.ceil(len(self.h_) / self.up_))
+
+        self.reset()
+
+    def reset(self):
+        """Forget about past input samples"""
+        self.buffer_ = None
+        self.buffer_start_ = 0
+        self.n_in_ = 0
+        self.n_out_ = 0
+
+    def _resample(self, m1: int) -> np.ndarray:
+
+        y = _resample_range(
+            self.buffer_,
+            self.buffer_start_,
+            self.n_out_,
+            m1,
+            self.up_,
+            self.down_,
+            self.half_len_,
+            self.h_,
+        )
+        self.n_out_ = max(self.n_out_, m1)
+
+        # forget about input samples that are no longer needed
+        keep_from = (
+            (self.n_out_ * self.down_ + self.half_len_) // self.up_ - self.n_taps_ + 1
+        )
+        if keep_from > self.buffer_start_:
+            self.buffer_ = self.buffer_[keep_from - self.buffer_start_ :]
+            self.buffer_start_ = keep_from
+
+        return y
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """Resample next block
+
+        Parameters
+        ----------
+        x : (n_samples, n_channels) np.ndarray
+            Next block of input samples.
+
+        Returns
+        -------
+        y : (n_resampled, n_channels) np.ndarray
+            Output samples that can be fully determined from input samples
+            received so far. Remaining output samples are returned by
+            subsequent calls (or by `flush`).
+        """
+
+        if self.buffer_ is None:
+            self.buffer_ = x
+        else:
+            self.buffer_ = np.vstack([self.buffer_, x])
+        self.n_in_ += len(x)
+
+        # output sample #m only depends on input samples up to
+        # (m * down + half_len) // up
+        m1 = (self.n_in_ * self.up_ - 1 - self.half_len_) // self.down_ + 1
+
+        return self._resample(m1)
+
+    def flush(self) -> np.ndarray:
+        """Resample remaining samples and reset resampler
+
+        Returns
+        -------
+        y : (n_resampled, n_channels) np.ndarray
+            Remaining output samples, computed as if the input signal was
+            followed by zeros. The total number of output samples is
+            ceil(n_in * out_rate / in_rate).
+        """
+
+        if self.buffer_ is None:
+            return np.zeros((0, 1), dtype=np.float32)
+
+        m1 = -((-self.n_in_ * self.up_) // self.down_)
+        y = self._resample(m1)
+        self.reset()
+        return y
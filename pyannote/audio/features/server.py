@@ -0,0 +1,622 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Local inference server with dynamic batching
+
+Pretrained models are kept loaded by a long-running `InferenceServer`.
+Clients (`RemotePretrained`) extract features and chunks locally, and only
+send chunks to the server that merges chunks sent by concurrent clients into
+full batches before applying the model.
+
+Server addresses are either "unix:///path/to/socket" (Unix socket) or
+"tcp://localhost:port" (TCP socket). Messages are exchanged using
+`multiprocessing.connection` and authenticated with a shared key. Because
+messages are pickled, anyone knowing the key can run arbitrary code in the
+server process: the key is therefore either provided explicitly or randomly
+generated into a file only readable by the current user.
+"""
+
+import os
+import queue
+import secrets
+import stat
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from multiprocessing.connection import Client
+from multiprocessing.connection import Listener
+from typing import Dict
+from typing import List
+from typing import Text
+from typing import Tuple
+from typing import Union
+from urllib.parse import urlparse
+
+import numpy as np
+import torch
+
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+
+from pyannote.audio.train.model import Model
+from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import RESOLUTION_FRAME
+from .base import FeatureExtraction
+
+# authentication key used when none is provided
+AUTHKEY_ENV = "PYANNOTE_SERVER_AUTHKEY"
+
+
+def get_runtime_dir() -> Path:
+    """Private per-user directory storing server socket and key
+
+    Returns
+    -------
+    runtime_dir : Path
+        "$XDG_RUNTIME_DIR/pyannote-audio" when XDG_RUNTIME_DIR is set,
+        "{tmp}/pyannote-audio-{uid}" otherwise. It is created if needed.
+
+    Raises
+    ------
+    PermissionError
+        If it is not a directory owned by (and only accessible to) the
+        current user.
+    """
+
+    root = os.environ.get("XDG_RUNTIME_DIR", None)
+    if root is None:
+        runtime_dir = Path(tempfile.gettempdir()) / f"pyannote-audio-{os.getuid()}"
+    else:
+        runtime_dir = Path(root) / "pyannote-audio"
+
+    try:
+        runtime_dir.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+
+    # do not trust directories (or symlinks) created by someone else
+    info = os.lstat(runtime_dir)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        msg = (
+            f'"{runtime_dir}" must be a directory owned by (and only '
+            f"accessible to) the current user."
+        )
+        raise PermissionError(msg)
+
+    return runtime_dir
+
+
+def get_default_address() -> Text:
+    """Unix socket in private per-user runtime directory"""
+    return f"unix://{get_runtime_dir() / 'server.sock'}"
+
+
+def parse_address(address: Text) -> Tuple[Union[Text, Tuple[Text, int]], Text]:
+    """Parse server address
+
+    Parameters
+    ----------
+    address : str
+        Either "unix:///path/to/socket" or "tcp://host:port". Use "unix://"
+        for the default Unix socket (see `get_default_address`).
+
+    Returns
+    -------
+    address : str or (host, port) tuple
+        Address, as expected by `multiprocessing.connection`.
+    family : {"AF_UNIX", "AF_INET"}
+        Address family.
+    """
+
+    url = urlparse(address)
+
+    if url.scheme == "unix":
+        if not url.path:
+            return parse_address(get_default_address())
+        return url.path, "AF_UNIX"
+
+    if url.scheme == "tcp":
+        if url.hostname not in ("localhost", "127.0.0.1", "::1"):
+            msg = f'Inference server must be local (got "{url.hostname}").'
+            raise ValueError(msg)
+        return (url.hostname, url.port), "AF_INET"
+
+    msg = (
+        f'Unsupported address "{address}" (should be either '
+        f'"unix:///path/to/socket" or "tcp://localhost:port").'
+    )
+    raise ValueError(msg)
+
+
+def get_authkey(authkey: bytes = None, create: bool = False) -> bytes:
+    """Get authentication key shared by server and clients
+
+    Parameters
+    ----------
+    authkey : bytes, optional
+        Explicit key. Defaults to the content of the PYANNOTE_SERVER_AUTHKEY
+        environment variable when set, and to the content of the "authkey"
+        file of the private runtime directory otherwise.
+    create : bool, optional
+        Randomly generate the "authkey" file (only readable by the current
+        user) when it does not exist. Defaults to False.
+
+    Returns
+    -------
+    authkey : bytes
+        Authentication key.
+    """
+
+    if authkey is not None:
+        return authkey
+
+    if AUTHKEY_ENV in os.environ:
+        return os.environ[AUTHKEY_ENV].encode("utf8")
+
+    authkey_txt = get_runtime_dir() / "authkey"
+
+    if create and not authkey_txt.exists():
+        try:
+            fd = os.open(authkey_txt, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            # created by another server in the meantime
+            pass
+        else:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(secrets.token_hex(32))
+
+    try:
+        with open(authkey_txt, "r") as fp:
+            return fp.read().strip().encode("utf8")
+    except FileNotFoundError:
+        msg = (
+            f"No authentication key found: either start the inference server "
+            f"first, set {AUTHKEY_ENV} environment variable, or provide "
+            f'"authkey" explicitly.'
+        )
+        raise ValueError(msg)
+
+
+class _Request:
+    """Chunks sent by one client, waiting to be batched"""
+
+    def __init__(self, X: np.ndarray, return_intermediate=None):
+        self.X = X
+        self.return_intermediate = return_intermediate
+        self.future = Future()
+
+    @property
+    def key(self):
+        # only chunks with the same shape can be stacked in a batch
+        return self.X.shape[1:], repr(self.return_intermediate)
+
+
+class InferenceServer:
+    """Local inference server with dynamic batching
+
+    Parameters
+    ----------
+    models : dict
+        Pretrained models (`pyannote.audio.features.Pretrained` instances),
+        indexed by the name clients use to refer to them.
+    address : str, optional
+        Either "unix:///path/to/socket" or "tcp://localhost:port".
+        Defaults to a Unix socket in a private per-user directory
+        (see `get_default_address`).
+    authkey : bytes, optional
+        Key shared with clients. Defaults to the content of the
+        PYANNOTE_SERVER_AUTHKEY environment variable, or to a randomly
+        generated key stored in a file only readable by the current user
+        (see `get_authkey`).
+    batch_size : int, optional
+        Maximum number of chunks per batch. Defaults to the batch size of
+        each pretrained model.
+    max_wait : float, optional
+        Maximum time (in seconds) chunks wait for other clients' chunks before
+        the (possibly incomplete) batch is processed. Defaults to 10ms.
+
+    Usage
+    -----
+    >>> server = InferenceServer({"sad": Pretrained(validate_dir)})
+    >>> server.serve_forever()
+    """
+
+    def __init__(
+        self,
+        models: Dict[Text, "Pretrained"],
+        address: Text = None,
+        authkey: bytes = None,
+        batch_size: int = None,
+        max_wait: float = 0.01,
+    ):
+        super().__init__()
+        self.models = models
+        if address is None:
+            address = get_default_address()
+        self.address = address
+        self.authkey = get_authkey(authkey, create=True)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+        self.queues_ = {name: queue.Queue() for name in self.models}
+        self.listener_ = None
+
+    def get_specs(self, name: Text) -> Dict:
+        """Everything clients need to know to apply model `name`"""
+
+        pretrained = self.models[name]
+        model = pretrained.model_
+
+        specs = {
+            "feature_extraction": pretrained.feature_extraction_,
+            "duration": pretrained.duration,
+            "step": pretrained.step,
+            "resolution": model.resolution,
+            "alignment": model.alignment,
+            "dimension": pretrained.dimension,
+            "batch_size": self._get_batch_size(name),
+        }
+        try:
+            specs["classes"] = pretrained.classes
+        except AttributeError as e:
+            pass
+
+        return specs
+
+    def _get_batch_size(self, name: Text) -> int:
+        if self.batch_size is None:
+            return self.models[name].batch_size
+        return self.batch_size
+
+    def _batch(self, name: Text):
+        """Merge requests for model `name` into batches and process them"""
+
+        pretrained = self.models[name]
+        batch_size = self._get_batch_size(name)
+        requests = self.queues_[name]
+
+        # requests that could not be added to previous batch
+        backlog = deque()
+
+        while True:
+
+            first = backlog.popleft() if backlog else requests.get()
+            if first is None:
+                return
+
+            batch, n_chunks = [first], len(first.X)
+            deadline = time.time() + self.max_wait
+
+            # add requests from the backlog first, then from other clients
+            # until batch is full or deadline is reached
+            for request in list(backlog):
+                if n_chunks >= batch_size:
+                    break
+                if request.key == first.key:
+                    backlog.remove(request)
+                    batch.append(request)
+                    n_chunks += len(request.X)
+
+            while n_chunks < batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    requests.put(None)
+                    break
+                if request.key != first.key:
+                    backlog.append(request)
+                    continue
+                batch.append(request)
+                n_chunks += len(request.X)
+
+            try:
+                X = np.concatenate([request.X for request in batch])
+                tX = torch.tensor(X, dtype=torch.float32, device=pretrained.device)
+                with torch.no_grad():
+                    tfX = pretrained.model_(
+                        tX, return_intermediate=first.return_intermediate
+                    )
+                fX = tfX.detach().to("cpu").numpy()
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            # send each client its own chunks
+            i = 0
+            for request in batch:
+                request.future.set_result(fX[i : i + len(request.X)])
+                i += len(request.X)
+
+    def _handle(self, connection):
+        """Answer requests of one client"""
+
+        with connection:
+            while True:
+
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    command, name = message["command"], message["model"]
+                    if name not in self.models:
+                        msg = f'Unknown model "{name}".'
+                        raise ValueError(msg)
+
+                    if command == "specs":
+                        result = self.get_specs(name)
+
+                    elif command == "forward":
+                        request = _Request(
+                            message["X"],
+                            return_intermediate=message.get("return_intermediate"),
+                        )
+                        self.queues_[name].put(request)
+                        result = request.future.result()
+
+                    else:
+                        msg = f'Unknown command "{command}".'
+                        raise ValueError(msg)
+
+                    connection.send({"result": result})
+
+                except Exception as e:
+                    connection.send({"error": f"{type(e).__name__}: {e}"})
+
+    def serve_forever(self):
+        """Accept clients until `close` is called"""
+
+        for name in self.models:
+            threading.Thread(target=self._batch, args=(name,), daemon=True).start()
+
+        address, family = parse_address(self.address)
+
+        if family == "AF_UNIX" and os.path.lexists(address):
+            # only remove stale sockets of the current user
+            info = os.lstat(address)
+            if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+                msg = f'"{address}" already exists and is not a socket of ours.'
+                raise FileExistsError(msg)
+            os.remove(address)
+
+        # only the owner of the socket can connect: it is created with the
+        # right permissions rather than changed after the fact
+        umask = os.umask(0o177)
+        try:
+            self.listener_ = Listener(address, family=family, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+
+        while True:
+            try:
+                connection = self.listener_.accept()
+            except OSError:
+                # listener has been closed
+                break
+            except Exception as e:
+                # authentication failures and the like
+                continue
+
+            threading.Thread(
+                target=self._handle, args=(connection,), daemon=True
+            ).start()
+
+    def close(self):
+        """Stop accepting clients and stop batching threads"""
+        if self.listener_ is not None:
+            self.listener_.close()
+        for requests in self.queues_.values():
+            requests.put(None)
+
+
+class _RemoteModel:
+    """Client-side proxy mimicking `Model` for `Model.slide`"""
+
+    slide = Model.slide
+
+    def __init__(self, client: "RemotePretrained", resolution, alignment):
+        self.client = client
+        self.resolution = resolution
+        self.alignment = alignment
+
+    def __call__(self, tX: torch.Tensor, return_intermediate=None) -> torch.Tensor:
+        fX = self.client.request(
+            "forward",
+            X=tX.detach().to("cpu").numpy(),
+            return_intermediate=return_intermediate,
+        )
+        return torch.from_numpy(fX)
+
+
+class RemotePretrained(FeatureExtraction):
+    """Pretrained model served by a local `InferenceServer`
+
+    Feature extraction and chunking happen in the client process, while the
+    model itself is applied by the server.
+
+    Parameters
+    ----------
+    address : str
+        Server address. Either "unix:///path/to/socket" or
+        "tcp://localhost:port".
+    model : str
+        Name of the model on the server.
+    authkey : bytes, optional
+        Key shared with the server. Defaults to the content of the
+        PYANNOTE_SERVER_AUTHKEY environment variable, or to the key
+        generated by the server (see `get_authkey`).
+    batch_size : int, optional
+        Number of chunks sent at once. Defaults to the server batch size.
+    step : float, optional
+        Ratio of audio chunk duration used as step between two consecutive
+        audio chunks. Defaults to the one used by the server.
+
+    Usage
+    -----
+    >>> sad = RemotePretrained("unix://", "sad")  # default Unix socket
+    >>> scores = sad(current_file)
+
+    It can also be used wherever `Wrapper` is (e.g. as pipelines "scores"),
+    using "unix://#sad" (or "unix:///path/to/socket#sad") as wrappable.
+    """
+
+    # see Pretrained.cache
+    cache = None
+
+    def __init__(
+        self,
+        address: Text,
+        model: Text,
+        authkey: bytes = None,
+        batch_size: int = None,
+        step: float = None,
+    ):
+
+        self.address = address
+        self.model = model
+        self.authkey = get_authkey(authkey)
+
+        self.connection_ = None
+        self.lock_ = threading.Lock()
+
+        specs = self.request("specs")
+
+        self.feature_extraction_ = specs["feature_extraction"]
+        super().__init__(sample_rate=self.feature_extraction_.sample_rate)
+
+        self.duration = specs["duration"]
+        self.step = specs["step"] if step is None else step
+        self.chunks_ = SlidingWindow(
+            duration=self.duration, step=self.step * self.duration
+        )
+        self.batch_size = specs["batch_size"] if batch_size is None else batch_size
+
+        self.dimension_ = specs["dimension"]
+        self.classes_ = specs.get("classes", None)
+
+        self.model_ = _RemoteModel(self, specs["resolution"], specs["alignment"])
+
+    def __getstate__(self):
+        # connection is re-opened lazily by unpickled copies
+        state = dict(self.__dict__)
+        state["connection_"], state["lock_"] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock_ = threading.Lock()
+
+    def request(self, command: Text, **kwargs):
+        """Send request to server and wait for its answer"""
+
+        message = dict(kwargs, command=command, model=self.model)
+
+        with self.lock_:
+
+            # do not share connection with forked processes
+            if self.connection_ is None or self.connection_[0] != os.getpid():
+                address, family = parse_address(self.address)
+                connection = Client(address, family=family, authkey=self.authkey)
+                self.connection_ = (os.getpid(), connection)
+
+            _, connection = self.connection_
+            connection.send(message)
+            answer = connection.recv()
+
+        if "error" in answer:
+            msg = f'Inference server failed to process request: {answer["error"]}'
+            raise RuntimeError(msg)
+
+        return answer["result"]
+
+    @property
+    def classes(self):
+        if self.classes_ is None:
+            raise AttributeError("classes")
+        return self.classes_
+
+    def get_dimension(self) -> int:
+        return self.dimension_
+
+    def get_resolution(self) -> SlidingWindow:
+
+        resolution = self.model_.resolution
+
+        # model returns one vector per input frame
+        if resolution == RESOLUTION_FRAME:
+            resolution = self.feature_extraction_.sliding_window
+
+        # model returns one vector per input window
+        if resolution == RESOLUTION_CHUNK:
+            resolution = self.chunks_
+
+        return resolution
+
+    def get_context_duration(self) -> float:
+        return self.feature_extraction_.get_context_duration()
+
+    def get_features(self, y, sample_rate) -> np.ndarray:
+
+        features = SlidingWindowFeature(
+            self.feature_extraction_.get_features(y, sample_rate),
+            self.feature_extraction_.sliding_window,
+        )
+
+        return self.model_.slide(
+            features, self.chunks_, batch_size=self.batch_size, device="cpu"
+        ).data
+
+    def get_channel_features(self, y, sample_rate) -> List[np.ndarray]:
+
+        features = [
+            SlidingWindowFeature(features, self.feature_extraction_.sliding_window)
+            for features in self.feature_extraction_.get_channel_features(
+                y, sample_rate
+            )
+        ]
+
+        return [
+            output.data
+            for output in self.model_.slide(
+                features, self.chunks_, batch_size=self.batch_size, device="cpu"
+            )
+        ]
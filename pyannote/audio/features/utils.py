@@ -29,7 +29,6 @@
 import warnings
 import numpy as np
 
-import librosa
 from librosa.util import valid_audio
 from librosa.util.exceptions import ParameterError
 
@@ -38,6 +37,11 @@ from pyannote.core import SlidingWindow, SlidingWindowFeature
 from soundfile import SoundFile
 import soundfile as sf
 
+from .resampling import StreamingResampler
+from .resampling import get_input_range
+from .resampling import resample
+from .resampling import resample_range
+
 
 def get_audio_duration(current_file):
     """Return audio file duration
@@ -119,7 +123,7 @@ def read_audio(current_file, sample_rate=None, mono=True):
 
     # resample if sample rates mismatch
     if (sample_rate is not None) and (file_sample_rate != sample_rate):
-        y = librosa.core.resample(y.T, file_sample_rate, sample_rate).T
+        y = resample(y, file_sample_rate, sample_rate)
     else:
         sample_rate = file_sample_rate
 
@@ -170,7 +174,7 @@ class RawAudio:
 
         # resample if sample rates mismatch
         if (self.sample_rate is not None) and (self.sample_rate != sample_rate):
-            y = librosa.core.resample(y.T, sample_rate, self.sample_rate).T
+            y = resample(y, sample_rate, self.sample_rate)
             sample_rate = self.sample_rate
 
         # augment data
@@ -186,7 +190,7 @@ class RawAudio:
 
         return y
 
-    def __call__(self, current_file, return_sr=False):
+    def __call__(self, current_file, return_sr=False, all_channels=False):
         """Obtain waveform
 
         Parameters
@@ -195,6 +199,11 @@ class RawAudio:
             `pyannote.database` files.
         return_sr : `bool`, optional
             Return sample rate. Defaults to False
+        all_channels : `bool`, optional
+            Return all channels at once (as a (n_samples, n_channels) waveform),
+            regardless of `mono` and of the `channel` key of `current_file`.
+            Channels are processed (e.g. augmented) independently from each
+            other. Defaults to False.
 
         Returns
         -------
@@ -229,25 +238,173 @@ class RawAudio:
                 current_file["audio"], dtype="float32", always_2d=True
             )
 
-        # extract specific channel if requested
-        channel = current_file.get("channel", None)
-        if channel is not None:
-            y = y[:, channel - 1 : channel]
+        if all_channels:
+
+            # resample all channels at once
+            if (self.sample_rate is not None) and (self.sample_rate != sample_rate):
+                y = resample(y, sample_rate, self.sample_rate)
+                sample_rate = self.sample_rate
+
+            y = np.hstack(
+                [
+                    self.get_features(y[:, c : c + 1], sample_rate)
+                    for c in range(y.shape[1])
+                ]
+            )
+
+        else:
 
-        y = self.get_features(y, sample_rate)
+            # extract specific channel if requested
+            channel = current_file.get("channel", None)
+            if channel is not None:
+                y = y[:, channel - 1 : channel]
+
+            y = self.get_features(y, sample_rate)
+
+        # waveform has been resampled if needed
+        if self.sample_rate is not None:
+            sample_rate = self.sample_rate
 
         sliding_window = SlidingWindow(
             start=-0.5 / sample_rate, duration=1.0 / sample_rate, step=1.0 / sample_rate
         )
 
         if return_sr:
-            return (
-                SlidingWindowFeature(y, sliding_window),
-                sample_rate if self.sample_rate is None else self.sample_rate,
-            )
+            return SlidingWindowFeature(y, sliding_window), sample_rate
 
         return SlidingWindowFeature(y, sliding_window)
 
+    def blocks(self, current_file, duration, step=None):
+        """Iterate over fixed-size waveform blocks
+
+        Unlike `__call__`, the whole file is never loaded into memory: audio
+        is decoded (and resampled, when needed) progressively. Resampling is
+        stateful so that the concatenation of non-overlapping blocks is the
+        same as resampling the whole file at once.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        duration : float
+            Block duration, in seconds.
+        step : float, optional
+            Step between two consecutive blocks, in seconds. Use step < duration
+            for overlapping blocks. Defaults to `duration`.
+
+        Yields
+        ------
+        block : `pyannote.core.SlidingWindowFeature`
+            (n_samples, n_channels) waveform block. All blocks have the same
+            number of samples, except the last one that might be shorter.
+
+        Notes
+        -----
+        Channel selection, conversion to mono and data augmentation are
+        applied block-wise.
+        """
+
+        if step is None:
+            step = duration
+
+        if step > duration:
+            msg = (
+                f"`step` ({step:g}s) should not be greater than "
+                f"`duration` ({duration:g}s)."
+            )
+            raise ValueError(msg)
+
+        if "waveform" in current_file:
+
+            if self.sample_rate is None:
+                msg = (
+                    "`RawAudio` needs to be instantiated with an actual "
+                    "`sample_rate` if one wants to use precomputed "
+                    "waveform."
+                )
+                raise ValueError(msg)
+
+            file_sample_rate = self.sample_rate
+            waveform = current_file["waveform"]
+
+            n = int(np.round(step * file_sample_rate))
+            chunks = (waveform[i : i + n] for i in range(0, len(waveform), n))
+
+        else:
+            audio_file = SoundFile(current_file["audio"], "r")
+            file_sample_rate = audio_file.samplerate
+
+            n = int(np.round(step * file_sample_rate))
+            chunks = audio_file.blocks(blocksize=n, dtype="float32", always_2d=True)
+
+        sample_rate = file_sample_rate if self.sample_rate is None else self.sample_rate
+
+        block_size = int(np.round(duration * sample_rate))
+        hop = int(np.round(step * sample_rate))
+
+        if (self.sample_rate is not None) and (sample_rate != file_sample_rate):
+            resampler = StreamingResampler(file_sample_rate, sample_rate)
+        else:
+            resampler = None
+
+        channel = current_file.get("channel", None)
+
+        def _select(y):
+            # extract specific channel if requested
+            if channel is not None:
+                y = y[:, channel - 1 : channel]
+            # convert to mono
+            if self.mono and y.shape[1] > 1:
+                y = np.mean(y, axis=1, keepdims=True)
+            return y
+
+        def _block(y, start):
+            # augment data
+            if self.augmentation is not None:
+                y = self.augmentation(y, sample_rate)
+            sliding_window = SlidingWindow(
+                start=(start - 0.5) / sample_rate,
+                duration=1.0 / sample_rate,
+                step=1.0 / sample_rate,
+            )
+            return SlidingWindowFeature(y, sliding_window)
+
+        # buffer[0] is sample #offset
+        buffer, offset, n_blocks = None, 0, 0
+
+        try:
+            for y in chunks:
+
+                y = _select(y)
+                if resampler is not None:
+                    y = resampler(y)
+
+                buffer = y if buffer is None else np.vstack([buffer, y])
+
+                while len(buffer) >= block_size:
+                    yield _block(buffer[:block_size], offset)
+                    n_blocks += 1
+                    buffer = buffer[hop:]
+                    offset += hop
+
+        finally:
+            if "waveform" not in current_file:
+                audio_file.close()
+
+        if buffer is None:
+            return
+
+        if resampler is not None:
+            buffer = np.vstack([buffer, resampler.flush()])
+
+        # yield last (shorter) blocks as long as they contain samples
+        # that were not part of any previous block
+        while len(buffer) > (block_size - hop if n_blocks > 0 else 0):
+            yield _block(buffer[:block_size], offset)
+            n_blocks += 1
+            buffer = buffer[hop:]
+            offset += hop
+
     def get_context_duration(self):
         return 0.0
 
@@ -294,10 +451,6 @@ class RawAudio:
             segment, mode=mode, fixed=fixed, return_ranges=True
         )
 
-        # this is expected number of samples.
-        # this will be useful later in case of on-the-fly resampling
-        n_samples = end - start
-
         if "waveform" in current_file:
 
             y = current_file["waveform"]
@@ -319,22 +472,19 @@ class RawAudio:
 
                 sample_rate = audio_file.samplerate
 
-                # if the sample rates are mismatched,
-                # recompute the start and end
+                # if the sample rates are mismatched, read native samples
+                # needed to compute the requested range of resampled samples
                 if sample_rate != self.sample_rate:
-
-                    sliding_window = SlidingWindow(
-                        start=-0.5 / sample_rate,
-                        duration=1.0 / sample_rate,
-                        step=1.0 / sample_rate,
-                    )
-                    ((start, end),) = sliding_window.crop(
-                        segment, mode=mode, fixed=fixed, return_ranges=True
-                    )
+                    j0, j1 = get_input_range(start, end, sample_rate, self.sample_rate)
+                    j0, j1 = max(0, j0), min(j1, audio_file.frames)
+                else:
+                    j0, j1 = start, end
 
                 try:
-                    audio_file.seek(start)
-                    data = audio_file.read(end - start, dtype="float32", always_2d=True)
+                    audio_file.seek(j0)
+                    data = audio_file.read(
+                        max(0, j1 - j0), dtype="float32", always_2d=True
+                    )
                 except RuntimeError as e:
                     msg = (
                         f"SoundFile failed to seek-and-read in "
@@ -348,6 +498,13 @@ class RawAudio:
         if channel is not None:
             data = data[:, channel - 1 : channel]
 
+        # resample exactly the requested range of samples
+        if sample_rate != self.sample_rate:
+            if self.mono and data.shape[1] > 1:
+                data = np.mean(data, axis=1, keepdims=True)
+            data = resample_range(data, j0, start, end, sample_rate, self.sample_rate)
+            sample_rate = self.sample_rate
+
         return self.get_features(data, sample_rate)
 
 
@@ -28,11 +28,14 @@
 
 """
 Feature extraction using [`librosa`](https://librosa.github.io/librosa/)
+
+Features are actually computed by a batched NumPy re-implementation of
+`librosa` (see `pyannote.audio.features.engine`).
 """
 
-import librosa
 import numpy as np
 
+from . import engine
 from .base import FeatureExtraction
 from pyannote.core.segment import SlidingWindow
 
@@ -65,6 +68,23 @@ class LibrosaFeatureExtraction(FeatureExtraction):
     def get_resolution(self):
         return self.sliding_window_
 
+    def get_features(self, y, sample_rate):
+        """Feature extraction
+
+        Parameters
+        ----------
+        y : (n_samples, 1) numpy array
+            Waveform
+        sample_rate : int
+            Sample rate
+
+        Returns
+        -------
+        data : (n_frames, n_dimensions) numpy array
+            Features
+        """
+        return self.get_features_batch(y.T, sample_rate)[0]
+
 
 class LibrosaSpectrogram(LibrosaFeatureExtraction):
     """librosa spectrogram
@@ -98,30 +118,29 @@ class LibrosaSpectrogram(LibrosaFeatureExtraction):
     def get_dimension(self):
         return self.n_fft_ // 2 + 1
 
-    def get_features(self, y, sample_rate):
-        """Feature extraction
+    def get_features_batch(self, y, sample_rate):
+        """Batch feature extraction
 
         Parameters
         ----------
-        y : (n_samples, 1) numpy array
-            Waveform
+        y : (batch_size, n_samples) numpy array
+            Batch of waveforms
         sample_rate : int
             Sample rate
 
         Returns
         -------
-        data : (n_frames, n_dimensions) numpy array
+        data : (batch_size, n_frames, n_dimensions) numpy array
             Features
         """
 
-        fft = librosa.core.stft(
-            y=y.squeeze(),
+        return engine.spectrogram(
+            y,
             n_fft=self.n_fft_,
             hop_length=self.hop_length_,
-            center=True,
             window="hamming",
+            center=True,
         )
-        return np.abs(fft).T
 
 
 class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
@@ -164,32 +183,33 @@ class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
     def get_dimension(self):
         return self.n_mels
 
-    def get_features(self, y, sample_rate):
-        """Feature extraction
+    def get_features_batch(self, y, sample_rate):
+        """Batch feature extraction
 
         Parameters
         ----------
-        y : (n_samples, 1) numpy array
-            Waveform
+        y : (batch_size, n_samples) numpy array
+            Batch of waveforms
         sample_rate : int
             Sample rate
 
         Returns
         -------
-        data : (n_frames, n_mels) numpy array
+        data : (batch_size, n_frames, n_mels) numpy array
             Features
         """
 
-        X = librosa.feature.melspectrogram(
-            y.squeeze(),
-            sr=sample_rate,
-            n_mels=self.n_mels,
+        X = engine.mel_spectrogram(
+            y,
+            sample_rate,
             n_fft=self.n_fft_,
             hop_length=self.hop_length_,
+            n_mels=self.n_mels,
             power=2.0,
         )
 
-        return librosa.amplitude_to_db(X, ref=1.0, amin=1e-5, top_db=80.0).T
+        # same as librosa.amplitude_to_db(X, ref=1.0, amin=1e-5, top_db=80.0)
+        return engine.power_to_db(X ** 2, amin=1e-10, top_db=80.0)
 
 
 class LibrosaMFCC(LibrosaFeatureExtraction):
@@ -285,19 +305,19 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
     def get_context_duration(self):
         return 0.0
 
-    def get_features(self, y, sample_rate):
-        """Feature extraction
+    def get_features_batch(self, y, sample_rate):
+        """Batch feature extraction
 
         Parameters
         ----------
-        y : (n_samples, 1) numpy array
-            Waveform
+        y : (batch_size, n_samples) numpy array
+            Batch of waveforms
         sample_rate : int
             Sample rate
 
         Returns
         -------
-        data : (n_frames, n_dimensions) numpy array
+        data : (batch_size, n_frames, n_dimensions) numpy array
             Features
         """
 
@@ -307,9 +327,9 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
         n_fft = int(self.duration * sample_rate)
         hop_length = int(self.step * sample_rate)
 
-        mfcc = librosa.feature.mfcc(
-            y=y.squeeze(),
-            sr=sample_rate,
+        mfcc = engine.mfcc(
+            y,
+            sample_rate,
             n_mfcc=n_mfcc,
             n_fft=n_fft,
             hop_length=hop_length,
@@ -320,31 +340,31 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
         )
 
         if self.De or self.D:
-            mfcc_d = librosa.feature.delta(mfcc, width=9, order=1, axis=-1)
+            mfcc_d = engine.delta(mfcc, width=9, order=1)
 
         if self.DDe or self.DD:
-            mfcc_dd = librosa.feature.delta(mfcc, width=9, order=2, axis=-1)
+            mfcc_dd = engine.delta(mfcc, width=9, order=2)
 
         stack = []
 
         if self.e:
-            stack.append(mfcc[0, :])
+            stack.append(mfcc[:, :, :1])
 
-        stack.append(mfcc[1:, :])
+        stack.append(mfcc[:, :, 1:])
 
         if self.De:
-            stack.append(mfcc_d[0, :])
+            stack.append(mfcc_d[:, :, :1])
 
         if self.D:
-            stack.append(mfcc_d[1:, :])
+            stack.append(mfcc_d[:, :, 1:])
 
         if self.DDe:
-            stack.append(mfcc_dd[0, :])
+            stack.append(mfcc_dd[:, :, :1])
 
         if self.DD:
-            stack.append(mfcc_dd[1:, :])
+            stack.append(mfcc_dd[:, :, 1:])
 
-        return np.vstack(stack).T
+        return np.concatenate(stack, axis=-1)
 
     def get_dimension(self):
         n_features = 0
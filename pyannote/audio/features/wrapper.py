@@ -38,7 +38,15 @@ from pyannote.core import SlidingWindowFeature
 import numpy as np
 
 Wrappable = Union[
-    "Precomputed", "Pretrained", "RawAudio", "FeatureExtraction", Dict, Text, Path
+    "Precomputed",
+    "Pretrained",
+    "PretrainedPool",
+    "EnergyCascade",
+    "RawAudio",
+    "FeatureExtraction",
+    Dict,
+    Text,
+    Path,
 ]
 
 # this needs to go here to make Wrapper instances pickable
@@ -60,8 +68,10 @@ class Wrapper:
     -----
     If `wrappable` already complies with the `FeatureExtraction` API , it is
     kept unchanged. This includes instances of any `FeatureExtraction` subclass,
-    `RawAudio` instances, `Precomputed` instances, and `Pretrained instances.
-    In this case, keyword parameters are not used.
+    `RawAudio` instances, `Precomputed` instances, `Pretrained instances,
+    `PretrainedPool` instances (for multi-process CPU inference), and
+    `EnergyCascade` instances (for skipping silent regions). In this case,
+    keyword parameters are not used.
 
     * If `wrappable` is a `Path` to a directory containing precomputed features
       or scores (e.g. the one created by `pyannote-audio [...] apply [...]`), it
@@ -90,6 +100,13 @@ class Wrapper:
 
       lambda current_file: current_file['key']
 
+    * If `wrappable` is a `Text` such as 'unix:///path/to/socket#name' or
+      'tcp://localhost:port#name', it stands for:
+
+      RemotePretrained('unix:///path/to/socket', 'name', **params)
+
+      i.e. 'name' model served by a local `InferenceServer`.
+
     In any other situation, it will raise an error.
 
     Notes
@@ -120,6 +137,8 @@ class Wrapper:
         from pyannote.audio.features import Precomputed
         from pyannote.audio.features import FeatureExtraction
         from pyannote.audio.features import RawAudio
+        from pyannote.audio.features.pool import PretrainedPool
+        from pyannote.audio.features.cascade import EnergyCascade
 
         scorer = None
         msg = ""
@@ -131,10 +150,18 @@ class Wrapper:
 
         # If `wrappable` already complies with the `FeatureExtraction` API , it
         # is kept unchanged. This includes instances of any `FeatureExtraction`
-        # subclass,`RawAudio` instances, `Precomputed` instances, and
-        # `Pretrained` instances.
+        # subclass,`RawAudio` instances, `Precomputed` instances, `Pretrained`
+        # instances, `PretrainedPool` instances, and `EnergyCascade` instances.
         if isinstance(
-            wrappable, (FeatureExtraction, RawAudio, Pretrained, Precomputed)
+            wrappable,
+            (
+                FeatureExtraction,
+                RawAudio,
+                Pretrained,
+                Precomputed,
+                PretrainedPool,
+                EnergyCascade,
+            ),
         ):
             scorer = wrappable
 
@@ -189,6 +216,22 @@ class Wrapper:
                 scorer = partial(_use_existing_key, key)
                 # scorer = lambda current_file: current_file[key]
 
+            # If `wrappable` is a `Text` such as "unix:///path/to/socket#name",
+            # it means that one should use "name" model served by the local
+            # inference server listening at "unix:///path/to/socket".
+            elif "://" in wrappable:
+                from pyannote.audio.features.server import RemotePretrained
+
+                address, _, name = wrappable.partition("#")
+                try:
+                    scorer = RemotePretrained(address, name, **params)
+                except Exception as e:
+                    msg = (
+                        f'Could not use "{name}" model served at "{address}". '
+                        f"The following exception was raised:\n{e}"
+                    )
+                    scorer = None
+
             # If `wrappable` is a `Text` containing the name of an existing
             # `torch.hub` model, wrap the corresponding `Pretrained`.
             else:
@@ -0,0 +1,419 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 CNRS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+# Torch feature extraction frontends
+
+Torch re-implementation of `pyannote.audio.features.with_librosa` feature
+extractors, meant to be used as the first layer of a model fed with raw
+waveforms. Features are therefore computed on (batched) chunks, on the same
+device as the rest of the model.
+"""
+
+from typing import Text
+
+import numpy as np
+import scipy.signal
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from pyannote.core import SlidingWindow
+from pyannote.audio.features import engine
+
+
+class Spectrogram(nn.Module):
+    """Torch version of `LibrosaSpectrogram`
+
+    Parameters
+    ----------
+    sample_rate : int, optional
+        Defaults to 16000 (i.e. 16kHz)
+    duration : float, optional
+        Defaults to 0.025.
+    step : float, optional
+        Defaults to 0.010.
+    """
+
+    window = "hamming"
+    power = 1.0
+
+    def __init__(
+        self, sample_rate: int = 16000, duration: float = 0.025, step: float = 0.010
+    ):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.duration = duration
+        self.step = step
+
+        self.n_fft_ = int(self.duration * self.sample_rate)
+        self.hop_length_ = int(self.step * self.sample_rate)
+
+        # windowed discrete Fourier transform basis
+        window = engine.get_window(self.window, self.n_fft_)
+        n_bins = self.n_fft_ // 2 + 1
+        angle = (
+            2
+            * np.pi
+            * np.arange(self.n_fft_)[:, np.newaxis]
+            * np.arange(n_bins)
+            / self.n_fft_
+        )
+        self.register_buffer(
+            "dft_",
+            torch.tensor(
+                np.hstack(
+                    [
+                        window[:, np.newaxis] * np.cos(angle),
+                        -window[:, np.newaxis] * np.sin(angle),
+                    ]
+                ),
+                dtype=torch.float32,
+            ),
+            persistent=False,
+        )
+
+    @property
+    def sliding_window(self) -> SlidingWindow:
+        """Sliding window used for feature extraction"""
+        return SlidingWindow(
+            start=-0.5 * self.duration, duration=self.duration, step=self.step
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.n_fft_ // 2 + 1
+
+    def spectrogram(self, waveforms: torch.Tensor) -> torch.Tensor:
+        """Compute magnitude (or power) spectrogram
+
+        Parameters
+        ----------
+        waveforms : (batch_size, n_samples, 1) `torch.Tensor`
+            Batch of waveforms.
+
+        Returns
+        -------
+        spectrogram : (batch_size, n_frames, n_fft // 2 + 1) `torch.Tensor`
+        """
+
+        # reflect-pad waveforms so that frame t is centered on sample t x hop
+        padding = self.n_fft_ // 2
+        waveforms = F.pad(waveforms.transpose(1, 2), (padding, padding), mode="reflect")
+
+        # (batch_size, n_frames, n_fft)
+        frames = waveforms[:, 0].unfold(-1, self.n_fft_, self.hop_length_)
+
+        real, imag = torch.matmul(frames, self.dft_).chunk(2, dim=-1)
+        S = real ** 2 + imag ** 2
+        if self.power == 2.0:
+            return S
+        return S ** (0.5 * self.power)
+
+    def forward(self, waveforms: torch.Tensor) -> torch.Tensor:
+        """Extract features
+
+        Parameters
+        ----------
+        waveforms : (batch_size, n_samples, 1) `torch.Tensor`
+            Batch of waveforms.
+
+        Returns
+        -------
+        features : (batch_size, n_frames, dimension) `torch.Tensor`
+            Batch of features.
+        """
+        return self.spectrogram(waveforms)
+
+
+def power_to_db(
+    S: torch.Tensor, amin: float = 1e-10, top_db: float = 80.0
+) -> torch.Tensor:
+    """Torch version of `pyannote.audio.features.engine.power_to_db`"""
+    S_db = 10.0 * torch.log10(torch.clamp(S, min=amin))
+    if top_db is not None:
+        peak = S_db.reshape(len(S_db), -1).max(dim=1)[0]
+        S_db = torch.max(S_db, (peak - top_db).view(-1, 1, 1))
+    return S_db
+
+
+class MelSpectrogram(Spectrogram):
+    """Torch version of `LibrosaMelSpectrogram`
+
+    Parameters
+    ----------
+    sample_rate : int, optional
+        Defaults to 16000 (i.e. 16kHz)
+    duration : float, optional
+        Defaults to 0.025.
+    step : float, optional
+        Defaults to 0.010.
+    n_mels : int, optional
+        Defaults to 96.
+    fmin, fmax, htk : optional
+        See `pyannote.audio.features.engine.get_mel_filterbank`.
+    """
+
+    window = "hann"
+    power = 2.0
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        duration: float = 0.025,
+        step: float = 0.010,
+        n_mels: int = 96,
+        fmin: float = 0.0,
+        fmax: float = None,
+        htk: bool = False,
+    ):
+        super().__init__(sample_rate=sample_rate, duration=duration, step=step)
+        self.n_mels = n_mels
+        self.register_buffer(
+            "filterbank_",
+            torch.tensor(
+                engine.get_mel_filterbank(
+                    self.sample_rate, self.n_fft_, n_mels, fmin, fmax, htk
+                ),
+                dtype=torch.float32,
+            ),
+            persistent=False,
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.n_mels
+
+    def mel_spectrogram(self, waveforms: torch.Tensor) -> torch.Tensor:
+        return torch.matmul(self.spectrogram(waveforms), self.filterbank_)
+
+    def forward(self, waveforms: torch.Tensor) -> torch.Tensor:
+        # same as librosa.amplitude_to_db(X, ref=1.0, amin=1e-5, top_db=80.0)
+        X = self.mel_spectrogram(waveforms)
+        return power_to_db(X ** 2, amin=1e-10, top_db=80.0)
+
+
+class Delta(nn.Module):
+    """Torch version of `pyannote.audio.features.engine.delta`
+
+    Parameters
+    ----------
+    width : int, optional
+        Number of frames over which to compute the derivatives. Defaults to 9.
+    order : int, optional
+        Order of the derivatives. Defaults to 1.
+    """
+
+    def __init__(self, width: int = 9, order: int = 1):
+        super().__init__()
+        self.width = width
+        self.order = order
+
+        # Savitzky-Golay filter
+        self.register_buffer(
+            "kernel_",
+            torch.tensor(
+                scipy.signal.savgol_coeffs(width, order, deriv=order, use="dot"),
+                dtype=torch.float32,
+            ).view(1, 1, width),
+            persistent=False,
+        )
+
+        # polynomial fit on first (and last) "width" frames
+        edges = scipy.signal.savgol_filter(
+            np.eye(width), width, order, deriv=order, axis=0, mode="interp"
+        )
+        self.register_buffer(
+            "edges_", torch.tensor(edges, dtype=torch.float32), persistent=False
+        )
+
+    def forward(self, features: torch.Tensor) -> torch.Tensor:
+        """Compute temporal derivatives
+
+        Parameters
+        ----------
+        features : (batch_size, n_frames, dimension) `torch.Tensor`
+
+        Returns
+        -------
+        delta : (batch_size, n_frames, dimension) `torch.Tensor`
+        """
+
+        batch_size, n_frames, dimension = features.shape
+        if self.width > n_frames:
+            msg = (
+                f"Derivatives cannot be computed over {self.width:d} frames when "
+                f"features only contain {n_frames:d} frames."
+            )
+            raise ValueError(msg)
+
+        half = self.width // 2
+
+        # (batch_size x dimension, 1, n_frames)
+        X = features.transpose(1, 2).reshape(-1, 1, n_frames)
+        center = F.conv1d(X, self.kernel_)
+        center = center.view(batch_size, dimension, -1).transpose(1, 2)
+
+        left = torch.matmul(self.edges_[:half], features[:, : self.width])
+        right = torch.matmul(self.edges_[half + 1 :], features[:, -self.width :])
+
+        return torch.cat([left, center, right], dim=1)
+
+
+class MFCC(MelSpectrogram):
+    """Torch version of `LibrosaMFCC`
+
+    Parameters
+    ----------
+    sample_rate : int, optional
+        Defaults to 16000 (i.e. 16kHz)
+    duration : float, optional
+        Defaults to 0.025.
+    step : float, optional
+        Defaults to 0.010.
+    e, coefs, De, D, DDe, DD, fmin, fmax, n_mels :
+        See `LibrosaMFCC`.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        duration: float = 0.025,
+        step: float = 0.010,
+        e: bool = False,
+        De: bool = True,
+        DDe: bool = True,
+        coefs: int = 19,
+        D: bool = True,
+        DD: bool = True,
+        fmin: float = 0.0,
+        fmax: float = None,
+        n_mels: int = 40,
+    ):
+        super().__init__(
+            sample_rate=sample_rate,
+            duration=duration,
+            step=step,
+            n_mels=n_mels,
+            fmin=fmin,
+            fmax=fmax,
+            htk=True,
+        )
+
+        self.e = e
+        self.coefs = coefs
+        self.De = De
+        self.DDe = DDe
+        self.D = D
+        self.DD = DD
+
+        # adding because C0 is the energy
+        self.register_buffer(
+            "dct_",
+            torch.tensor(
+                engine.get_dct_matrix(n_mels, self.coefs + 1), dtype=torch.float32
+            ),
+            persistent=False,
+        )
+        self.delta_ = Delta(width=9, order=1)
+        self.delta_delta_ = Delta(width=9, order=2)
+
+    @property
+    def dimension(self) -> int:
+        n_features = 0
+        n_features += self.e
+        n_features += self.De
+        n_features += self.DDe
+        n_features += self.coefs
+        n_features += self.coefs * self.D
+        n_features += self.coefs * self.DD
+        return n_features
+
+    def forward(self, waveforms: torch.Tensor) -> torch.Tensor:
+
+        mfcc = torch.matmul(power_to_db(self.mel_spectrogram(waveforms)), self.dct_)
+
+        if self.De or self.D:
+            mfcc_d = self.delta_(mfcc)
+
+        if self.DDe or self.DD:
+            mfcc_dd = self.delta_delta_(mfcc)
+
+        stack = []
+
+        if self.e:
+            stack.append(mfcc[:, :, :1])
+
+        stack.append(mfcc[:, :, 1:])
+
+        if self.De:
+            stack.append(mfcc_d[:, :, :1])
+
+        if self.D:
+            stack.append(mfcc_d[:, :, 1:])
+
+        if self.DDe:
+            stack.append(mfcc_dd[:, :, :1])
+
+        if self.DD:
+            stack.append(mfcc_dd[:, :, 1:])
+
+        return torch.cat(stack, dim=-1)
+
+
+FRONTENDS = {
+    "LibrosaSpectrogram": Spectrogram,
+    "LibrosaMelSpectrogram": MelSpectrogram,
+    "LibrosaMFCC": MFCC,
+}
+
+
+def get_frontend(name: Text, params: dict = None) -> nn.Module:
+    """Get torch frontend equivalent to a `pyannote.audio.features` extractor
+
+    Parameters
+    ----------
+    name : str
+        One of "LibrosaSpectrogram", "LibrosaMelSpectrogram" or "LibrosaMFCC".
+    params : dict, optional
+        Feature extraction parameters (e.g. copied from the "feature_extraction"
+        section of a config.yml file). "augmentation" is not supported.
+
+    Returns
+    -------
+    frontend : nn.Module
+    """
+
+    if name not in FRONTENDS:
+        msg = (
+            f'Unsupported frontend "{name}". '
+            f'Should be one of {", ".join(FRONTENDS)}.'
+        )
+        raise ValueError(msg)
+
+    if params is None:
+        params = dict()
+
+    return FRONTENDS[name](**params)
@@ -29,11 +29,16 @@
 
 from typing import Optional
 from typing import Text
+from typing import Tuple
 
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence
+from torch.nn.utils.rnn import pad_packed_sequence
+from torch.nn.utils.rnn import PackedSequence
 
 from .sincnet import SincNet
+from .frontend import get_frontend
 from .tdnn import XVectorNet
 from .pooling import TemporalPooling
 
@@ -156,7 +161,7 @@ class RNN(nn.Module):
                 bidirectional=self.bidirectional,
             )
 
-    def forward(self, features, return_intermediate=False):
+    def forward(self, features, return_intermediate=False, lengths=None):
         """Apply recurrent layer (and optional temporal pooling)
 
         Parameters
@@ -165,6 +170,12 @@ class RNN(nn.Module):
             Features shaped as (batch_size, n_frames, n_features)
         return_intermediate : `boolean`, optional
             Return intermediate RNN hidden state.
+        lengths : `torch.Tensor`, optional
+            (batch_size, ) number of frames of each sequence, when `features`
+            is a batch of variable-length sequences padded to `n_frames`.
+            Sequences are then packed so that recurrent layers do not process
+            padded frames (whose output is set to zero), and temporal pooling
+            ignores them.
 
         Returns
         -------
@@ -207,14 +218,15 @@ class RNN(nn.Module):
                     if i > 0:
                         output, hidden = rnn(output, hidden)
                     else:
-                        output, hidden = rnn(features)
-                    outputs.append(output)
+                        output, hidden = rnn(self._pack(features, lengths))
+                    outputs.append(self._unpack(output, features))
 
                 # ... and concatenate their output
                 output = torch.cat(outputs, dim=2)
 
             else:
-                output, hidden = self.rnn_(features)
+                output, hidden = self.rnn_(self._pack(features, lengths))
+                output = self._unpack(output, features)
 
                 if return_intermediate:
                     if self.unit == "LSTM":
@@ -231,13 +243,113 @@ class RNN(nn.Module):
                     )
 
         if self.pool_ is not None:
-            output = self.pool_(output)
+            output = self.pool_(output, lengths=lengths)
 
         if return_intermediate:
             return output, intermediate
 
         return output
 
+    def forward_stateful(self, features, n_frames, state=None):
+        """Apply recurrent layers on one chunk of a longer sequence
+
+        Consecutive chunks are expected to be processed in order, each of
+        them starting right after the previous `n_frames` frames. The forward
+        direction carries its hidden state from one chunk to the next. The
+        backward direction (when bidirectional) starts from the end of the
+        chunk: its last frames (after the first `n_frames`) are therefore only
+        used as lookahead.
+
+        Parameters
+        ----------
+        features : `torch.Tensor`
+            Features shaped as (batch_size, n_frames + n_lookahead, n_features)
+        n_frames : `int`
+            Number of frames to process. Remaining frames are only used as
+            lookahead by backward direction.
+        state : optional
+            Hidden state returned by the call on the previous chunk. Defaults
+            to starting a new sequence.
+
+        Returns
+        -------
+        output : `torch.Tensor`
+            Output features shaped as (batch_size, n_frames, dimension)
+        state :
+            Hidden state to be passed to the call on the next chunk.
+        """
+
+        if self.pool_ is not None:
+            msg = "Stateful inference is not supported with temporal pooling."
+            raise ValueError(msg)
+
+        if self.num_layers < 1:
+            return features[:, :n_frames], state
+
+        if self.concatenate:
+            msg = 'Stateful inference is not supported when "concatenate" is True.'
+            raise ValueError(msg)
+
+        lstm = self.unit == "LSTM"
+        features, lookahead = features[:, :n_frames], features[:, n_frames:]
+
+        batch_size = features.shape[0]
+        zeros = features.new_zeros(self.num_layers, batch_size, self.hidden_size)
+        if state is None:
+            state = (zeros, zeros) if lstm else zeros
+
+        if not self.bidirectional:
+            return self.rnn_(features, state)
+
+        # backward direction initial state is obtained by going through the
+        # lookahead frames (starting from scratch at the end of the chunk).
+        if lookahead.shape[1] > 0:
+            _, hidden = self.rnn_(lookahead)
+            if lstm:
+                backward = tuple(h[1::2] for h in hidden)
+            else:
+                backward = hidden[1::2]
+        else:
+            backward = (zeros, zeros) if lstm else zeros
+
+        # (num_layers * num_directions, batch_size, hidden_size)
+        if lstm:
+            hidden = tuple(
+                torch.stack([f, b], dim=1).flatten(0, 1)
+                for f, b in zip(state, backward)
+            )
+        else:
+            hidden = torch.stack([state, backward], dim=1).flatten(0, 1)
+
+        output, hidden = self.rnn_(features, hidden)
+
+        # only keep forward direction hidden state
+        if lstm:
+            state = tuple(h[0::2] for h in hidden)
+        else:
+            state = hidden[0::2]
+
+        return output, state
+
+    @staticmethod
+    def _pack(features, lengths=None):
+        """Pack variable-length sequences (if needed)"""
+        if lengths is None:
+            return features
+        return pack_padded_sequence(
+            features, lengths.cpu(), batch_first=True, enforce_sorted=False
+        )
+
+    @staticmethod
+    def _unpack(output, features):
+        """Pad packed sequences back to the shape of `features` (if needed)"""
+        if not isinstance(output, PackedSequence):
+            return output
+        output, _ = pad_packed_sequence(
+            output, batch_first=True, total_length=features.shape[1]
+        )
+        return output
+
     def dimension():
         doc = "Output features dimension."
 
@@ -399,12 +511,20 @@ class PyanNet(Model):
     embedding : `dict`, optional
         Embedding parameters. Defaults to `Embedding` default parameters. This
         only has effect when model is used for representation learning.
+    frontend : `dict`, optional
+        Replace SincNet by a torch version of a handcrafted feature extractor,
+        e.g. {'name': 'LibrosaMFCC', 'params': {'e': False}}. Features are
+        then computed from waveforms as part of the forward pass.
+        See `pyannote.audio.models.frontend.get_frontend`.
     """
 
     @staticmethod
-    def get_alignment(task: Task, sincnet=None, **kwargs):
+    def get_alignment(task: Task, sincnet=None, frontend=None, **kwargs):
         """Get frame alignment"""
 
+        if frontend is not None:
+            return "center"
+
         if sincnet is None:
             sincnet = dict()
 
@@ -418,6 +538,7 @@ class PyanNet(Model):
         task: Task,
         sincnet: Optional[dict] = None,
         rnn: Optional[dict] = None,
+        frontend: Optional[dict] = None,
         **kwargs,
     ) -> Resolution:
         """Get sliding window used for feature extraction
@@ -427,6 +548,7 @@ class PyanNet(Model):
         task : Task
         sincnet : dict, optional
         rnn : dict, optional
+        frontend : dict, optional
 
         Returns
         -------
@@ -442,6 +564,9 @@ class PyanNet(Model):
         if rnn.get("pool", None) is not None:
             return RESOLUTION_CHUNK
 
+        if frontend is not None:
+            return get_frontend(**frontend).sliding_window
+
         if sincnet is None:
             sincnet = {"skip": False}
 
@@ -456,6 +581,7 @@ class PyanNet(Model):
         rnn: Optional[dict] = None,
         ff: Optional[dict] = None,
         embedding: Optional[dict] = None,
+        frontend: Optional[dict] = None,
     ):
         """waveform -> SincNet -> RNN [-> merge] [-> time_pool] -> FC -> output
 
@@ -473,6 +599,9 @@ class PyanNet(Model):
         embedding : `dict`, optional
             Embedding parameters. Defaults to `Embedding` default parameters. This
             only has effect when model is used for representation learning.
+        frontend : `dict`, optional
+            Replace SincNet by a torch version of a handcrafted feature
+            extractor, e.g. {'name': 'LibrosaMFCC', 'params': {'e': False}}.
         """
 
         n_features = self.n_features
@@ -481,7 +610,18 @@ class PyanNet(Model):
             sincnet = dict()
         self.sincnet = sincnet
 
-        if not sincnet.get("skip", False):
+        self.frontend = frontend
+        if frontend is not None:
+            if n_features != 1:
+                msg = (
+                    f"Feature extraction frontend only supports mono waveforms. "
+                    f"Here, waveform has {n_features} channels."
+                )
+                raise ValueError(msg)
+            self.frontend_ = get_frontend(**frontend)
+            n_features = self.frontend_.dimension
+
+        elif not sincnet.get("skip", False):
             if n_features != 1:
                 msg = (
                     f"SincNet only supports mono waveforms. "
@@ -513,7 +653,9 @@ class PyanNet(Model):
         self.linear_ = nn.Linear(n_features, len(self.classes), bias=True)
         self.activation_ = self.task.default_activation
 
-    def forward(self, waveforms, return_intermediate=None):
+    supports_packed = True
+
+    def forward(self, waveforms, return_intermediate=None, lengths=None):
         """Forward pass
 
         Parameters
@@ -524,6 +666,12 @@ class PyanNet(Model):
         return_intermediate : `int`, optional
             Index of RNN layer. Returns RNN intermediate hidden state.
             Defaults to only return the final output.
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of samples of each waveform, when `waveforms` is a batch of
+            variable-length waveforms padded to `n_samples`. Padded samples
+            are then ignored by SincNet normalization, recurrent layers, and
+            temporal pooling. Output of padded frames is meaningless. Not
+            supported with feature extraction `frontend`.
 
         Returns
         -------
@@ -534,35 +682,117 @@ class PyanNet(Model):
             is provided).
         """
 
-        if self.sincnet.get("skip", False):
+        output, lengths = self._forward_frontend(waveforms, lengths=lengths)
+
+        return self._forward_features(
+            output, return_intermediate=return_intermediate, lengths=lengths
+        )
+
+    def forward_stateful(self, waveforms, n_frames, state=None):
+        """Forward pass on one chunk of a longer waveform
+
+        See `Model.forward_stateful` for details.
+
+        Parameters
+        ----------
+        waveforms : (batch_size, n_samples, 1) `torch.Tensor`
+            Batch of waveforms (see `forward`).
+        n_frames : int
+            Number of output frames. Remaining ones are only used as lookahead
+            by backward recurrent layers.
+        state : optional
+            State returned by the call on the previous chunk.
+
+        Returns
+        -------
+        output : (batch_size, n_frames, dimension) `torch.Tensor`
+            Output of the first `n_frames` frames.
+        state :
+            State to be passed to the call on the next chunk.
+        """
+
+        output, _ = self._forward_frontend(waveforms)
+        output, state = self.rnn_.forward_stateful(output, n_frames, state=state)
+        return self._forward_output(output), state
+
+    def _forward_frontend(self, waveforms, lengths=None):
+        """Forward pass through SincNet (or frontend)"""
+
+        if self.frontend is not None:
+            if lengths is not None:
+                msg = "Variable-length waveforms are not supported with 'frontend'."
+                raise ValueError(msg)
+            output = self.frontend_(waveforms)
+            # frontend returns one more frame than what is expected by
+            # `Model.slide` and `LabelingTask` (i.e. one frame per step)
+            duration = waveforms.shape[1] / self.frontend_.sample_rate
+            n_frames = self.frontend_.sliding_window.samples(duration, mode="center")
+            output = output[:, :n_frames]
+        elif self.sincnet.get("skip", False):
             output = waveforms
         else:
-            output = self.sincnet_(waveforms)
+            output = self.sincnet_(waveforms, lengths=lengths)
+            if lengths is not None:
+                lengths = self.sincnet_.n_frames(lengths)
+
+        return output, lengths
+
+    def forward_chunks(
+        self,
+        waveform: torch.Tensor,
+        starts: torch.Tensor,
+        n_samples: int,
+        approximate: bool = False,
+        return_intermediate=None,
+    ):
+        """Forward pass on (possibly overlapping) chunks of the same waveform
+
+        SincNet sinc filters are only applied once on the whole waveform.
+        See `Model.forward_chunks` for details. Always exact.
+        """
+
+        if self.frontend is not None or self.sincnet.get("skip", False):
+            return super().forward_chunks(
+                waveform, starts, n_samples, return_intermediate=return_intermediate
+            )
+
+        output = self.sincnet_.forward_chunks(waveform, starts, n_samples)
+        return self._forward_features(output, return_intermediate=return_intermediate)
+
+    def _forward_features(self, output, return_intermediate=None, lengths=None):
+        """Forward pass on SincNet (or frontend) output"""
 
         if return_intermediate is None:
-            output = self.rnn_(output)
+            output = self.rnn_(output, lengths=lengths)
         else:
             if return_intermediate == 0:
                 intermediate = output
-                output = self.rnn_(output)
+                output = self.rnn_(output, lengths=lengths)
             else:
                 return_intermediate -= 1
                 # get RNN final AND intermediate outputs
-                output, intermediate = self.rnn_(output, return_intermediate=True)
+                output, intermediate = self.rnn_(
+                    output, return_intermediate=True, lengths=lengths
+                )
                 # only keep hidden state of requested layer
                 intermediate = intermediate[return_intermediate]
 
+        output = self._forward_output(output)
+
+        if return_intermediate is None or self.task.is_representation_learning:
+            return output
+        return output, intermediate
+
+    def _forward_output(self, output):
+        """Forward pass on RNN output"""
+
         output = self.ff_(output)
 
         if self.task.is_representation_learning:
             return self.embedding_(output)
 
         output = self.linear_(output)
-        output = self.activation_(output)
-
-        if return_intermediate is None:
-            return output
-        return output, intermediate
+        return self.activation_(output)
 
     @property
     def dimension(self):
@@ -573,6 +803,8 @@ class PyanNet(Model):
 
     def intermediate_dimension(self, layer):
         if layer == 0:
+            if self.frontend is not None:
+                return self.frontend_.dimension
             return self.sincnet_.dimension
         return self.rnn_.intermediate_dimension(layer - 1)
 
@@ -591,18 +823,26 @@ class SincTDNN(Model):
     embedding : `dict`, optional
         Embedding parameters. Defaults to `Embedding` default parameters. This
         only has effect when model is used for representation learning.
+    frontend : `dict`, optional
+        Replace SincNet by a torch version of a handcrafted feature extractor,
+        e.g. {'name': 'LibrosaMFCC', 'params': {'e': False}}. Features are
+        then computed from waveforms as part of the forward pass.
+        See `pyannote.audio.models.frontend.get_frontend`.
     """
 
     @staticmethod
-    def get_alignment(task: Task, sincnet=None, **kwargs):
+    def get_alignment(task: Task, sincnet=None, frontend=None, **kwargs):
         """Get frame alignment"""
 
+        if frontend is not None:
+            return "center"
+
         if sincnet is None:
             sincnet = dict()
 
         return SincNet.get_alignment(task, **sincnet)
 
-    supports_packed = False
+    supports_packed = True
 
     @staticmethod
     def get_resolution(
@@ -629,6 +869,7 @@ class SincTDNN(Model):
         sincnet: Optional[dict] = None,
         tdnn: Optional[dict] = None,
         embedding: Optional[dict] = None,
+        frontend: Optional[dict] = None,
     ):
         """waveform -> SincNet -> XVectorNet (TDNN -> FC) -> output
 
@@ -643,6 +884,9 @@ class SincTDNN(Model):
         embedding : `dict`, optional
             Embedding parameters. Defaults to `Embedding` default parameters. This
             only has effect when model is used for representation learning.
+        frontend : `dict`, optional
+            Replace SincNet by a torch version of a handcrafted feature
+            extractor, e.g. {'name': 'LibrosaMFCC', 'params': {'e': False}}.
         """
 
         n_features = self.n_features
@@ -651,13 +895,25 @@ class SincTDNN(Model):
             sincnet = dict()
         self.sincnet = sincnet
 
-        if n_features != 1:
-            raise ValueError(
-                "SincNet only supports mono waveforms. "
-                f"Here, waveform has {n_features} channels."
-            )
-        self.sincnet_ = SincNet(**sincnet)
-        n_features = self.sincnet_.dimension
+        self.frontend = frontend
+        if frontend is not None:
+            if n_features != 1:
+                msg = (
+                    f"Feature extraction frontend only supports mono waveforms. "
+                    f"Here, waveform has {n_features} channels."
+                )
+                raise ValueError(msg)
+            self.frontend_ = get_frontend(**frontend)
+            n_features = self.frontend_.dimension
+
+        else:
+            if n_features != 1:
+                raise ValueError(
+                    "SincNet only supports mono waveforms. "
+                    f"Here, waveform has {n_features} channels."
+                )
+            self.sincnet_ = SincNet(**sincnet)
+            n_features = self.sincnet_.dimension
 
         if tdnn is None:
             tdnn = dict()
@@ -674,13 +930,20 @@ class SincTDNN(Model):
             self.linear_ = nn.Linear(n_features, len(self.classes), bias=True)
             self.activation_ = self.task.default_activation
 
-    def forward(self, waveforms: torch.Tensor, **kwargs) -> torch.Tensor:
+    def forward(
+        self, waveforms: torch.Tensor, lengths: torch.Tensor = None, **kwargs
+    ) -> torch.Tensor:
         """Forward pass
 
         Parameters
         ----------
         waveforms : (batch_size, n_samples, 1) `torch.Tensor`
             Batch of waveforms
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of samples of each waveform, when `waveforms` is a batch of
+            variable-length waveforms padded to `n_samples`. Padded samples
+            are then ignored by SincNet normalization and statistics pooling.
+            Not supported with feature extraction `frontend`.
 
         Returns
         -------
@@ -689,12 +952,103 @@ class SincTDNN(Model):
             (only when `return_intermediate` is provided).
         """
 
-        output = self.sincnet_(waveforms)
+        output, lengths = self._forward_frontend(waveforms, lengths=lengths)
+        return self._forward_features(output, lengths=lengths)
+
+    def _forward_frontend(
+        self, waveforms: torch.Tensor, lengths: torch.Tensor = None
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Forward pass through SincNet (or frontend)"""
+
+        if self.frontend is not None:
+            if lengths is not None:
+                msg = "Variable-length waveforms are not supported with 'frontend'."
+                raise ValueError(msg)
+            output = self.frontend_(waveforms)
+            # frontend returns one more frame than what is expected
+            # (i.e. one frame per step), for consistency with PyanNet
+            duration = waveforms.shape[1] / self.frontend_.sample_rate
+            n_frames = self.frontend_.sliding_window.samples(duration, mode="center")
+            return output[:, :n_frames], None
+
+        output = self.sincnet_(waveforms, lengths=lengths)
+        if lengths is not None:
+            lengths = self.sincnet_.n_frames(lengths)
+        return output, lengths
+
+    def forward_chunks(
+        self,
+        waveform: torch.Tensor,
+        starts: torch.Tensor,
+        n_samples: int,
+        approximate: bool = False,
+        **kwargs,
+    ) -> torch.Tensor:
+        """Forward pass on (possibly overlapping) chunks of the same waveform
+
+        SincNet sinc filters are only applied once on the whole waveform.
+        See `Model.forward_chunks` for details.
+
+        When `approximate` is True, SincNet and frame-level TDNN layers are
+        applied only once on the whole waveform, and statistics pooling of
+        each chunk is obtained from cumulative sums of frame-level
+        activations. Only segment-level layers are applied on each chunk.
+        This is not exact because SincNet normalization statistics are
+        computed on the whole waveform (rather than on each chunk) and
+        because frames close to chunk boundaries now have left and right
+        context. Chunks are also aligned to the closest frame.
+
+        With feature extraction `frontend`, chunks are always processed
+        independently (and exactly).
+        """
+
+        if self.frontend is not None:
+            return super().forward_chunks(waveform, starts, n_samples)
+
+        if not approximate:
+            output = self.sincnet_.forward_chunks(waveform, starts, n_samples)
+            return self._forward_features(output)
+
+        # (n_frames_total, 1500)
+        output = self.sincnet_(waveform[None])
+        output = self.tdnn_.forward_frames(output)[0]
+
+        # index of first frame of each chunk
+        jump = 1
+        for stride, max_pool in zip(self.sincnet_.stride, self.sincnet_.max_pool):
+            jump *= stride * max_pool
+        n_frames = self.tdnn_.n_frames(self.sincnet_.n_frames(n_samples))
+        starts = torch.clamp(
+            torch.round(starts.double() / float(jump)).long(),
+            min=0,
+            max=len(output) - n_frames,
+        )
+
+        output = self.tdnn_.tdnn[-1].forward_windows(output, starts, n_frames)
+
+        return_intermediate = (
+            "segment6" if self.task.is_representation_learning else None
+        )
+        output = self.tdnn_.forward_segments(
+            output, return_intermediate=return_intermediate
+        )
+        return self._forward_output(output)
+
+    def _forward_features(
+        self, output: torch.Tensor, lengths: torch.Tensor = None
+    ) -> torch.Tensor:
+        """Forward pass on SincNet (or frontend) output"""
 
         return_intermediate = (
             "segment6" if self.task.is_representation_learning else None
         )
-        output = self.tdnn_(output, return_intermediate=return_intermediate)
+        output = self.tdnn_(
+            output, return_intermediate=return_intermediate, lengths=lengths
+        )
+        return self._forward_output(output)
+
+    def _forward_output(self, output: torch.Tensor) -> torch.Tensor:
+        """Forward pass on XVectorNet output"""
 
         if self.task.is_representation_learning:
             return self.embedding_(output)
@@ -69,77 +69,162 @@ class TemporalPooling(nn.Module):
             raise ValueError(f"`{method}` is not a valid temporal pooling method")
         return klass()
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         raise NotImplementedError("TemporalPooling subclass must implement `forward`")
 
+    @staticmethod
+    def get_mask(x: torch.Tensor, lengths: torch.Tensor) -> torch.Tensor:
+        """Get mask of valid (i.e. non-padded) elements
+
+        Parameters
+        ----------
+        x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
+            A batch of (padded) sequences.
+        lengths : `torch.Tensor`, shape (batch_size, )
+            Length of each sequence.
+
+        Returns
+        -------
+        mask : `torch.Tensor`, shape (batch_size, seq_len, 1)
+            True for valid elements, False for padded ones.
+        """
+        _, seq_len, _ = x.shape
+        steps = torch.arange(seq_len, device=x.device)
+        return (steps[None, :] < lengths.to(x.device)[:, None])[:, :, None]
+
 
 class SumPool(TemporalPooling):
     """Calculate pooling as the sum over a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        lengths : `torch.Tensor`, shape (batch_size, ), optional
+            Length of each sequence, when `x` is a batch of variable-length
+            sequences padded to `seq_len`. Padded elements are ignored.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
+        if lengths is not None:
+            x = x.masked_fill(~self.get_mask(x, lengths), 0.0)
         return x.sum(dim=1)
 
 
 class MaxPool(TemporalPooling):
     """Calculate pooling as the maximum over a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        lengths : `torch.Tensor`, shape (batch_size, ), optional
+            Length of each sequence, when `x` is a batch of variable-length
+            sequences padded to `seq_len`. Padded elements are ignored.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
+        if lengths is not None:
+            x = x.masked_fill(~self.get_mask(x, lengths), -float("inf"))
         return x.max(dim=1)[0]
 
 
 class LastPool(TemporalPooling):
     """Calculate pooling as the last element of a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        lengths : `torch.Tensor`, shape (batch_size, ), optional
+            Length of each sequence, when `x` is a batch of variable-length
+            sequences padded to `seq_len`. Padded elements are ignored.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
+        if lengths is not None:
+            batch = torch.arange(len(x), device=x.device)
+            return x[batch, lengths.to(x.device) - 1]
         return x[:, -1]
 
 
 class StatsPool(TemporalPooling):
     """Calculate pooling as the concatenated mean and standard deviation of a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        lengths : `torch.Tensor`, shape (batch_size, ), optional
+            Length of each sequence, when `x` is a batch of variable-length
+            sequences padded to `seq_len`. Padded elements are ignored.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, 2 * hidden_size)
         """
-        mean, std = torch.mean(x, dim=1), torch.std(x, dim=1)
-        return torch.cat((mean, std), dim=1)
+        if lengths is None:
+            mean, std = torch.mean(x, dim=1), torch.std(x, dim=1)
+            return torch.cat((mean, std), dim=1)
+
+        mask = self.get_mask(x, lengths)
+        n = lengths.to(x.device)[:, None].to(x.dtype)
+        mean = torch.sum(x.masked_fill(~mask, 0.0), dim=1) / n
+        # unbiased estimate, as in torch.std
+        var = torch.sum(((x - mean[:, None]) ** 2).masked_fill(~mask, 0.0), dim=1)
+        var = var / (n - 1)
+        return torch.cat((mean, torch.sqrt(var)), dim=1)
+
+    def forward_windows(
+        self, x: torch.Tensor, starts: torch.Tensor, n_frames: int
+    ) -> torch.Tensor:
+        """Pool (possibly overlapping) windows of the same sequence
+
+        Statistics of every window are obtained from cumulative sums of `x`
+        and `x ** 2`, so that overlapping frames are only processed once.
+
+        Parameters
+        ----------
+        x : `torch.Tensor`, shape (seq_len, hidden_size)
+            Sequence.
+        starts : `torch.Tensor`, shape (n_windows, )
+            Index of the first frame of each window.
+        n_frames : int
+            Number of frames of each window.
+
+        Returns
+        -------
+        output : `torch.Tensor`, shape (n_windows, 2 * hidden_size)
+            Same as `forward` applied to the stack of windows.
+        """
+
+        # double precision limits cancellation errors in E[x²] - E[x]²
+        x = x.double()
+        zero = torch.zeros_like(x[:1])
+        cumsum = torch.cat((zero, torch.cumsum(x, dim=0)))
+        cumsum2 = torch.cat((zero, torch.cumsum(x ** 2, dim=0)))
+
+        sum_ = cumsum[starts + n_frames] - cumsum[starts]
+        sum2 = cumsum2[starts + n_frames] - cumsum2[starts]
+
+        mean = sum_ / n_frames
+        # unbiased estimate, as in torch.std
+        var = torch.clamp((sum2 - n_frames * mean ** 2) / (n_frames - 1), min=0.0)
+        return torch.cat((mean, torch.sqrt(var)), dim=1).float()
 
 
 class Pooling(nn.Module):
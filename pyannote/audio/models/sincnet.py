@@ -43,6 +43,14 @@ import math
 from pyannote.core import SlidingWindow
 from pyannote.audio.train.task import Task
 
+try:
+    import torch.fft
+
+    TORCH_FFT = True
+except ImportError as e:
+    # torch < 1.7
+    TORCH_FFT = False
+
 
 class SincConv1d(nn.Module):
     """Sinc-based 1D convolution
@@ -68,12 +76,26 @@ class SincConv1d(nn.Module):
     -----
     Same as `torch.nn.Conv1d`
 
+    Notes
+    -----
+    In inference mode (i.e. in eval mode with gradient computation disabled),
+    filters are only computed again when their parameters change, and long
+    enough waveforms are filtered on CPU using FFT-based overlap-save
+    convolution, which is much faster than direct convolution for such long
+    filters.
+
     Reference
     ---------
     Mirco Ravanelli, Yoshua Bengio. "Speaker Recognition from raw waveform with
     SincNet". SLT 2018. https://arxiv.org/abs/1808.00158
     """
 
+    # FFT size used for overlap-save convolution
+    fft_size = 2048
+    # number of FFT blocks processed at once (keeps intermediate results small
+    # enough to fit in CPU cache)
+    fft_blocks = 4
+
     @staticmethod
     def to_mel(hz):
         return 2595 * np.log10(1 + hz / 700)
@@ -156,6 +178,9 @@ class SincConv1d(nn.Module):
         n = (self.kernel_size - 1) / 2.0
         self.n_ = 2 * math.pi * torch.arange(-n, 0).view(1, -1) / self.sample_rate
 
+        # cached filters (see forward)
+        self.filters_key_ = None
+
     def forward(self, waveforms):
         """Get sinc filters activations
 
@@ -170,8 +195,58 @@ class SincConv1d(nn.Module):
             Batch of sinc filters activations.
         """
 
-        self.n_ = self.n_.to(waveforms.device)
-        self.window_ = self.window_.to(waveforms.device)
+        inference = not (self.training or torch.is_grad_enabled())
+
+        if inference:
+            # only compute filters again when parameters changed
+            key = tuple(
+                (parameter.data_ptr(), parameter._version)
+                for parameter in [self.low_hz_, self.band_hz_]
+            ) + (waveforms.device,)
+            if key != self.filters_key_:
+                self.filters = self.get_filters(waveforms.device)
+                self.filters_key_ = key
+        else:
+            self.filters = self.get_filters(waveforms.device)
+            self.filters_key_ = None
+
+        if (
+            inference
+            and TORCH_FFT
+            and waveforms.device.type == "cpu"
+            and self.stride == 1
+            and self.padding == 0
+            and self.dilation == 1
+            and waveforms.shape[2] >= self.fft_size
+        ):
+            return self.fft_conv1d(waveforms, self.filters)
+
+        return F.conv1d(
+            waveforms,
+            self.filters,
+            stride=self.stride,
+            padding=self.padding,
+            dilation=self.dilation,
+            bias=None,
+            groups=1,
+        )
+
+    def get_filters(self, device: torch.device) -> torch.Tensor:
+        """Compute sinc filters
+
+        Parameters
+        ----------
+        device : `torch.device`
+            Device on which filters are computed.
+
+        Returns
+        -------
+        filters : `torch.Tensor` (out_channels, 1, kernel_size)
+            Sinc filters.
+        """
+
+        self.n_ = self.n_.to(device)
+        self.window_ = self.window_.to(device)
 
         low = self.min_low_hz + torch.abs(self.low_hz_)
 
@@ -200,17 +275,54 @@ class SincConv1d(nn.Module):
 
         band_pass = band_pass / (2 * band[:, None])
 
-        self.filters = (band_pass).view(self.out_channels, 1, self.kernel_size)
+        return (band_pass).view(self.out_channels, 1, self.kernel_size)
 
-        return F.conv1d(
-            waveforms,
-            self.filters,
-            stride=self.stride,
-            padding=self.padding,
-            dilation=self.dilation,
-            bias=None,
-            groups=1,
-        )
+    def fft_conv1d(self, waveforms: torch.Tensor, filters: torch.Tensor):
+        """FFT-based (overlap-save) equivalent of F.conv1d(waveforms, filters)
+
+        Parameters
+        ----------
+        waveforms : `torch.Tensor` (batch_size, 1, n_samples)
+            Batch of waveforms.
+        filters : `torch.Tensor` (out_channels, 1, kernel_size)
+            Filters.
+
+        Returns
+        -------
+        features : `torch.Tensor` (batch_size, out_channels, n_samples_out)
+            Batch of filters activations.
+        """
+
+        batch_size, _, n_samples = waveforms.shape
+        out_channels, _, kernel_size = filters.shape
+        n_samples_out = n_samples - kernel_size + 1
+
+        # split waveforms into overlapping blocks, each of them providing
+        # `hop` valid output samples
+        hop = self.fft_size - kernel_size + 1
+        n_blocks = (n_samples_out + hop - 1) // hop
+        padding = (n_blocks - 1) * hop + self.fft_size - n_samples
+        waveforms = F.pad(waveforms[:, 0], (0, padding))
+        blocks = waveforms.unfold(1, self.fft_size, hop)
+
+        # (batch_size, n_blocks, fft_size // 2 + 1)
+        X = torch.fft.rfft(blocks, n=self.fft_size)
+        # conv1d is actually a cross-correlation, hence the flip
+        # (out_channels, 1, fft_size // 2 + 1)
+        H = torch.fft.rfft(torch.flip(filters[:, 0], dims=[1]), n=self.fft_size)
+        H = H[:, None]
+
+        output = waveforms.new_empty(batch_size, out_channels, n_blocks * hop)
+        for b in range(batch_size):
+            for i in range(0, n_blocks, self.fft_blocks):
+                Y = torch.fft.irfft(
+                    X[b, None, i : i + self.fft_blocks] * H, n=self.fft_size
+                )
+                output[b, :, i * hop : (i + self.fft_blocks) * hop] = Y[
+                    :, :, kernel_size - 1 :
+                ].reshape(out_channels, -1)
+
+        return output[:, :, :n_samples_out]
 
 
 class SincNet(nn.Module):
@@ -399,13 +511,18 @@ class SincNet(nn.Module):
         if self.dropout:
             self.dropout_ = nn.Dropout(p=self.dropout)
 
-    def forward(self, waveforms):
+    def forward(self, waveforms, lengths=None):
         """Extract SincNet features
 
         Parameters
         ----------
         waveforms : (batch_size, n_samples, 1)
             Batch of waveforms
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of samples of each waveform, when `waveforms` is a batch
+            of variable-length waveforms padded to `n_samples`. Padded samples
+            (and frames) are then ignored by normalization layers. Use
+            `n_frames(lengths)` to get the number of valid output frames.
 
         Returns
         -------
@@ -416,19 +533,156 @@ class SincNet(nn.Module):
 
         # standardize waveforms
         if self.waveform_normalize:
-            output = self.waveform_normalize_(output)
+            output = self._normalize(self.waveform_normalize_, output, lengths)
+
+        output = self.conv1d_[0](output)
+        if lengths is not None:
+            lengths = (lengths - self.kernel_size[0]) // self.stride[0] + 1
+
+        return self._forward_sinc(output, lengths=lengths)
+
+    def forward_chunks(
+        self, waveform: torch.Tensor, starts: torch.Tensor, n_samples: int
+    ) -> torch.Tensor:
+        """Extract SincNet features of (possibly overlapping) chunks of a waveform
+
+        Sinc filters (applied at the waveform sample rate) are only applied
+        once on the whole waveform instead of once per chunk. Since they are
+        linear, the effect of (chunk-wise) waveform standardization can be
+        applied afterwards. Following layers still process each chunk
+        independently (instance normalization depends on the whole chunk).
+
+        Parameters
+        ----------
+        waveform : (n_samples_total, 1) `torch.Tensor`
+            Waveform.
+        starts : (batch_size, ) `torch.Tensor`
+            Index of the first sample of each chunk.
+        n_samples : int
+            Number of samples of each chunk.
+
+        Returns
+        -------
+        features : (batch_size, n_frames, out_channels[-1])
+            Same as `forward(waveforms)` where `waveforms` is the
+            (batch_size, n_samples, 1) stack of chunks.
+        """
+
+        sinc_conv1d = self.conv1d_[0]
+
+        # chunks would not be aligned with sinc filters output
+        if sinc_conv1d.stride != 1:
+            index = starts[:, None] + torch.arange(n_samples, device=starts.device)
+            return self(waveform[index])
+
+        # (out_channels, n_samples_total - kernel_size + 1)
+        output = sinc_conv1d(waveform.transpose(0, 1)[None])[0]
+
+        # (batch_size, out_channels, n_samples - kernel_size + 1)
+        n_frames = n_samples - sinc_conv1d.kernel_size + 1
+        steps = torch.unique(starts[1:] - starts[:-1])
+        if len(steps) == 1 and starts[0] == 0:
+            # evenly spaced chunks: strided view (no copy)
+            output = output.unfold(1, n_frames, int(steps[0]))[:, : len(starts)]
+        else:
+            index = starts[:, None] + torch.arange(n_frames, device=starts.device)
+            output = output[:, index]
+        output = output.transpose(0, 1)
+
+        # standardize waveforms: conv(a * x + b) = a * conv(x) + b * sum(filters)
+        if self.waveform_normalize:
+            index = starts[:, None] + torch.arange(n_samples, device=starts.device)
+            chunks = waveform[index, 0]
+            mean = torch.mean(chunks, dim=1)
+            var = torch.var(chunks, dim=1, unbiased=False)
+            normalize = self.waveform_normalize_
+            scale = normalize.weight / torch.sqrt(var + normalize.eps)
+            shift = normalize.bias - scale * mean
+            output = torch.addcmul(
+                shift[:, None, None]
+                * torch.sum(sinc_conv1d.filters, dim=(1, 2))[None, :, None],
+                scale[:, None, None],
+                output,
+            )
+
+        return self._forward_sinc(output)
+
+    def n_frames(self, n_samples: int) -> int:
+        """Number of frames extracted from a waveform
+
+        Parameters
+        ----------
+        n_samples : int or (batch_size, ) `torch.Tensor`
+            Number of samples.
+
+        Returns
+        -------
+        n_frames : int or (batch_size, ) `torch.Tensor`
+            Number of frames returned by `forward`.
+        """
+        config = zip(self.kernel_size, self.stride, self.max_pool)
+        for kernel_size, stride, max_pool in config:
+            n_samples = (n_samples - kernel_size) // stride + 1
+            n_samples = (n_samples - max_pool) // max_pool + 1
+        return n_samples
+
+    @staticmethod
+    def _normalize(instance_norm1d, output, lengths=None):
+        """Apply instance normalization, ignoring padded frames (if any)
+
+        Parameters
+        ----------
+        instance_norm1d : `nn.InstanceNorm1d`
+            Instance normalization layer.
+        output : (batch_size, n_channels, n_frames) `torch.Tensor`
+            Batch of sequences.
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of frames of each sequence.
+        """
+
+        if lengths is None:
+            return instance_norm1d(output)
+
+        _, _, n_frames = output.shape
+        steps = torch.arange(n_frames, device=output.device)
+        mask = (steps[None, :] < lengths.to(output.device)[:, None])[:, None]
+        n = lengths.to(output.device)[:, None, None].to(output.dtype)
+
+        mean = torch.sum(output.masked_fill(~mask, 0.0), dim=2, keepdim=True) / n
+        var = (
+            torch.sum(
+                ((output - mean) ** 2).masked_fill(~mask, 0.0), dim=2, keepdim=True
+            )
+            / n
+        )
+        output = (output - mean) / torch.sqrt(var + instance_norm1d.eps)
+
+        if instance_norm1d.affine:
+            output = (
+                output * instance_norm1d.weight[:, None] + instance_norm1d.bias[:, None]
+            )
+
+        return output
+
+    def _forward_sinc(self, output, lengths=None):
+        """Apply the rest of SincNet on sinc filters output"""
 
         layers = zip(self.conv1d_, self.max_pool1d_)
         for i, (conv1d, max_pool1d) in enumerate(layers):
 
-            output = conv1d(output)
             if i == 0:
                 output = torch.abs(output)
+            else:
+                output = conv1d(output)
+                if lengths is not None:
+                    lengths = (lengths - self.kernel_size[i]) // self.stride[i] + 1
 
             output = max_pool1d(output)
+            if lengths is not None:
+                lengths = (lengths - self.max_pool[i]) // self.max_pool[i] + 1
 
             if self.instance_normalize:
-                output = self.instance_norm1d_[i](output)
+                output = self._normalize(self.instance_norm1d_[i], output, lengths)
 
             output = self.activation_(output)
 
@@ -188,7 +188,12 @@ class XVectorNet(nn.Module):
         self.segment7 = nn.Linear(embedding_dim, embedding_dim)
         self.embedding_dim = embedding_dim
 
-    def forward(self, x: torch.Tensor, return_intermediate: Optional[str] = None):
+    def forward(
+        self,
+        x: torch.Tensor,
+        return_intermediate: Optional[str] = None,
+        lengths: Optional[torch.Tensor] = None,
+    ):
         """Calculate X-Vector network activations.
            Return the requested intermediate layer without computing unnecessary activations.
 
@@ -199,6 +204,10 @@ class XVectorNet(nn.Module):
         return_intermediate : 'stats_pool' | 'segment6' | 'segment7' | None
             If specified, return the activation of this specific layer.
             segment6 and segment7 activations are returned before the application of non linearity.
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of frames of each sequence, when `x` is a batch of
+            variable-length sequences padded to `n_frames`. Padded frames are
+            then ignored by statistics pooling.
 
         Returns
         -------
@@ -207,7 +216,63 @@ class XVectorNet(nn.Module):
             (batch_size, embedding_dim)      if return_intermediate == 'segment6' | 'segment7' | None
         """
 
-        x = self.tdnn(x)
+        if lengths is not None:
+            lengths = self.n_frames(lengths)
+
+        return self.forward_segments(
+            self.tdnn[-1](self.forward_frames(x), lengths=lengths),
+            return_intermediate=return_intermediate,
+        )
+
+    def forward_frames(self, x: torch.Tensor) -> torch.Tensor:
+        """Calculate frame-level activations (i.e. up to statistics pooling)
+
+        Parameters
+        ----------
+        x : (batch_size, n_frames, out_channels)
+            Batch of frames
+
+        Returns
+        -------
+        activations : (batch_size, n_frames - context, 1500)
+            where context is the number of frames lost by TDNN layers.
+        """
+        return self.tdnn[:-1](x)
+
+    def n_frames(self, n_frames: int) -> int:
+        """Number of frame-level activations
+
+        Parameters
+        ----------
+        n_frames : int or (batch_size, ) `torch.Tensor`
+            Number of input frames.
+
+        Returns
+        -------
+        n_frames : int or (batch_size, ) `torch.Tensor`
+            Number of frames returned by `forward_frames`.
+        """
+        for tdnn in self.tdnn[:-1]:
+            conv = tdnn.temporal_conv
+            n_frames -= conv.dilation[0] * (conv.kernel_size[0] - 1)
+        return n_frames
+
+    def forward_segments(
+        self, x: torch.Tensor, return_intermediate: Optional[str] = None
+    ) -> torch.Tensor:
+        """Calculate segment-level activations (i.e. after statistics pooling)
+
+        Parameters
+        ----------
+        x : (batch_size, 3000)
+            Batch of pooled statistics
+        return_intermediate : 'stats_pool' | 'segment6' | 'segment7' | None
+            See `forward`.
+
+        Returns
+        -------
+        activations : see `forward`.
+        """
 
         if return_intermediate == "stats_pool":
             return x
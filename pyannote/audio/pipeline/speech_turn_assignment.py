@@ -35,6 +35,8 @@ from pyannote.pipeline.blocks.classification import ClosestAssignment
 from pyannote.core import Annotation
 from .utils import assert_int_labels
 from .utils import assert_string_labels
+from .utils import get_embedding
+from .utils import remove_nan
 from ..features import Precomputed
 
 from pyannote.audio.features.wrapper import Wrapper, Wrappable
@@ -89,7 +91,8 @@ class SpeechTurnClosestAssignment(Pipeline):
         assert_string_labels(targets, "targets")
         assert_int_labels(speech_turns, "speech_turns")
 
-        embedding = self._embedding(current_file)
+        speech = speech_turns.get_timeline().union(targets.get_timeline())
+        embedding = get_embedding(self._embedding, current_file, speech)
 
         # gather targets embedding
         labels = targets.labels()
@@ -101,7 +104,7 @@ class SpeechTurnClosestAssignment(Pipeline):
             # be more and more permissive until we have
             # at least one embedding for current speech turn
             for mode in ["strict", "center", "loose"]:
-                x = embedding.crop(timeline, mode=mode)
+                x = remove_nan(embedding.crop(timeline, mode=mode))
                 if len(x) > 0:
                     break
 
@@ -122,7 +125,7 @@ class SpeechTurnClosestAssignment(Pipeline):
             # be more and more permissive until we have
             # at least one embedding for current speech turn
             for mode in ["strict", "center", "loose"]:
-                x = embedding.crop(timeline, mode=mode)
+                x = remove_nan(embedding.crop(timeline, mode=mode))
                 if len(x) > 0:
                     break
 
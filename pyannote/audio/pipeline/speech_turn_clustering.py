@@ -37,6 +37,8 @@ from pyannote.audio.features import Precomputed
 from pyannote.pipeline.blocks.clustering import HierarchicalAgglomerativeClustering
 from pyannote.pipeline.blocks.clustering import AffinityPropagationClustering
 from .utils import assert_string_labels
+from .utils import get_embedding
+from .utils import remove_nan
 
 from pyannote.audio.features.wrapper import Wrapper, Wrappable
 
@@ -118,7 +120,7 @@ class SpeechTurnClustering(Pipeline):
         """
 
         # load embeddings
-        embedding = self._embedding(current_file)
+        embedding = get_embedding(self._embedding, current_file, speech_regions)
         window = embedding.sliding_window
 
         # extract and stack embeddings of speech regions
@@ -129,8 +131,10 @@ class SpeechTurnClustering(Pipeline):
             ]
         )
 
-        # apply clustering
-        y_pred = self.clustering(X)
+        # apply clustering (on embeddings that are available)
+        available = ~np.any(np.isnan(X), axis=1)
+        y_pred = np.zeros(len(X), dtype=np.int8)
+        y_pred[available] = self.clustering(X[available])
 
         # reconstruct
         y = np.zeros(len(embedding), dtype=np.int8)
@@ -177,7 +181,9 @@ class SpeechTurnClustering(Pipeline):
 
         assert_string_labels(speech_turns, "speech_turns")
 
-        embedding = self._embedding(current_file)
+        embedding = get_embedding(
+            self._embedding, current_file, speech_turns.get_timeline()
+        )
 
         labels = speech_turns.labels()
         X, clustered_labels, skipped_labels = [], [], []
@@ -188,7 +194,7 @@ class SpeechTurnClustering(Pipeline):
             # be more and more permissive until we have
             # at least one embedding for current speech turn
             for mode in ["strict", "center", "loose"]:
-                x = embedding.crop(timeline, mode=mode)
+                x = remove_nan(embedding.crop(timeline, mode=mode))
                 if len(x) > 0:
                     break
 
@@ -29,7 +29,10 @@
 
 import yaml
 from pathlib import Path
+import numpy as np
 from pyannote.core import Annotation
+from pyannote.core import Timeline
+from pyannote.core import SlidingWindowFeature
 from pyannote.pipeline import Pipeline
 from pyannote.core.utils.helper import get_class_by_name
 
@@ -64,6 +67,39 @@ def assert_int_labels(annotation: Annotation, name: str):
         raise ValueError(msg)
 
 
+def get_embedding(
+    embedding, current_file: dict, speech: Timeline
+) -> SlidingWindowFeature:
+    """Get speaker embeddings, skipping non-speech regions when possible
+
+    Parameters
+    ----------
+    embedding : `pyannote.audio.features.wrapper.Wrapper`
+        Speaker embeddings.
+    current_file : `dict`
+        File as provided by a pyannote.database protocol.
+    speech : `pyannote.core.Timeline`
+        Regions where embeddings are actually needed.
+
+    Returns
+    -------
+    embedding : `pyannote.core.SlidingWindowFeature`
+        Speaker embeddings. When supported by the embedding model (see
+        `Pretrained.gated`), embeddings are only extracted where they overlap
+        `speech` and are NaN everywhere else.
+    """
+
+    gated = getattr(embedding, "gated", None)
+    if gated is None:
+        return embedding(current_file)
+    return gated(current_file, speech)
+
+
+def remove_nan(x: np.ndarray) -> np.ndarray:
+    """Remove embeddings containing NaNs (e.g. outside of speech regions)"""
+    return x[~np.any(np.isnan(x), axis=1)]
+
+
 def load_pretrained_pipeline(train_dir: Path) -> Pipeline:
     """Load pretrained pipeline
 
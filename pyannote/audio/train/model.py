@@ -61,6 +61,7 @@ try:
 except ImportError as e:
     from typing_extensions import Literal
 from typing import Callable
+from pyannote.core import Segment
 from pyannote.core import SlidingWindow
 from pyannote.core import SlidingWindowFeature
 
@@ -81,6 +82,139 @@ from torch.nn import Module
 from functools import partial
 
 
+class OverlapAddAccumulator:
+    """Overlap-add accumulation of chunk-level predictions
+
+    Frame-level predictions of (possibly overlapping) chunks are summed and
+    eventually averaged over the number of chunks that overlap each frame.
+
+    Parameters
+    ----------
+    resolution : SlidingWindow
+        Output frames.
+    alignment : {'center', 'loose', 'strict'}, optional
+        Alignment of chunk predictions with output frames. Defaults to 'center'.
+    fixed : float, optional
+        Chunks duration.
+
+    Usage
+    -----
+    >>> accumulator = OverlapAddAccumulator(resolution, fixed=duration)
+    >>> for chunk, fX in zip(chunks, predictions):
+    ...     accumulator.add(chunk, fX)
+    >>> data = accumulator.pop(n_frames)
+    """
+
+    def __init__(
+        self,
+        resolution: SlidingWindow,
+        alignment: Alignment = ALIGNMENT_CENTER,
+        fixed: float = None,
+    ):
+        super().__init__()
+        self.resolution = resolution
+        self.alignment = alignment
+        self.fixed = fixed
+
+        # data_[i] is the sum of all predictions for frame #(offset_ + i)
+        # k_[i] is the number of chunks that overlap with frame #(offset_ + i)
+        self.offset_ = 0
+        self.data_ = None
+        self.k_ = None
+        self.n_frames_ = 0
+
+    def _grow(self, n_frames: int, shape):
+
+        if self.data_ is None:
+            capacity = max(n_frames, 1024)
+            self.data_ = np.zeros((capacity,) + shape, dtype=np.float32)
+            self.k_ = np.zeros((capacity, 1), dtype=np.int16)
+
+        elif n_frames > len(self.data_):
+            capacity = max(n_frames, 2 * len(self.data_))
+            data = np.zeros((capacity,) + self.data_.shape[1:], dtype=np.float32)
+            data[: len(self.data_)] = self.data_
+            k = np.zeros((capacity, 1), dtype=np.int16)
+            k[: len(self.k_)] = self.k_
+            self.data_, self.k_ = data, k
+
+        self.n_frames_ = max(self.n_frames_, n_frames)
+
+    def add(self, chunk: Segment, fX: np.ndarray, fixed: float = None):
+        """Accumulate predictions of one chunk
+
+        Parameters
+        ----------
+        chunk : Segment
+            Chunk.
+        fX : (n_frames, dimension) np.ndarray
+            Frame-level predictions for this chunk.
+        fixed : float, optional
+            Override chunks duration.
+        """
+
+        if fixed is None:
+            fixed = self.fixed
+
+        # indices of frames overlapped by chunk
+        ((start, end),) = self.resolution.crop(
+            chunk, mode=self.alignment, fixed=fixed, return_ranges=True
+        )
+
+        # skip frames that were already popped
+        if start < self.offset_:
+            fX = fX[self.offset_ - start :]
+            start = self.offset_
+
+        if end <= start:
+            return
+
+        self._grow(end - self.offset_, fX.shape[1:])
+
+        # accumulate the outputs
+        self.data_[start - self.offset_ : end - self.offset_] += fX
+
+        # keep track of the number of overlapping sequence
+        # TODO - use smarter weights (e.g. Hamming window)
+        self.k_[start - self.offset_ : end - self.offset_] += 1
+
+    def pop(self, end: int = None) -> np.ndarray:
+        """Pop averaged predictions
+
+        Parameters
+        ----------
+        end : int, optional
+            Index of last frame (excluded). Defaults to last accumulated frame.
+            Frames that were not overlapped by any chunk are set to zero.
+
+        Returns
+        -------
+        data : (n_frames, dimension) np.ndarray
+            Averaged predictions from first frame not popped yet until `end`.
+        """
+
+        if end is None:
+            end = self.offset_ + self.n_frames_
+
+        n_frames = end - self.offset_
+        if n_frames <= 0 or self.data_ is None:
+            shape = (0,) if self.data_ is None else (0,) + self.data_.shape[1:]
+            return np.zeros(shape, dtype=np.float32)
+
+        self._grow(n_frames, self.data_.shape[1:])
+
+        # compute average embedding of each frame
+        data = self.data_[:n_frames] / np.maximum(self.k_[:n_frames], 1)
+
+        # forget about popped frames
+        self.data_ = self.data_[n_frames:]
+        self.k_ = self.k_[n_frames:]
+        self.n_frames_ = max(0, self.n_frames_ - n_frames)
+        self.offset_ = end
+
+        return data
+
+
 class Model(Module):
     """Model
 
@@ -99,6 +233,11 @@ class Model(Module):
         Architecture hyper-parameters.
     """
 
+    # set to True in models whose `forward` accepts an additional `lengths`
+    # keyword argument, i.e. (batch_size, ) number of samples of each sequence
+    # of a batch of variable-length sequences padded to the same length.
+    supports_packed = False
+
     def __init__(self, specifications: dict, **architecture_params):
         super().__init__()
         self.specifications = specifications
@@ -225,6 +364,99 @@ class Model(Module):
         msg = "..."
         raise NotImplementedError(msg)
 
+    def forward_chunks(
+        self,
+        sequence: torch.Tensor,
+        starts: torch.Tensor,
+        n_samples: int,
+        approximate: bool = False,
+        **kwargs,
+    ) -> torch.Tensor:
+        """Forward pass on (possibly overlapping) chunks of the same sequence
+
+        Default implementation simply stacks chunks and calls `forward`.
+        Models with a convolutional frontend may override it to compute the
+        frontend only once over overlapping chunks.
+
+        Parameters
+        ----------
+        sequence : (n_samples_total, n_features) `torch.Tensor`
+            Sequence.
+        starts : (batch_size, ) `torch.Tensor`
+            Index of the first sample of each chunk.
+        n_samples : int
+            Number of samples of each chunk.
+        approximate : bool, optional
+            Allow the model to trade exactness for speed, e.g. by processing
+            the whole sequence at once rather than each chunk independently.
+            Ignored by default implementation.
+        **kwargs : `dict`
+            Passed to `forward`.
+
+        Returns
+        -------
+        output : (batch_size, ...) `torch.Tensor`
+            Same as `forward(sequences)` where `sequences` is the
+            (batch_size, n_samples, n_features) stack of chunks.
+        """
+        index = starts[:, None] + torch.arange(n_samples, device=starts.device)
+        return self(sequence[index], **kwargs)
+
+    def forward_stateful(self, sequences: torch.Tensor, n_frames: int, state=None):
+        """Forward pass on one chunk of a longer sequence
+
+        Used by `slide` for stateful inference: consecutive chunks of the same
+        sequence are processed in order and models carry their (e.g.
+        recurrent) state from one chunk to the next, instead of processing
+        heavily overlapping chunks independently.
+
+        Parameters
+        ----------
+        sequences : (batch_size, n_samples, n_features) `torch.Tensor`
+            Batch of chunks (e.g. one per audio channel).
+        n_frames : int
+            Number of output frames to return. They are followed by frames of
+            the next chunk. Remaining frames of the current chunk may be used
+            as lookahead (e.g. by bidirectional recurrent layers).
+        state : optional
+            State returned by the call on the previous chunk. Defaults to
+            starting new sequences.
+
+        Returns
+        -------
+        output : (batch_size, n_frames, dimension) `torch.Tensor`
+            Output of the first `n_frames` frames.
+        state :
+            State to be passed to the call on the next chunk.
+        """
+        msg = f"{self.__class__.__name__} does not support stateful inference."
+        raise NotImplementedError(msg)
+
+    def quantize(self) -> "Model":
+        """Apply int8 dynamic quantization for faster CPU inference
+
+        Weights of recurrent (LSTM, GRU) and linear layers are converted to
+        8-bit integers, and their inputs are quantized on the fly. Other layers
+        (e.g. SincNet or TDNN convolutions) are kept in float32.
+
+        Returns
+        -------
+        model : `Model`
+            Quantized model. It only runs on CPU and can no longer be trained.
+
+        Notes
+        -----
+        Quantization happens in place because models with weight-normalized
+        layers (e.g. SincTDNN) cannot be deep-copied.
+        """
+        torch.quantization.quantize_dynamic(
+            self.eval(),
+            {torch.nn.LSTM, torch.nn.GRU, torch.nn.Linear},
+            dtype=torch.qint8,
+            inplace=True,
+        )
+        return self
+
     @property
     def task(self) -> Task:
         """Type of task addressed by the model
@@ -374,9 +606,10 @@ class Model(Module):
         msg = f"{self.task} tasks do not define attribute 'classes'."
         raise AttributeError(msg)
 
+    @torch.no_grad()
     def slide(
         self,
-        features: SlidingWindowFeature,
+        features: Union[SlidingWindowFeature, List[SlidingWindowFeature]],
         sliding_window: SlidingWindow,
         batch_size: int = 32,
         device: torch.device = None,
@@ -384,13 +617,18 @@ class Model(Module):
         postprocess: Callable[[np.ndarray], np.ndarray] = None,
         return_intermediate=None,
         progress_hook=None,
+        shared_frontend: bool = False,
+        approximate: bool = False,
+        stateful: bool = False,
     ) -> SlidingWindowFeature:
         """Slide and apply model on features
 
         Parameters
         ----------
-        features : SlidingWindowFeature
-            Input features.
+        features : SlidingWindowFeature or list of SlidingWindowFeature
+            Input features. Synchronous features (e.g. one per audio channel)
+            can be provided as a list: chunks extracted from each of them at a
+            given position end up in the same batch.
         sliding_window : SlidingWindow
             Sliding window used to apply the model.
         batch_size : int
@@ -411,8 +649,36 @@ class Model(Module):
             Experimental. Not documented yet.
         progress_hook : callable
             Experimental. Not documented yet.
+        shared_frontend : bool, optional
+            Let the model share computation between overlapping chunks of the
+            same batch (see `forward_chunks`). This is much faster for models
+            with a costly convolutional frontend (e.g. SincNet), as every
+            input sample is otherwise processed about 1 / step times. Defaults
+            to processing each chunk independently.
+        approximate : bool, optional
+            When `shared_frontend` is True, allow the model to trade
+            exactness for speed (see `forward_chunks`). Defaults to False.
+        stateful : bool, optional
+            Process chunks one after the other, carrying model state from one
+            chunk to the next (see `forward_stateful`). Each output frame is
+            then only computed once, from the chunk starting right before it.
+            The rest of the chunk (i.e. duration - step) is only used as
+            lookahead. Use step = duration for no lookahead at all. Only
+            supported for frame-level outputs. Defaults to processing
+            (overlapping) chunks independently.
+
+        Returns
+        -------
+        output : SlidingWindowFeature or list of SlidingWindowFeature
+            Model output. A list (with one element per input features) is
+            returned when `features` is a list.
         """
 
+        multiple = not isinstance(features, SlidingWindowFeature)
+        if not multiple:
+            features = [features]
+        n_features = len(features)
+
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
         device = torch.device(device)
@@ -422,22 +688,17 @@ class Model(Module):
                 return_intermediate is not None
             )
 
-        try:
-            dimension = self.dimension
-        except AttributeError:
-            dimension = len(self.classes)
-
         resolution = self.resolution
 
         # model returns one vector per input frame
         if resolution == RESOLUTION_FRAME:
-            resolution = features.sliding_window
+            resolution = features[0].sliding_window
 
         # model returns one vector per input window
         if resolution == RESOLUTION_CHUNK:
             resolution = sliding_window
 
-        support = features.extent
+        support = features[0].extent
         if support.duration < sliding_window.duration:
             chunks = [support]
             fixed = support.duration
@@ -445,65 +706,242 @@ class Model(Module):
             chunks = list(sliding_window(support, align_last=True))
             fixed = sliding_window.duration
 
+        if stateful:
+            return self._slide_stateful(
+                features,
+                chunks,
+                fixed,
+                resolution,
+                device,
+                progress_hook=progress_hook,
+                multiple=multiple,
+            )
+
         if progress_hook is not None:
-            n_chunks = len(chunks)
+            n_chunks = len(chunks) * n_features
             n_done = 0
             progress_hook(n_done, n_chunks)
 
-        batches = pescador.maps.buffer_stream(
-            iter(
-                {"X": features.crop(window, mode="center", fixed=fixed)}
-                for window in chunks
-            ),
-            batch_size,
-            partial=True,
-        )
+        if shared_frontend:
+            fX = self._slide_shared(
+                features,
+                chunks,
+                fixed,
+                batch_size,
+                device,
+                postprocess=postprocess,
+                return_intermediate=return_intermediate,
+                progress_hook=progress_hook,
+                approximate=approximate,
+            )
 
-        fX = []
-        for batch in batches:
+        else:
+            batches = pescador.maps.buffer_stream(
+                iter(
+                    {"X": features_.crop(window, mode="center", fixed=fixed)}
+                    for window in chunks
+                    for features_ in features
+                ),
+                batch_size,
+                partial=True,
+            )
 
-            tX = torch.tensor(batch["X"], dtype=torch.float32, device=device)
+            fX = []
+            for batch in batches:
 
-            # FIXME: fix support for return_intermediate
-            tfX = self(tX, return_intermediate=return_intermediate)
+                tX = torch.tensor(batch["X"], dtype=torch.float32, device=device)
 
-            tfX_npy = tfX.detach().to("cpu").numpy()
-            if postprocess is not None:
-                tfX_npy = postprocess(tfX_npy)
+                # FIXME: fix support for return_intermediate
+                tfX = self(tX, return_intermediate=return_intermediate)
 
-            fX.append(tfX_npy)
+                tfX_npy = tfX.detach().to("cpu").numpy()
+                if postprocess is not None:
+                    tfX_npy = postprocess(tfX_npy)
 
-            if progress_hook is not None:
-                n_done += len(batch["X"])
-                progress_hook(n_done, n_chunks)
+                fX.append(tfX_npy)
 
-        fX = np.vstack(fX)
+                if progress_hook is not None:
+                    n_done += len(batch["X"])
+                    progress_hook(n_done, n_chunks)
 
-        if skip_average:
-            return SlidingWindowFeature(fX, sliding_window)
+            fX = np.vstack(fX)
 
         # get total number of frames (based on last window end time)
         n_frames = resolution.samples(chunks[-1].end, mode="center")
 
-        # data[i] is the sum of all predictions for frame #i
-        data = np.zeros((n_frames, dimension), dtype=np.float32)
+        output = []
+        for i in range(n_features):
 
-        # k[i] is the number of chunks that overlap with frame #i
-        k = np.zeros((n_frames, 1), dtype=np.int8)
+            # outputs of ith features
+            fX_i = fX[i::n_features]
 
-        for chunk, fX_ in zip(chunks, fX):
+            if skip_average:
+                output.append(SlidingWindowFeature(fX_i, sliding_window))
+                continue
 
-            # indices of frames overlapped by chunk
-            indices = resolution.crop(chunk, mode=self.alignment, fixed=fixed)
+            accumulator = OverlapAddAccumulator(
+                resolution, alignment=self.alignment, fixed=fixed
+            )
+            for chunk, fX_ in zip(chunks, fX_i):
+                accumulator.add(chunk, fX_)
 
-            # accumulate the outputs
-            data[indices] += fX_
+            output.append(SlidingWindowFeature(accumulator.pop(n_frames), resolution))
 
-            # keep track of the number of overlapping sequence
-            # TODO - use smarter weights (e.g. Hamming window)
-            k[indices] += 1
+        return output if multiple else output[0]
 
-        # compute average embedding of each frame
-        data = data / np.maximum(k, 1)
+    def _slide_stateful(
+        self,
+        features: List[SlidingWindowFeature],
+        chunks: List[Segment],
+        fixed: float,
+        resolution: SlidingWindow,
+        device: torch.device,
+        progress_hook=None,
+        multiple: bool = False,
+    ):
+        """Apply model on consecutive chunks, using `forward_stateful`
+
+        Chunks extracted from every features at a given position end up in
+        the same batch.
+        """
+
+        if self.resolution == RESOLUTION_CHUNK:
+            msg = "Stateful inference is only supported for frame-level outputs."
+            raise ValueError(msg)
+
+        if len(chunks) > 1 and chunks[1].start - chunks[0].start > fixed:
+            msg = "Stateful inference requires step to be smaller than duration."
+            raise ValueError(msg)
+
+        # extend chunks by one output frame so that frames overlapping two
+        # consecutive chunks (e.g. with "strict" alignment) are not lost
+        fixed = fixed + resolution.duration
+        chunks = [Segment(chunk.start, chunk.start + fixed) for chunk in chunks]
+
+        # indices of output frames of each chunk
+        ranges = [
+            resolution.crop(
+                chunk, mode=self.alignment, fixed=fixed, return_ranges=True
+            )[0]
+            for chunk in chunks
+        ]
+
+        # drop chunks that would not output any frame because the next one
+        # starts at the same frame (e.g. when the last chunk, aligned with the
+        # end of the file, starts less than one frame after the previous one).
+        # the next chunk then takes over from the state of the previous one.
+        keep = [
+            c + 1 == len(ranges) or ranges[c + 1][0] > start
+            for c, (start, _) in enumerate(ranges)
+        ]
+        chunks = [chunk for chunk, keep_ in zip(chunks, keep) if keep_]
+        ranges = [range_ for range_, keep_ in zip(ranges, keep) if keep_]
+
+        # get total number of frames (based on last window end time)
+        n_frames = resolution.samples(
+            chunks[-1].end - resolution.duration, mode="center"
+        )
+
+        if progress_hook is not None:
+            progress_hook(0, len(chunks))
+
+        data, state = None, None
+        for c, (chunk, (start, end)) in enumerate(zip(chunks, ranges)):
+
+            # only keep output frames up to the first frame of next chunk
+            if c + 1 < len(chunks):
+                end = ranges[c + 1][0]
+
+            X = np.stack(
+                [
+                    features_.crop(chunk, mode="center", fixed=fixed)
+                    for features_ in features
+                ]
+            )
+            tX = torch.tensor(X, dtype=torch.float32, device=device)
+            tfX, state = self.forward_stateful(tX, end - start, state=state)
+            fX = tfX.detach().to("cpu").numpy()
+
+            if data is None:
+                data = np.zeros(
+                    (len(features), n_frames) + fX.shape[2:], dtype=np.float32
+                )
+
+            # ignore frames out of bounds
+            offset = max(0, -start)
+            start, end = start + offset, min(end, n_frames)
+            data[:, start:end] = fX[:, offset : offset + end - start]
+
+            if progress_hook is not None:
+                progress_hook(c + 1, len(chunks))
+
+        output = [SlidingWindowFeature(data_, resolution) for data_ in data]
+        return output if multiple else output[0]
+
+    def _slide_shared(
+        self,
+        features: List[SlidingWindowFeature],
+        chunks: List[Segment],
+        fixed: float,
+        batch_size: int,
+        device: torch.device,
+        postprocess: Callable[[np.ndarray], np.ndarray] = None,
+        return_intermediate=None,
+        progress_hook=None,
+        approximate: bool = False,
+    ) -> np.ndarray:
+        """Apply model on chunks, using `forward_chunks` for each batch
+
+        Returns model outputs in the same order as `slide`, i.e. chunk by
+        chunk and, for each chunk, features by features.
+        """
+
+        n_features = len(features)
+        n_chunks = len(chunks) * n_features
+        n_done = 0
+
+        fX = [None] * n_chunks
+        for f, features_ in enumerate(features):
+
+            data = features_.data
+            frames = features_.sliding_window
+
+            # index of first sample of each chunk (as in SlidingWindowFeature.crop)
+            ranges = [
+                frames.crop(window, mode="center", fixed=fixed, return_ranges=True)[0]
+                for window in chunks
+            ]
+            n_samples = ranges[0][1] - ranges[0][0]
+
+            for i in range(0, len(chunks), batch_size):
+
+                starts = np.array([start for start, _ in ranges[i : i + batch_size]])
+
+                # smallest part of the sequence covering all chunks of the
+                # batch. out-of-bounds samples are replaced by first (or last)
+                # sample, as in SlidingWindowFeature.crop
+                index = np.arange(starts[0], starts[-1] + n_samples)
+                sequence = data[np.clip(index, 0, len(data) - 1)]
+
+                tsequence = torch.tensor(sequence, dtype=torch.float32, device=device)
+                tstarts = torch.tensor(starts - starts[0], device=device)
+                tfX = self.forward_chunks(
+                    tsequence,
+                    tstarts,
+                    n_samples,
+                    approximate=approximate,
+                    return_intermediate=return_intermediate,
+                )
+
+                tfX_npy = tfX.detach().to("cpu").numpy()
+                if postprocess is not None:
+                    tfX_npy = postprocess(tfX_npy)
+
+                for c, fX_ in enumerate(tfX_npy, start=i):
+                    fX[c * n_features + f] = fX_
+
+                if progress_hook is not None:
+                    n_done += len(starts)
+                    progress_hook(n_done, n_chunks)
 
-        return SlidingWindowFeature(data, resolution)
+        return np.stack(fX)
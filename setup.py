@@ -46,6 +46,7 @@ setup(
         "console_scripts": [
             "pyannote-audio=pyannote.audio.applications.pyannote_audio:main",
             "pyannote-speech-feature=pyannote.audio.applications.feature_extraction:main",
+            "pyannote-audio-server=pyannote.audio.applications.server:main",
         ],
         "prodigy_recipes": [
             "pyannote.sad.manual = pyannote.audio.interactive.recipes.sad:sad_manual",